@@ -0,0 +1,291 @@
+# services/catalog/autocomplete.py
+"""
+Autocomplete للبحث أثناء الكتابة
+
+الـ trie ضمني فوق array مترتب من الـ keys: كل node هي range متصل [lo, hi) من الـ keys اللي بتبدأ بالـ prefix بتاعها
+(bisect بدل nodes كـ objects، فالذاكرة قريبة من حجم الـ keys نفسها). الـ top-k بالـ popularity محسوب مسبقاً
+للـ nodes الكبيرة، والأخطاء الإملائية بـ Levenshtein automaton ماشي على نفس الـ trie
+"""
+import heapq
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+
+from text import words
+
+SUGGEST_TOP_K = 10
+# كل اسم بيتسجل من أول كلمة وتاني كلمة وتالت كلمة: "iph" تلاقي "Apple iPhone 15"
+SUFFIX_WORDS = 3
+MAX_KEY_CHARS = 48
+# nodes أكبر من كده الـ top-k بتاعها بيتخزن (الأصغر بيتحسب وقت الطلب، رخيص)
+TOP_CACHE_MIN_RANGE = 64
+# وقت الـ build بنحسب مسبقاً لحد العمق ده (الـ prefixes القصيرة هي اللي ranges بتاعتها كبيرة)
+WARM_DEPTH = 4
+_END = "\U0010ffff"
+
+
+def product_weight(source: dict) -> float:
+    # rating عالي وتقييمات كتير = يطلع الأول
+    return 1.0 + (source.get("rating") or 0.0) + math.log1p(source.get("reviews") or 0.0)
+
+
+def normalize_phrase(text: str) -> str:
+    return " ".join(words(text))
+
+
+def suggestion_keys(phrase: str) -> tuple[str, ...]:
+    """
+    phrase = ناتج normalize_phrase
+    """
+    w = phrase.split(" ")
+    return tuple(dict.fromkeys(" ".join(w[i:])[:MAX_KEY_CHARS] for i in range(min(len(w), SUFFIX_WORDS))))
+
+
+def max_edits(length: int) -> int:
+    # كلمة قصيرة مع أخطاء كتير = أي حاجة تطابق
+    if length < 3:
+        return 0
+    return 1 if length < 7 else 2
+
+
+class Suggester:
+    """
+    الجزء اللي بيقرا: مشترك بين Autocomplete (في الذاكرة) والـ snapshot (mmap)
+
+    الـ subclass بيوفر: keys (مترتبة)، key_ids (suggestion لكل key)، texts، weights
+    """
+    def __init__(self):
+        self._top_cache: dict[str, tuple[int, ...]] = {}
+
+    def _rank(self, sid: int):
+        return self.weights[sid], -sid
+
+    def _cached_top(self, prefix: str) -> tuple[int, ...] | None:
+        return self._top_cache.get(prefix)
+
+    def _top(self, prefix: str, lo: int, hi: int) -> tuple[int, ...]:
+        top = self._cached_top(prefix)
+        if top is None:
+            top = tuple(heapq.nlargest(SUGGEST_TOP_K, set(self.key_ids[lo:hi]), key=self._rank))
+            if hi - lo >= TOP_CACHE_MIN_RANGE:
+                self._top_cache[prefix] = top
+        return top
+
+    def _range(self, prefix: str) -> tuple[int, int]:
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + _END)
+
+    def _children(self, prefix: str, lo: int, hi: int):
+        keys = self.keys
+        depth = len(prefix)
+        i = lo
+        while i < hi:
+            key = keys[i]
+            if len(key) <= depth:
+                i += 1
+                continue
+            child = prefix + key[depth]
+            j = bisect_left(keys, child + _END, i, hi)
+            yield child, i, j
+            i = j
+
+    def _warm(self, prefix: str = "", lo: int = 0, hi: int | None = None) -> tuple[int, ...]:
+        """
+        top-k من تحت لفوق: top الـ node = أحسن k من tops الأولاد + الـ keys اللي بتخلص عندها
+        """
+        hi = len(self.keys) if hi is None else hi
+        if hi - lo < TOP_CACHE_MIN_RANGE or len(prefix) >= WARM_DEPTH:
+            return self._top(prefix, lo, hi)
+        candidates = set()
+        first_child = hi
+        for child, i, j in self._children(prefix, lo, hi):
+            first_child = min(first_child, i)
+            candidates.update(self._warm(child, i, j))
+        candidates.update(self.key_ids[lo:first_child])
+        top = self._top_cache[prefix] = tuple(heapq.nlargest(SUGGEST_TOP_K, candidates, key=self._rank))
+        return top
+
+    def _fuzzy(self, query: str, edits: int) -> list[tuple[int, str, int, int]]:
+        """
+        Levenshtein automaton: الـ state هي صف الـ DP (المسافة بين كل prefix من الـ query والـ node)
+        node الـ query كلها توصلها بـ edits أو أقل = كل الـ subtree بتاعها completions بالتكلفة دي
+
+        الصف محسوب في band عرضه 2 * edits + 1 بس، وأي قيمة أكبر من edits بتتسجل edits + 1
+        """
+        m = len(query)
+        cap = edits + 1
+        matches = []
+        stack = [("", 0, len(self.keys), tuple(min(k, cap) for k in range(m + 1)), 0)]
+        while stack:
+            prefix, lo, hi, row, lowest = stack.pop()
+            cost = row[m]
+            if cost <= edits:
+                matches.append((cost, prefix, lo, hi))
+                if lowest >= cost:
+                    continue
+            for child, i, j in self._children(prefix, lo, hi):
+                char = child[-1]
+                depth = len(child)
+                new_row = [cap] * (m + 1)
+                best = new_row[0] = depth if depth < cap else cap
+                for k in range(max(1, depth - edits), min(m, depth + edits) + 1):
+                    v = row[k - 1] + (query[k - 1] != char)
+                    x = row[k] + 1
+                    if x < v:
+                        v = x
+                    x = new_row[k - 1] + 1
+                    if x < v:
+                        v = x
+                    if v > cap:
+                        v = cap
+                    new_row[k] = v
+                    if v < best:
+                        best = v
+                if best <= edits:
+                    stack.append((child, i, j, new_row, best))
+        return matches
+
+    def suggest(self, query: str, limit: int = SUGGEST_TOP_K, fuzzy: bool = True) -> list[dict]:
+        q = normalize_phrase(query)[:MAX_KEY_CHARS]
+        if not q or not len(self.keys):
+            return []
+
+        best: dict[int, int] = {}
+        lo, hi = self._range(q)
+        for sid in self._top(q, lo, hi):
+            best[sid] = 0
+
+        edits = max_edits(len(q))
+        # الـ prefix المظبوط كفاية = مفيش داعي للـ automaton
+        if fuzzy and edits and len(best) < limit:
+            for cost, prefix, lo, hi in self._fuzzy(q, edits):
+                for sid in self._top(prefix, lo, hi):
+                    if best.get(sid, cost + 1) > cost:
+                        best[sid] = cost
+
+        weights = self.weights
+        ranked = sorted(best.items(), key=lambda item: (item[1], -weights[item[0]], item[0]))[:limit]
+        return [{"text": self.texts[sid], "edits": cost, "weight": round(weights[sid], 3)} for sid, cost in ranked]
+
+
+class Autocomplete(Suggester):
+    """
+    النسخة اللي بتتعدل مع كل تغيير في المنتجات (الـ indexer بيناديها من نفس مكان الـ SearchIndex)
+    كل suggestion = اسم منتج (بعد الـ normalize)، والـ weight مجموع popularity المنتجات اللي بنفس الاسم
+    """
+    def __init__(self):
+        super().__init__()
+        self.keys: list[str] = []
+        self.key_ids = array("I")
+        self.texts: list[str | None] = []
+        self.weights = array("d")
+        self._counts = array("I")
+        self._by_text: dict[str, int] = {}
+        self._products: dict[str, tuple[int, float]] = {}
+
+    def __len__(self):
+        return len(self._by_text)
+
+    @classmethod
+    def build(cls, sources) -> "Autocomplete":
+        """
+        تحميل كامل: sort واحد للـ keys بدل insert لكل واحد
+        """
+        ac = cls()
+        for source in sources:
+            sid = ac._suggestion(source.get("name") or "", insert_keys=False)
+            if sid is None:
+                continue
+            weight = product_weight(source)
+            ac._products[source["id"]] = (sid, weight)
+            ac.weights[sid] += weight
+            ac._counts[sid] += 1
+        keys, key_ids = [], array("I")
+        for phrase, sid in ac._by_text.items():
+            for key in suggestion_keys(phrase):
+                keys.append(key)
+                key_ids.append(sid)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        ac.keys = [keys[i] for i in order]
+        ac.key_ids = array("I", (key_ids[i] for i in order))
+        ac._warm()
+        return ac
+
+    def _suggestion(self, name: str, insert_keys: bool = True) -> int | None:
+        phrase = normalize_phrase(name)
+        if not phrase:
+            return None
+        sid = self._by_text.get(phrase)
+        if sid is None:
+            sid = self._by_text[phrase] = len(self.texts)
+            self.texts.append(name.strip())
+            self.weights.append(0.0)
+            self._counts.append(0)
+            if insert_keys:
+                for key in suggestion_keys(phrase):
+                    i = bisect_right(self.keys, key)
+                    self.keys.insert(i, key)
+                    self.key_ids.insert(i, sid)
+        return sid
+
+    def upsert(self, source: dict):
+        weight = product_weight(source)
+        current = self._products.get(source["id"])
+        sid = self._suggestion(source.get("name") or "")
+        if current == (sid, weight):
+            return
+        # الجديد الأول: لو نفس الـ suggestion مش عايزين الـ count يوصل صفر في النص فتتشال
+        if sid is not None:
+            self._products[source["id"]] = (sid, weight)
+            self._adjust(sid, weight, added=True)
+        else:
+            self._products.pop(source["id"], None)
+        if current is not None:
+            self._adjust(*current, added=False)
+
+    def remove(self, product_id: str):
+        current = self._products.pop(product_id, None)
+        if current is not None:
+            self._adjust(*current, added=False)
+
+    def _adjust(self, sid: int, weight: float, added: bool):
+        if added:
+            self.weights[sid] += weight
+            self._counts[sid] += 1
+        else:
+            self.weights[sid] -= weight
+            self._counts[sid] -= 1
+
+        phrase = normalize_phrase(self.texts[sid])
+        keys = suggestion_keys(phrase)
+        prefixes = {key[:n] for key in keys for n in range(len(key) + 1)}
+        for prefix in prefixes & self._top_cache.keys():
+            top = self._top_cache[prefix]
+            if added:
+                # الـ weight زاد: يكفي ندخله في الـ top-k الموجود
+                self._top_cache[prefix] = tuple(heapq.nlargest(SUGGEST_TOP_K, {*top, sid}, key=self._rank))
+            elif sid in top:
+                # قل أو اتشال: الـ top-k يتحسب تاني وقت أول طلب
+                del self._top_cache[prefix]
+
+        if not added and self._counts[sid] == 0:
+            for key in keys:
+                i = bisect_left(self.keys, key)
+                while self.key_ids[i] != sid:
+                    i += 1
+                del self.keys[i]
+                del self.key_ids[i]
+            del self._by_text[phrase]
+            self.texts[sid] = None
+            self.weights[sid] = 0.0
+
+    def freeze(self) -> dict:
+        return {
+            "keys": list(self.keys),
+            "key_ids": self.key_ids[:],
+            "texts": list(self.texts),
+            "weights": self.weights[:],
+            "top": dict(self._top_cache),
+        }
+
+    def stats(self) -> dict:
+        return {"suggestions": len(self._by_text), "keys": len(self.keys), "cached_nodes": len(self._top_cache)}
@@ -0,0 +1,221 @@
+# services/catalog/bench/run.py
+"""
+Benchmark للبحث والـ facets على catalog صناعي (1M منتج افتراضياً) بالكامل offline من غير Mongo
+
+    python bench/run.py --docs 1000000 --out bench/results/latest.json
+    python bench/run.py --compare bench/results/latest.json
+
+أول مرة بيبني الـ index ويكتبه snapshot في data/ (بياخد دقيقة أو أكتر على 1M)، والمرات الجاية بيفتحه بـ mmap علطول
+--target memory بيقيس الـ SearchIndex اللي في الذاكرة (زي الـ writer) بدل الـ snapshot (زي الـ readers)
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from search_index import SearchIndex  # noqa: E402
+from snapshot import Snapshot, SnapshotError, write_snapshot  # noqa: E402
+
+VOCABULARY = 20000
+CATEGORIES = 60
+BRANDS = 2000
+SCENARIOS = ["browse", "browse-category", "browse-filters", "sort-price", "sort-rating-deep", "text", "text-filters"]
+
+
+def synthetic_products(count: int, seed: int):
+    """
+    توزيعات قريبة من catalog حقيقي: كلمات وbrands بـ Zipf (قليل شائع وكتير نادر)، أسعار lognormal
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"w{i}" for i in range(VOCABULARY)]
+    categories = [f"Category {i}" for i in range(CATEGORIES)]
+    brands = [f"Brand{i}" for i in range(BRANDS)]
+    words = (rng.zipf(1.3, size=(count, 16)) - 1) % VOCABULARY
+    category = (rng.zipf(1.5, size=count) - 1) % CATEGORIES
+    brand = (rng.zipf(1.4, size=count) - 1) % BRANDS
+    price = np.round(rng.lognormal(4.0, 1.2, size=count), 2)
+    rating = np.round(np.clip(rng.normal(4.0, 0.7, size=count), 1, 5), 1)
+    reviews = rng.geometric(0.01, size=count)
+    for i in range(count):
+        w = words[i].tolist()
+        yield {
+            "id": f"p{i}",
+            "name": " ".join(vocabulary[j] for j in w[:5]),
+            "description": " ".join(vocabulary[j] for j in w[5:]),
+            "category": categories[category[i]],
+            "brand": brands[brand[i]],
+            "price": float(price[i]),
+            "rating": float(rating[i]),
+            "reviews": int(reviews[i]),
+        }
+
+
+def load_snapshot(args) -> Snapshot:
+    path = args.snapshot or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", f"bench-{args.docs}-{args.seed}.idx")
+    try:
+        return Snapshot(path)
+    except (OSError, SnapshotError):
+        pass
+    print(f"building {args.docs} synthetic products ...")
+    started = time.perf_counter()
+    index = SearchIndex()
+    for source in synthetic_products(args.docs, args.seed):
+        index.upsert(source)
+    print(f"built in {time.perf_counter() - started:.1f}s, writing {path}")
+    write_snapshot(index.freeze(), path, {"bench": {"docs": args.docs, "seed": args.seed}})
+    return Snapshot(path)
+
+
+def build_query(scenario: str, rng: np.random.Generator) -> dict:
+    # الكلمات الشائعة (postings طويلة) هي اللي بتتقل: 1 لـ 50 من أول الـ Zipf
+    word = lambda: f"w{int(rng.integers(1, 50))}"  # noqa: E731
+    category = f"Category {int(rng.integers(0, 10))}"
+    if scenario == "browse":
+        return {"query": ""}
+    if scenario == "browse-category":
+        return {"query": "", "category": category}
+    if scenario == "browse-filters":
+        return {"query": "", "category": category, "brand": f"Brand{int(rng.integers(0, 20))}",
+                "min_price": 20, "max_price": 200, "min_rating": 4}
+    if scenario == "sort-price":
+        return {"query": "", "category": category, "sort": "price_asc"}
+    if scenario == "sort-rating-deep":
+        return {"query": "", "sort": "rating", "offset": 500}
+    if scenario == "text":
+        return {"query": f"{word()} {word()}"}
+    if scenario == "text-filters":
+        return {"query": word(), "category": category, "max_price": 100, "sort": "price_desc"}
+    raise ValueError(scenario)
+
+
+def summarize(values: list[float]) -> dict:
+    ms = [v * 1000 for v in values]
+    if len(ms) < 2:
+        return {"p50": ms[0], "p95": ms[0], "p99": ms[0], "max": ms[0], "mean": ms[0]}
+    q = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "p50": round(q[49], 3),
+        "p95": round(q[94], 3),
+        "p99": round(q[98], 3),
+        "max": round(max(ms), 3),
+        "mean": round(statistics.fmean(ms), 3),
+    }
+
+
+def run_scenario(searcher, scenario: str, total: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    queries = [build_query(scenario, rng) for _ in range(total)]
+    latencies = []
+    matched = 0
+    started = time.perf_counter()
+    for kwargs in queries:
+        t = time.perf_counter()
+        result = searcher.search(**kwargs)
+        latencies.append(time.perf_counter() - t)
+        matched += result["total"]
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_qps": round(total / elapsed, 1),
+        "mean_matched": round(matched / total),
+        "latency_ms": summarize(latencies),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    started = time.perf_counter()
+    searcher = load_snapshot(args)
+    if args.target == "memory":
+        searcher = SearchIndex.from_snapshot(searcher)
+    print(f"{args.target} index ready in {time.perf_counter() - started:.1f}s: {searcher.doc_count} docs")
+
+    results = {}
+    for scenario in args.scenarios:
+        # warm-up: الـ postings cache والـ bitsets خارج القياس
+        run_scenario(searcher, scenario, min(args.warmup, args.requests), args.seed + 1)
+        results[scenario] = run_scenario(searcher, scenario, args.requests, args.seed)
+        print(format_row(scenario, results[scenario]))
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "target": args.target,
+            "docs": searcher.doc_count,
+            "requests": args.requests,
+        },
+        "results": results,
+    }
+
+
+def format_row(scenario: str, r: dict) -> str:
+    lat = r["latency_ms"]
+    return (
+        f"{scenario:<18} {r['throughput_qps']:>9.1f} q/s  "
+        f"p50 {lat['p50']:>8.2f}  p95 {lat['p95']:>8.2f}  p99 {lat['p99']:>8.2f} ms  matched ~{r['mean_matched']}"
+    )
+
+
+def compare(previous: dict, current: dict):
+    print(f"\ncompared with {previous['meta'].get('git_commit')} ({previous['meta'].get('timestamp')})")
+    for scenario, now in current["results"].items():
+        before = previous["results"].get(scenario)
+        if not before:
+            continue
+        cells = []
+        for key in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"][key], now["latency_ms"][key]
+            cells.append(f"{key} {(new - old) / old * 100 if old else 0:+6.1f}%")
+        old, new = before["throughput_qps"], now["throughput_qps"]
+        cells.append(f"throughput {(new - old) / old * 100 if old else 0:+6.1f}%")
+        print(f"{scenario:<18} " + "  ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=200, help="queries per scenario")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--target", choices=["snapshot", "memory"], default="snapshot")
+    parser.add_argument("--snapshot", help="snapshot path (default: data/bench-<docs>-<seed>.idx, built if missing)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "latest.json"))
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nresults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# services/catalog/docvalues.py
+"""
+Doc-values كـ NumPy columns: الـ filters والـ facets والـ histograms والـ top-k بتتحسب vectorized
+على الـ candidates بدل loop في Python لكل doc
+"""
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+PRICE_BUCKETS = (0, 25, 50, 100, 200, 500, 1000)
+SORTS = ("relevance", "price_asc", "price_desc", "rating")
+BITSET_CACHE_SIZE = 256
+
+
+class Column:
+    """
+    عمود NumPy بيكبر بالمضاعفة (زي list): append رخيص، والتكبير بيعمل array جديد
+    فأي view اتاخد في query قبل كده بيفضل سليم (مش زي array.array اللي بيرفض يكبر وفيه export)
+    """
+    __slots__ = ("dtype", "_data", "_size")
+
+    def __init__(self, dtype, values=None):
+        self.dtype = np.dtype(dtype)
+        data = np.array(values if values is not None else (), dtype=self.dtype)
+        self._size = len(data)
+        self._data = data if len(data) else np.empty(16, dtype=self.dtype)
+
+    def append(self, value):
+        if self._size == len(self._data):
+            grown = np.empty(max(16, 2 * len(self._data)), dtype=self.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size] = value
+        self._size += 1
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def __setitem__(self, i, value):
+        self.values[i] = value
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[:self._size]
+
+
+@dataclass
+class Columns:
+    """
+    الأعمدة كـ ndarrays لحظة الـ query (views، من غير نسخ)؛ alive = None معناها كل الـ docs حية
+    """
+    doc_len: np.ndarray
+    price: np.ndarray
+    price_bucket: np.ndarray
+    rating: np.ndarray
+    category: np.ndarray
+    brand: np.ndarray
+    alive: np.ndarray | None
+
+
+class Bitsets:
+    """
+    bitset (bit لكل doc، packed) لكل قيمة category/brand اتفلتر بيها: على 1M doc ده 125KB
+    بدل مقارنة العمود كله مع كل طلب تصفح. بيتمسح لما الـ index يتغير (version)
+    """
+    def __init__(self, size: int = BITSET_CACHE_SIZE):
+        self.size = size
+        self._cache: OrderedDict = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def mask(self, version, key, count: int, build) -> np.ndarray:
+        if version != self._version:
+            self._cache.clear()
+            self._version = version
+        bits = self._cache.get(key)
+        if bits is None:
+            self.misses += 1
+            bits = self._cache[key] = np.packbits(build())
+            if len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        else:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        return np.unpackbits(bits, count=count).view(np.bool_)
+
+    def stats(self) -> dict:
+        return {"bitsets": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def combine(masks: dict, exclude: str | None = None) -> np.ndarray | None:
+    """
+    AND لكل الـ masks ما عدا exclude (كل facet بيتحسب بكل الـ filters ما عدا filter بتاعه)؛ None = مفيش filter
+    """
+    result = None
+    for name, mask in masks.items():
+        if mask is None or name == exclude:
+            continue
+        result = mask if result is None else result & mask
+    return result
+
+
+class Selection:
+    """
+    values[mask] بـ positions محسوبة مرة لكل mask: لما filter واحد بس شغال كل الـ facets بتستخدم نفس الـ mask
+    (الـ mask نفسه بيتخزن جنب الـ positions عشان الـ id بتاعه ميتعادش استخدامه في نفس الطلب)
+    """
+    def __init__(self):
+        self._positions: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+    def positions(self, mask: np.ndarray) -> np.ndarray:
+        entry = self._positions.get(id(mask))
+        if entry is None:
+            entry = self._positions[id(mask)] = (mask, np.flatnonzero(mask))
+        return entry[1]
+
+    def __call__(self, values: np.ndarray, mask: np.ndarray | None) -> np.ndarray:
+        return values if mask is None else values.take(self.positions(mask))
+
+
+def price_bucket(price: float) -> int:
+    """
+    رقم الـ bucket بيتحسب مرة وقت الـ indexing (عمود u8)، فالـ histogram وقت الطلب bincount بس
+    """
+    return max(bisect_right(PRICE_BUCKETS, price) - 1, 0)
+
+
+def price_histogram(buckets: np.ndarray) -> np.ndarray:
+    return np.bincount(buckets, minlength=len(PRICE_BUCKETS))
+
+
+def top_k(keys: np.ndarray, ids: np.ndarray, k: int) -> np.ndarray:
+    """
+    positions أصغر k keys بالترتيب، والتعادل بالـ id (ثابت بين الصفحات)
+    argpartition بيجيب الحد، وبعدين lexsort على اللي أصغر منه أو قده بس
+    """
+    n = len(keys)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        kth = np.partition(keys, k - 1)[k - 1]
+        candidates = np.flatnonzero(keys <= kth)
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((ids[candidates], keys[candidates]))[:k]
+    return candidates[order]
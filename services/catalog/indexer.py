@@ -1 +1,405 @@
-print("Hello from Catalog/Search Service (Python)")
+# services/catalog/indexer.py
+"""
+Catalog/Search service: بيحمّل المنتجات من Mongo في inverted index في الذاكرة ويفضل متزامن معاها
+
+    uvicorn indexer:app --port 5005 --workers 4
+
+مع أكتر من worker: واحد بس (اللي ماسك الـ lock) بيعمل sync من Mongo ويكتب snapshot كل شوية،
+والباقيين بيقروا الـ snapshot بـ mmap (نسخة واحدة في الـ page cache) ويبدّلوه لما يتكتب واحد جديد
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+from autocomplete import SUGGEST_TOP_K, Autocomplete
+from docvalues import SORTS
+from search_index import SearchIndex, product_source
+from snapshot import Snapshot, SnapshotHolder, write_snapshot
+
+load_dotenv()
+
+logger = logging.getLogger("catalog")
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "amazon_clone")
+PRODUCTS_COLLECTION = "products"
+
+CATALOG_LOAD_BATCH_SIZE = int(os.getenv("CATALOG_LOAD_BATCH_SIZE", "2000"))
+# الـ polling بيستخدم الحقل ده لو الـ change streams مش متاحة (Mongo standalone مش replica set)
+CATALOG_UPDATED_FIELD = os.getenv("CATALOG_UPDATED_FIELD", "updatedAt")
+CATALOG_POLL_INTERVAL = float(os.getenv("CATALOG_POLL_INTERVAL", "2"))
+# الـ polling مبيشوفش الحذف: كل فترة بنقارن الـ ids. ولو مفيش منتج فيه CATALOG_UPDATED_FIELD خالص
+# (الـ product service مبيكتبوش) الـ polling بيقف والـ sync كله بيبقى rescan كامل كل الفترة دي
+CATALOG_RECONCILE_INTERVAL = float(os.getenv("CATALOG_RECONCILE_INTERVAL", "300"))
+SEARCH_MAX_LIMIT = 100
+
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH", "data/catalog.idx")
+CATALOG_SNAPSHOT_INTERVAL = float(os.getenv("CATALOG_SNAPSHOT_INTERVAL", "60"))
+CATALOG_SNAPSHOT_CHECK_INTERVAL = float(os.getenv("CATALOG_SNAPSHOT_CHECK_INTERVAL", "1"))
+# Mongo error codes: الـ resume token أقدم من الـ oplog
+CHANGE_STREAM_HISTORY_LOST = (280, 286)
+
+PRODUCT_PROJECTION = {
+    f: 1 for f in ("name", "description", "category", "brand", "price", "rating", "numReviews", CATALOG_UPDATED_FIELD)
+}
+
+
+class CatalogSync:
+    def __init__(self, collection, search_index: SearchIndex):
+        self.collection = collection
+        self.index = search_index
+        self.suggest = Autocomplete()
+        # وقت التحميل الكامل الـ autocomplete بيتبني مرة واحدة في الآخر بدل insert لكل منتج
+        self._loading = False
+        self.mode = "starting"
+        self.ready = False
+        self.loaded_at: datetime | None = None
+        self.applied = 0
+        self.unchanged = 0
+        # product id -> hash الحقول اللي بتتعمل index: نفس المنتج من غير تغيير مبيتعملوش upsert تاني
+        # (من غير كده الـ version بيزيد والـ snapshot بيتكتب من جديد مع كل poll)
+        # بعد restore من snapshot بيبدأ فاضي، فأول rescan بيعيد index الكل مرة واحدة
+        self._fingerprints: dict[str, int] = {}
+        self.resume_token: dict | None = None
+        self._last_seen: datetime | None = None
+        # الـ poll بيقرا بـ $gte فالمنتجات اللي على نفس الـ timestamp بترجع تاني: مش بنعيد indexها
+        self._seen_at_last: set = set()
+
+    def _apply(self, doc: dict):
+        source = product_source(doc)
+        fingerprint = hash(tuple(source.values()))
+        if self._fingerprints.get(source["id"]) == fingerprint:
+            self.unchanged += 1
+        else:
+            self._fingerprints[source["id"]] = fingerprint
+            self.index.upsert(source)
+            if not self._loading:
+                self.suggest.upsert(source)
+            self.applied += 1
+        updated = doc.get(CATALOG_UPDATED_FIELD)
+        if isinstance(updated, datetime):
+            if self._last_seen is None or updated > self._last_seen:
+                self._last_seen = updated
+                self._seen_at_last = set()
+            if updated == self._last_seen:
+                self._seen_at_last.add(doc["_id"])
+
+    def _remove(self, product_id: str):
+        self._fingerprints.pop(product_id, None)
+        self.index.remove(product_id)
+        self.suggest.remove(product_id)
+
+    def position(self) -> dict:
+        """
+        مكان الـ sync اللي بيتحفظ في الـ snapshot عشان الـ writer الجاي يكمل منه بدل ما يحمّل كله من الأول
+        """
+        return {
+            "resume_token": self.resume_token,
+            "last_seen": self._last_seen.isoformat() if self._last_seen else None,
+            "seen_at_last": [str(i) for i in self._seen_at_last],
+        }
+
+    async def restore(self, snapshot: Snapshot):
+        started = time.perf_counter()
+        def load():
+            index = SearchIndex.from_snapshot(snapshot)
+            return index, Autocomplete.build(index.documents())
+
+        self.index, self.suggest = await asyncio.to_thread(load)
+        position = snapshot.meta.get("sync") or {}
+        self.resume_token = position.get("resume_token")
+        if position.get("last_seen"):
+            self._last_seen = datetime.fromisoformat(position["last_seen"])
+            self._seen_at_last = {ObjectId(i) if ObjectId.is_valid(i) else i for i in position.get("seen_at_last", [])}
+        self.loaded_at = datetime.utcnow()
+        logger.info("restored %d products from snapshot in %.2fs", len(self.index), time.perf_counter() - started)
+
+    async def bulk_load(self):
+        started = time.perf_counter()
+        cursor = self.collection.find({}, PRODUCT_PROJECTION, batch_size=CATALOG_LOAD_BATCH_SIZE)
+        count = 0
+        self._loading = True
+        try:
+            async for doc in cursor:
+                self._apply(doc)
+                count += 1
+                # الـ event loop يفضل بيرد (health) وإحنا بنحمّل كتالوج كبير
+                if count % CATALOG_LOAD_BATCH_SIZE == 0:
+                    await asyncio.sleep(0)
+        finally:
+            self._loading = False
+        self.suggest = await asyncio.to_thread(Autocomplete.build, list(self.index.documents()))
+        self.loaded_at = datetime.utcnow()
+        logger.info("indexed %d products in %.2fs", count, time.perf_counter() - started)
+
+    async def _cluster_time(self):
+        # وقت الـ cluster قبل التحميل: الـ change stream يبدأ منه فمفيش تعديل يضيع بين التحميل والـ watch
+        try:
+            return (await self.collection.database.command("ping")).get("operationTime")
+        except PyMongoError:
+            return None
+
+    async def ensure_indexes(self):
+        # الـ poll بيعمل range + sort على الحقل ده كل CATALOG_POLL_INTERVAL
+        try:
+            await self.collection.create_index([(CATALOG_UPDATED_FIELD, 1)])
+        except OperationFailure as e:
+            logger.warning("could not create index on %s: %s", CATALOG_UPDATED_FIELD, e)
+
+    async def run(self, snapshot: Snapshot | None = None):
+        await self.ensure_indexes()
+        start_at = None
+        if snapshot is not None:
+            await self.restore(snapshot)
+        else:
+            start_at = await self._cluster_time()
+            await self.bulk_load()
+        self.ready = True
+
+        while True:
+            try:
+                await self.watch(start_at)
+            except OperationFailure as e:
+                if self.resume_token and e.code in CHANGE_STREAM_HISTORY_LOST:
+                    # الـ snapshot أقدم من الـ oplog: نحمّل من Mongo تاني فوق الموجود
+                    logger.warning("snapshot resume token expired, reloading products from Mongo")
+                    self.resume_token = None
+                    start_at = await self._cluster_time()
+                    await self.bulk_load()
+                    await self.reconcile_deletes()
+                    continue
+                logger.warning("change streams unavailable (%s), polling %s instead", e, CATALOG_UPDATED_FIELD)
+                await self.poll(reconcile_first=snapshot is not None)
+                return
+
+    async def watch(self, start_at=None):
+        while True:
+            options = {"resume_after": self.resume_token} if self.resume_token else {"start_at_operation_time": start_at}
+            try:
+                async with self.collection.watch(full_document="updateLookup", **options) as stream:
+                    self.mode = "change_stream"
+                    async for change in stream:
+                        self.resume_token = stream.resume_token
+                        op = change["operationType"]
+                        if op == "delete":
+                            self._remove(str(change["documentKey"]["_id"]))
+                        elif change.get("fullDocument") is not None:
+                            self._apply(change["fullDocument"])
+                        elif op in ("update", "replace"):
+                            # المنتج اتمسح قبل الـ lookup
+                            self._remove(str(change["documentKey"]["_id"]))
+            except OperationFailure:
+                raise
+            except PyMongoError:
+                logger.exception("change stream interrupted, resuming")
+                await asyncio.sleep(1)
+
+    async def poll(self, reconcile_first: bool = False):
+        self.mode = "polling"
+        # بعد restore من snapshot: الحذف اللي حصل من ساعتها مش هيبان غير بالـ reconcile
+        last_reconcile = float("-inf") if reconcile_first else time.monotonic()
+        while True:
+            try:
+                if self._last_seen is None and not await self._has_updated_field():
+                    # {} هنا كان معناه الكتالوج كله كل CATALOG_POLL_INTERVAL
+                    if self.mode != "rescan":
+                        logger.warning("no product has %s, rescanning every %ss instead of polling",
+                                       CATALOG_UPDATED_FIELD, CATALOG_RECONCILE_INTERVAL)
+                        self.mode = "rescan"
+                    if time.monotonic() - last_reconcile >= CATALOG_RECONCILE_INTERVAL:
+                        await self.rescan()
+                        last_reconcile = time.monotonic()
+                    await asyncio.sleep(CATALOG_POLL_INTERVAL)
+                    continue
+                self.mode = "polling"
+                query = {CATALOG_UPDATED_FIELD: {"$gte": self._last_seen} if self._last_seen else {"$exists": True}}
+                cursor = self.collection.find(query, PRODUCT_PROJECTION, batch_size=CATALOG_LOAD_BATCH_SIZE) \
+                    .sort(CATALOG_UPDATED_FIELD, 1)
+                async for doc in cursor:
+                    if doc.get(CATALOG_UPDATED_FIELD) == self._last_seen and doc["_id"] in self._seen_at_last:
+                        continue
+                    self._apply(doc)
+                if time.monotonic() - last_reconcile >= CATALOG_RECONCILE_INTERVAL:
+                    await self.reconcile_deletes()
+                    last_reconcile = time.monotonic()
+            except PyMongoError:
+                logger.exception("catalog poll failed")
+            await asyncio.sleep(CATALOG_POLL_INTERVAL)
+
+    async def _has_updated_field(self) -> bool:
+        return await self.collection.find_one({CATALOG_UPDATED_FIELD: {"$exists": True}}, {"_id": 1}) is not None
+
+    async def rescan(self):
+        """
+        مقارنة كاملة من غير CATALOG_UPDATED_FIELD: كل المنتجات بتتقري، واللي اتغير بس بيتعمله upsert، واللي اتمسح بيتشال
+        """
+        ids = set()
+        count = 0
+        async for doc in self.collection.find({}, PRODUCT_PROJECTION, batch_size=CATALOG_LOAD_BATCH_SIZE):
+            ids.add(str(doc["_id"]))
+            self._apply(doc)
+            count += 1
+            if count % CATALOG_LOAD_BATCH_SIZE == 0:
+                await asyncio.sleep(0)
+        for product_id in [p for p in self.index.by_product if p not in ids]:
+            self._remove(product_id)
+
+    async def reconcile_deletes(self):
+        ids = {str(doc["_id"]) async for doc in self.collection.find({}, {"_id": 1}, batch_size=10000)}
+        for product_id in [p for p in self.index.by_product if p not in ids]:
+            self._remove(product_id)
+
+    def stats(self) -> dict:
+        return {
+            "role": "writer",
+            "mode": self.mode,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "applied": self.applied,
+            "unchanged": self.unchanged,
+            **self.index.stats(),
+            "autocomplete": self.suggest.stats(),
+        }
+
+
+_client: AsyncIOMotorClient | None = None
+sync: CatalogSync | None = None
+holder = SnapshotHolder(CATALOG_SNAPSHOT_PATH)
+
+
+async def write_snapshots():
+    written = None
+    try:
+        while True:
+            await asyncio.sleep(CATALOG_SNAPSHOT_INTERVAL)
+            if sync.ready and sync.index.version != written:
+                written = await _write_snapshot()
+    finally:
+        # آخر snapshot وقت الـ shutdown = الـ deploy الجاي يبدأ من هنا
+        if sync.ready and sync.index.version != written:
+            await _write_snapshot()
+
+
+async def _write_snapshot():
+    # freeze و position مع بعض على الـ event loop (متسقين)، والكتابة نفسها في thread
+    version = sync.index.version
+    frozen, suggest, position = sync.index.freeze(), sync.suggest.freeze(), sync.position()
+    try:
+        await asyncio.to_thread(write_snapshot, frozen, CATALOG_SNAPSHOT_PATH, {"sync": position}, suggest)
+    except OSError:
+        logger.exception("could not write snapshot")
+        return None
+    return version
+
+
+async def supervise(tasks: list):
+    """
+    بيبدّل الـ snapshot لما يتكتب واحد جديد، ولو الـ writer وقع أي worker تاني ياخد مكانه
+    """
+    global _client, sync
+    while True:
+        holder.maybe_reload()
+        if sync is None and holder.try_acquire_writer():
+            logger.info("worker %d is the catalog writer", os.getpid())
+            _client = AsyncIOMotorClient(MONGO_URI)
+            sync = CatalogSync(_client[MONGO_DB][PRODUCTS_COLLECTION], SearchIndex())
+            tasks.append(asyncio.create_task(sync.run(holder.current)))
+            tasks.append(asyncio.create_task(write_snapshots()))
+        await asyncio.sleep(CATALOG_SNAPSHOT_CHECK_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    holder.maybe_reload()
+    tasks = []
+    supervisor = asyncio.create_task(supervise(tasks))
+    yield
+    supervisor.cancel()
+    for task in reversed(tasks):
+        task.cancel()
+    for task in [supervisor, *tasks]:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    holder.release_writer()
+    if _client is not None:
+        _client.close()
+
+
+def current_index():
+    # الـ writer بيدور على الـ index اللي في الذاكرة (أحدث)، لحد ما يجهز بيستخدم الـ snapshot زي الباقيين
+    if sync is not None and sync.ready:
+        return sync.index
+    return holder.current
+
+
+def current_suggester():
+    if sync is not None and sync.ready:
+        return sync.suggest
+    return holder.current.suggester if holder.current else None
+
+
+app = FastAPI(title="Catalog Search Service", lifespan=lifespan)
+
+
+@app.get("/")
+async def root():
+    return {"message": "Catalog Search Service is running"}
+
+
+@app.get("/health")
+async def health():
+    snapshot = holder.current.stats() if holder.current else None
+    if sync is not None:
+        return {**sync.stats(), "snapshot": snapshot}
+    return {"role": "reader", "snapshot": snapshot, "swaps": holder.swaps}
+
+
+# async عشان البحث يشتغل على الـ event loop نفسه: الـ sync task مبيعدلش الـ index في النص
+@app.get("/search")
+async def search(
+    q: str = "",
+    category: str | None = None,
+    brand: str | None = None,
+    min_price: float | None = Query(None, ge=0),
+    max_price: float | None = Query(None, ge=0),
+    min_rating: float | None = Query(None, ge=0, le=5),
+    sort: str = Query("relevance", pattern=f"^({'|'.join(SORTS)})$"),
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+):
+    index = current_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="catalog.index_not_ready")
+    started = time.perf_counter()
+    result = index.search(q, category=category, brand=brand, min_price=min_price, max_price=max_price,
+                          min_rating=min_rating, sort=sort, limit=limit, offset=offset)
+    result["took_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return ORJSONResponse(result)
+
+
+@app.get("/suggest")
+async def suggest(q: str = "", limit: int = Query(SUGGEST_TOP_K, ge=1, le=SUGGEST_TOP_K)):
+    """
+    بحث أثناء الكتابة: الـ frontend بيناديها مع كل حرف بدل regex على Mongo
+    """
+    suggester = current_suggester()
+    if suggester is None:
+        raise HTTPException(status_code=503, detail="catalog.index_not_ready")
+    started = time.perf_counter()
+    suggestions = suggester.suggest(q, limit=limit)
+    return ORJSONResponse({
+        "suggestions": suggestions,
+        "took_ms": round((time.perf_counter() - started) * 1000, 3),
+    })
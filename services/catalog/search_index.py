@@ -0,0 +1,502 @@
+# services/catalog/search_index.py
+"""
+Inverted index في الذاكرة للمنتجات: postings في arrays (مش lists of objects) وترتيب بـ BM25
+الـ filters والـ facets والترتيب vectorized على doc-values أعمدة NumPy (docvalues.py)
+"""
+import heapq
+import math
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+
+from docvalues import (
+    PRICE_BUCKETS, SORTS, Bitsets, Column, Columns, Selection, combine, price_bucket, price_histogram, top_k,
+)
+from text import ngrams, normalize, tokenize
+
+# وزن كل field في الـ term frequency
+FIELD_WEIGHTS = {"name": 3, "brand": 2, "category": 2, "description": 1}
+# الحقول اللي بترجع في النتايج (الباقي doc-values)
+STORED_FIELDS = ("id", "name", "brand", "reviews")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MAX_PREFIX_EXPANSIONS = 20
+MAX_FUZZY_EXPANSIONS = 5
+FUZZY_MIN_SIMILARITY = 0.3
+# لما نسبة المحذوف توصل كده بنعيد بناء الـ postings
+COMPACT_DEAD_RATIO = 0.2
+# postings الـ query لو أكتر من docs / كده: accumulator بطول الـ index بدل unique + bincount
+DENSE_SCORE_RATIO = 8
+# "4 نجوم وأكتر" ...
+RATING_THRESHOLDS = (4, 3, 2, 1)
+MAX_FACET_VALUES = 50
+
+
+def product_source(doc: dict) -> dict:
+    """
+    الحقول اللي بنحتفظ بيها من Mongo document (للـ indexing والنتايج)
+    """
+    def number(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+
+    return {
+        "id": str(doc["_id"]),
+        "name": doc.get("name") or "",
+        "description": doc.get("description") or "",
+        "category": doc.get("category") or "",
+        "brand": doc.get("brand") or "",
+        "price": number(doc.get("price")),
+        "rating": number(doc.get("rating")),
+        "reviews": int(number(doc.get("numReviews"))),
+    }
+
+
+class Searcher(ABC):
+    """
+    الترتيب والـ facets مشتركين بين الـ index اللي في الذاكرة والـ snapshot (snapshot.py)
+
+    الـ subclass بيوفر: term_postings / has_term / prefix_terms / ngram_terms / hit / columns
+    والـ dictionaries بتاعة الـ categorical fields: categories / brands و codes بتاعتهم
+    """
+    categories: list[str]
+    category_codes: dict[str, int]
+    brands: list[str]
+    brand_codes: dict[str, int]
+    bitsets: Bitsets
+    # الـ bitsets بتتمسح لما ده يتغير (الـ snapshot مبيتغيرش)
+    version = 0
+
+    @property
+    @abstractmethod
+    def doc_count(self) -> int:
+        ...
+
+    @property
+    @abstractmethod
+    def live_count(self) -> int:
+        ...
+
+    @property
+    @abstractmethod
+    def total_len(self) -> int:
+        ...
+
+    @abstractmethod
+    def columns(self) -> Columns:
+        ...
+
+    # ===== توسيع الكلمات: prefix للكلمة الأخيرة (بحث أثناء الكتابة) و n-grams للأخطاء
+    def similar_terms(self, token: str, limit: int = MAX_FUZZY_EXPANSIONS) -> list[str]:
+        grams = ngrams(token)
+        shared = Counter()
+        for gram in grams:
+            for term in self.ngram_terms(gram):
+                shared[term] += 1
+        scored = []
+        for term, count in shared.items():
+            similarity = count / len(grams | ngrams(term))
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((similarity, term))
+        return [term for _, term in heapq.nlargest(limit, scored)]
+
+    def expand(self, tokens: list[str], prefix: bool) -> list[list[str]]:
+        expanded = []
+        for i, token in enumerate(tokens):
+            last = prefix and i == len(tokens) - 1
+            if self.has_term(token):
+                terms = [token]
+                if last:
+                    terms += [t for t in self.prefix_terms(token) if t != token]
+            elif last and self.prefix_terms(token, 1):
+                terms = self.prefix_terms(token)
+            else:
+                terms = self.similar_terms(token)
+            expanded.append(terms)
+        return expanded
+
+    # ===== قراءة
+    def score(self, expanded: list[list[str]], cols: Columns) -> tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 لكل doc فيه كلمة على الأقل: (doc ids مترتبة، scores)
+        """
+        n = max(self.live_count, 1)
+        avgdl = (self.total_len / n) or 1.0
+        k1_norm = BM25_K1 * (1 - BM25_B)
+        k1_len = BM25_K1 * BM25_B / avgdl
+        parts: list[tuple[np.ndarray, np.ndarray]] = []
+        for terms in expanded:
+            for term in dict.fromkeys(terms):
+                docs, tfs = self.term_postings(term)
+                df = len(docs)
+                if not df:
+                    continue
+                weight = math.log(1 + (n - df + 0.5) / (df + 0.5)) * (BM25_K1 + 1)
+                # نسخة مش view: array.array مبتكبرش وعليها view عايش
+                ids = np.frombuffer(docs, dtype=np.uint32).copy()
+                tf = np.frombuffer(tfs, dtype=np.uint16).astype(np.float64)
+                if cols.alive is not None:
+                    keep = cols.alive[ids]
+                    ids, tf = ids[keep], tf[keep]
+                parts.append((ids, weight * tf / (tf + k1_norm + k1_len * cols.doc_len[ids])))
+
+        if not parts:
+            return np.empty(0, dtype=np.uint32), np.empty(0)
+        if len(parts) == 1:
+            return parts[0]
+        if sum(len(ids) for ids, _ in parts) * DENSE_SCORE_RATIO > self.doc_count:
+            # الـ doc ids جوه كل term مش بتتكرر فالـ += على fancy index صح
+            acc = np.zeros(self.doc_count)
+            for ids, scores in parts:
+                acc[ids] += scores
+            docs = np.flatnonzero(acc)
+            return docs, acc[docs]
+        docs, inverse = np.unique(np.concatenate([ids for ids, _ in parts]), return_inverse=True)
+        return docs, np.bincount(inverse, weights=np.concatenate([scores for _, scores in parts]))
+
+    def _filter(self, field: str, codes: dict[str, int], value: str | None, column: np.ndarray, docs):
+        """
+        mask لـ category/brand: في التصفح (docs = كل الـ index) من الـ bitset المتخزن
+        """
+        if not value:
+            return None
+        code = codes.get(normalize(value))
+        if code is None:
+            return np.zeros(len(column[docs]), dtype=np.bool_)
+        if isinstance(docs, slice):
+            return self.bitsets.mask(self.version, (field, code), len(column), lambda: column == code)
+        return column[docs] == code
+
+    def _facet(self, values: list[str], counts: np.ndarray) -> dict[str, int]:
+        codes = np.flatnonzero(counts)
+        codes = codes[np.argsort(-counts[codes], kind="stable")][:MAX_FACET_VALUES]
+        # منتجات من غير brand/category مش facet
+        return {values[code]: int(counts[code]) for code in codes if values[code]}
+
+    def search(
+        self,
+        query: str,
+        category: str | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        limit: int = 20,
+        offset: int = 0,
+        prefix: bool = True,
+        brand: str | None = None,
+        min_rating: float | None = None,
+        sort: str = "relevance",
+    ) -> dict:
+        if sort not in SORTS:
+            raise ValueError(f"unknown sort {sort!r}")
+        cols = self.columns()
+        tokens = tokenize(query)
+        if tokens:
+            docs, scores = self.score(self.expand(tokens, prefix), cols)
+            masks = {}
+        else:
+            # من غير كلمات بحث = تصفح بالـ filters بس، على الأعمدة كلها
+            docs, scores = slice(None), None
+            masks = {"alive": cols.alive}
+
+        prices = cols.price[docs]
+        ratings = cols.rating[docs]
+        low = float("-inf") if min_price is None else min_price
+        high = float("inf") if max_price is None else max_price
+        masks["category"] = self._filter("category", self.category_codes, category, cols.category, docs)
+        masks["brand"] = self._filter("brand", self.brand_codes, brand, cols.brand, docs)
+        masks["price"] = None if min_price is None and max_price is None else (prices >= low) & (prices <= high)
+        masks["rating"] = None if min_rating is None else ratings >= min_rating
+
+        # facets: كل facet بيتحسب بكل الـ filters ما عدا filter بتاعه
+        select = Selection()
+        category_counts = np.bincount(select(cols.category[docs], combine(masks, "category")),
+                                      minlength=len(self.categories))
+        brand_counts = np.bincount(select(cols.brand[docs], combine(masks, "brand")), minlength=len(self.brands))
+        price_counts = price_histogram(select(cols.price_bucket[docs], combine(masks, "price")))
+        rated = select(ratings, combine(masks, "rating"))
+        rating_counts = [int(np.count_nonzero(rated >= stars)) for stars in RATING_THRESHOLDS]
+
+        matched = combine(masks)
+        if scores is None:
+            ids = np.arange(len(prices)) if matched is None else select.positions(matched)
+        else:
+            ids = select(docs, matched)
+            scores = select(scores, matched)
+
+        keys = None
+        if sort == "price_asc":
+            keys = select(prices, matched)
+        elif sort == "price_desc":
+            keys = -select(prices, matched)
+        elif sort == "rating":
+            keys = -select(ratings, matched)
+        elif scores is not None:
+            keys = -scores
+        # التصفح بالـ relevance = ترتيب الـ doc ids زي ما هو
+        positions = np.arange(offset, min(offset + limit, len(ids))) if keys is None \
+            else top_k(keys, ids, offset + limit)[offset:]
+
+        return {
+            "total": len(ids),
+            "hits": [
+                {**self.hit(int(ids[i])), "score": 0.0 if scores is None else round(float(scores[i]), 4)} for i in positions
+            ],
+            "facets": {
+                "category": self._facet(self.categories, category_counts),
+                "brand": self._facet(self.brands, brand_counts),
+                "price": [
+                    {"from": low, "to": PRICE_BUCKETS[i + 1] if i + 1 < len(PRICE_BUCKETS) else None,
+                     "count": int(price_counts[i])}
+                    for i, low in enumerate(PRICE_BUCKETS)
+                ],
+                "rating": [{"min": stars, "count": count} for stars, count in zip(RATING_THRESHOLDS, rating_counts)],
+            },
+        }
+
+
+class SearchIndex(Searcher):
+    def __init__(self):
+        # term -> (doc ids مترتبة، tf لكل doc)
+        self.postings: dict[str, tuple[array, array]] = {}
+        self.stored: list[dict | None] = []
+        # doc-values: عمود NumPy لكل حقل بالـ doc id
+        self.doc_len = Column(np.uint32)
+        self.price = Column(np.float64)
+        self.price_bucket = Column(np.uint8)
+        self.rating = Column(np.float32)
+        self.category_code = Column(np.uint16)
+        self.brand_code = Column(np.uint16)
+        self.alive = Column(np.bool_)
+        self.categories: list[str] = []
+        self.category_codes: dict[str, int] = {}
+        self.brands: list[str] = []
+        self.brand_codes: dict[str, int] = {}
+        self.bitsets = Bitsets()
+        self.by_product: dict[str, int] = {}
+        self._live_count = 0
+        self._total_len = 0
+        # بيزيد مع كل تعديل (الـ snapshot بيتكتب بس لو اتغير)
+        self.version = 0
+        self._sorted_terms: list[str] | None = None
+        self._ngram_terms: dict[str, set[str]] = {}
+
+    def __len__(self):
+        return self._live_count
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.alive)
+
+    @property
+    def live_count(self) -> int:
+        return self._live_count
+
+    @property
+    def total_len(self) -> int:
+        return self._total_len
+
+    # ===== كتابة
+    def upsert(self, source: dict):
+        self.remove(source["id"])
+        doc = len(self.alive)
+
+        freqs = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(source.get(field)):
+                freqs[token] += weight
+
+        for term, tf in freqs.items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array("I"), array("H"))
+                self._add_term(term)
+            entry[0].append(doc)
+            entry[1].append(min(tf, 0xFFFF))
+
+        length = sum(freqs.values())
+        self.stored.append({f: source[f] for f in STORED_FIELDS})
+        self.doc_len.append(length)
+        self.price.append(source["price"])
+        self.price_bucket.append(price_bucket(source["price"]))
+        self.rating.append(source["rating"])
+        self.category_code.append(self._code(self.categories, self.category_codes, source.get("category") or ""))
+        self.brand_code.append(self._code(self.brands, self.brand_codes, source.get("brand") or ""))
+        self.alive.append(True)
+        self.by_product[source["id"]] = doc
+        self._live_count += 1
+        self._total_len += length
+        self.version += 1
+
+    @staticmethod
+    def _code(values: list[str], codes: dict[str, int], value: str) -> int:
+        """
+        dictionary encoding: كل قيمة (بعد الـ normalize) ليها رقم u16 ثابت
+        """
+        key = normalize(value)
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(values)
+            values.append(value)
+        return code
+
+    def remove(self, product_id: str):
+        doc = self.by_product.pop(product_id, None)
+        if doc is None:
+            return
+        self.alive[doc] = False
+        self.stored[doc] = None
+        self._live_count -= 1
+        self._total_len -= int(self.doc_len[doc])
+        self.version += 1
+        if self.doc_count - self._live_count > COMPACT_DEAD_RATIO * self.doc_count:
+            self.compact()
+
+    def compact(self):
+        """
+        بيشيل الـ docs الممسوحة من الـ postings والـ doc-values (الـ doc ids بتتغير بس ترتيبها ثابت)
+        """
+        keep = np.flatnonzero(self.alive.values)
+        remap = np.full(self.doc_count, -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+
+        for term in list(self.postings):
+            docs, tfs = self.postings[term]
+            new_docs = remap[np.frombuffer(docs, dtype=np.uint32)]
+            live = new_docs >= 0
+            if live.any():
+                self.postings[term] = (array("I", new_docs[live].astype(np.uint32).tobytes()),
+                                       array("H", np.frombuffer(tfs, dtype=np.uint16)[live].tobytes()))
+            else:
+                del self.postings[term]
+                self._drop_term(term)
+
+        self.stored = [self.stored[doc] for doc in keep]
+        for name in ("doc_len", "price", "price_bucket", "rating", "category_code", "brand_code"):
+            column = getattr(self, name)
+            setattr(self, name, Column(column.dtype, column.values[keep]))
+        self.alive = Column(np.bool_, np.ones(len(keep), dtype=np.bool_))
+        self.by_product = {stored["id"]: doc for doc, stored in enumerate(self.stored)}
+
+    def _add_term(self, term: str):
+        self._sorted_terms = None
+        for gram in ngrams(term):
+            self._ngram_terms.setdefault(gram, set()).add(term)
+
+    def _drop_term(self, term: str):
+        self._sorted_terms = None
+        for gram in ngrams(term):
+            terms = self._ngram_terms.get(gram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._ngram_terms[gram]
+
+    # ===== Searcher
+    def has_term(self, term: str) -> bool:
+        return term in self.postings
+
+    def term_postings(self, term: str) -> tuple[array, array]:
+        return self.postings[term]
+
+    def prefix_terms(self, prefix: str, limit: int = MAX_PREFIX_EXPANSIONS) -> list[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        terms = self._sorted_terms
+        i = bisect_left(terms, prefix)
+        out = []
+        while i < len(terms) and terms[i].startswith(prefix) and len(out) < limit:
+            out.append(terms[i])
+            i += 1
+        return out
+
+    def ngram_terms(self, gram: str):
+        return self._ngram_terms.get(gram, ())
+
+    def columns(self) -> Columns:
+        return Columns(
+            doc_len=self.doc_len.values,
+            price=self.price.values,
+            price_bucket=self.price_bucket.values,
+            rating=self.rating.values,
+            category=self.category_code.values,
+            brand=self.brand_code.values,
+            alive=None if self._live_count == self.doc_count else self.alive.values,
+        )
+
+    def hit(self, doc: int) -> dict:
+        return {
+            **self.stored[doc],
+            "category": self.categories[self.category_code[doc]],
+            "price": float(self.price[doc]),
+            "rating": round(float(self.rating[doc]), 2),
+        }
+
+    def documents(self):
+        """
+        الحقول المخزنة + rating لكل منتج حي (لبناء الـ autocomplete مرة واحدة بعد تحميل كامل)
+        """
+        for doc, stored in enumerate(self.stored):
+            if stored is not None:
+                yield {**stored, "rating": float(self.rating[doc])}
+
+    # ===== snapshots (snapshot.py)
+    def freeze(self) -> dict:
+        """
+        نسخة ثابتة من الـ state (نسخ arrays بس) عشان الـ snapshot يتكتب في thread والـ index بيتعدل
+        """
+        return {
+            "postings": {term: (docs[:], tfs[:]) for term, (docs, tfs) in self.postings.items()},
+            "stored": list(self.stored),
+            "alive": self.alive.values.copy(),
+            "doc_len": self.doc_len.values.copy(),
+            "price": self.price.values.copy(),
+            "price_bucket": self.price_bucket.values.copy(),
+            "rating": self.rating.values.copy(),
+            "category_code": self.category_code.values.copy(),
+            "brand_code": self.brand_code.values.copy(),
+            "categories": list(self.categories),
+            "brands": list(self.brands),
+            "total_len": self._total_len,
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> "SearchIndex":
+        index = cls()
+        cols = snapshot.columns()
+        index.doc_len = Column(np.uint32, cols.doc_len)
+        index.price = Column(np.float64, cols.price)
+        index.price_bucket = Column(np.uint8, cols.price_bucket)
+        index.rating = Column(np.float32, cols.rating)
+        index.category_code = Column(np.uint16, cols.category)
+        index.brand_code = Column(np.uint16, cols.brand)
+        index.alive = Column(np.bool_, np.ones(snapshot.doc_count, dtype=np.bool_))
+        index.stored = [snapshot.stored_fields(doc) for doc in range(snapshot.doc_count)]
+        index.by_product = {stored["id"]: doc for doc, stored in enumerate(index.stored)}
+        for code, category in enumerate(snapshot.categories):
+            index.categories.append(category)
+            index.category_codes.setdefault(normalize(category), code)
+        for code, brand in enumerate(snapshot.brands):
+            index.brands.append(brand)
+            index.brand_codes.setdefault(normalize(brand), code)
+        for term in snapshot.terms():
+            index.postings[term] = snapshot.decode_postings(term)
+            index._add_term(term)
+        index._live_count = snapshot.doc_count
+        index._total_len = snapshot.total_len
+        return index
+
+    def stats(self) -> dict:
+        return {
+            "documents": self._live_count,
+            "deleted": self.doc_count - self._live_count,
+            "terms": len(self.postings),
+            "postings": sum(len(d) for d, _ in self.postings.values()),
+            "filter_cache": self.bitsets.stats(),
+        }
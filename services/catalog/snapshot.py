@@ -0,0 +1,497 @@
+# services/catalog/snapshot.py
+"""
+Snapshot للـ index على الديسك، بيتفتح بـ mmap: كل الـ workers بيشاركوا نفس الصفحات في الـ page cache
+
+الـ format (version 1):
+    header: magic, version, byte order, عدد الـ docs/terms/grams, total_len, جدول sections (offset, length)
+    sections (كل واحدة aligned على 8 bytes):
+        meta                JSON (وقت الكتابة + مكان الـ sync عشان الـ writer يكمل منه)
+        term_blob           الكلمات utf-8 ورا بعض بالترتيب
+        term_offsets        u32 x (terms + 1)
+        term_df             u32 x terms
+        postings_offsets    u64 x (terms + 1)
+        postings            varints: (doc id delta, tf) لكل posting
+        doc_len             u32 x docs
+        price               f64 x docs
+        rating              f32 x docs
+        category_code       u16 x docs
+        categories          JSON list
+        stored_offsets      u64 x (docs + 1)
+        stored              JSON لكل doc (الحقول اللي بترجع في النتايج)
+        gram_blob / gram_offsets / gram_term_offsets / gram_terms   n-grams -> term ids (u32)
+    version 2 (autocomplete):
+        suggest_key_blob / suggest_key_offsets / suggest_key_ids    الـ keys مترتبة + suggestion لكل key
+        suggest_text_blob / suggest_text_offsets / suggest_weights  نص وweight كل suggestion
+        suggest_top_blob / suggest_top_offsets / suggest_top_ids    الـ top-k المحسوب لكل node كبيرة (u32 x K)
+    version 3 (facets):
+        brand_code          u16 x docs
+        brands              JSON list
+        price_bucket        u8 x docs (رقم الـ bucket في الـ price histogram)
+"""
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+import numpy as np
+
+from autocomplete import SUGGEST_TOP_K, Suggester
+from docvalues import Bitsets, Columns
+from search_index import MAX_PREFIX_EXPANSIONS, Searcher
+from text import ngrams, normalize
+
+logger = logging.getLogger("catalog")
+
+MAGIC = b"CATIDX\x00\x00"
+VERSION = 3
+SECTIONS = (
+    "meta", "term_blob", "term_offsets", "term_df", "postings_offsets", "postings",
+    "doc_len", "price", "rating", "category_code", "categories", "stored_offsets", "stored",
+    "brand_code", "brands", "price_bucket",
+    "gram_blob", "gram_offsets", "gram_term_offsets", "gram_terms",
+    "suggest_key_blob", "suggest_key_offsets", "suggest_key_ids",
+    "suggest_text_blob", "suggest_text_offsets", "suggest_weights",
+    "suggest_top_blob", "suggest_top_offsets", "suggest_top_ids",
+)
+_NO_SUGGESTION = 0xFFFFFFFF
+SUGGEST_CHILDREN_CACHE_DEPTH = 4
+_HEADER = struct.Struct("<8sHBxIIIQ")
+_SECTION = struct.Struct("<QQ")
+_BYTE_ORDERS = {"little": 0, "big": 1}
+
+# postings الكلمات الشائعة بتتفك مرة وتفضل في الذاكرة (لكل worker)
+CATALOG_POSTINGS_CACHE = int(os.getenv("CATALOG_POSTINGS_CACHE", "4096"))
+
+
+class SnapshotError(Exception):
+    pass
+
+
+# ===== varints
+def _put_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_postings(buf, start: int, end: int) -> tuple[array, array]:
+    """
+    فك الـ varints كلها مرة واحدة بـ NumPy: آخر byte في كل varint هو اللي أقل من 0x80
+    """
+    raw = np.frombuffer(buf, dtype=np.uint8, count=end - start, offset=start)
+    if not len(raw):
+        return array("I"), array("H")
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shifts = (np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)) * 7
+    values = np.add.reduceat((raw & 0x7F).astype(np.uint64) << shifts.astype(np.uint64), starts)
+    docs = np.cumsum(values[0::2]).astype(np.uint32)
+    return array("I", docs.tobytes()), array("H", values[1::2].astype(np.uint16).tobytes())
+
+
+class _Strings:
+    """
+    sequence من bytes فوق blob + offsets (bisect بيشتغل عليها مباشرة؛ ترتيب utf-8 = ترتيب الـ str)
+    """
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def find(self, key: bytes) -> int:
+        i = bisect_left(self, key)
+        return i if i < len(self) and self[i] == key else -1
+
+
+class _Texts(_Strings):
+    def __getitem__(self, i: int) -> str:
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+
+# ===== كتابة
+def _strings_sections(values: list[str]) -> tuple[bytes, array]:
+    blob = bytearray()
+    offsets = array("I", [0])
+    for value in values:
+        blob += value.encode()
+        offsets.append(len(blob))
+    return bytes(blob), offsets
+
+
+def _suggest_sections(frozen: dict | None) -> dict:
+    if frozen is None:
+        frozen = {"keys": [], "key_ids": [], "texts": [], "weights": [], "top": {}}
+    # الـ suggestions اللي اتشالت بتتشال والـ ids بتترقم من جديد
+    remap = {}
+    texts, weights = [], array("d")
+    for sid, text in enumerate(frozen["texts"]):
+        if text is not None:
+            remap[sid] = len(texts)
+            texts.append(text)
+            weights.append(frozen["weights"][sid])
+    key_blob, key_offsets = _strings_sections(frozen["keys"])
+    text_blob, text_offsets = _strings_sections(texts)
+    top_prefixes = sorted(frozen["top"])
+    top_blob, top_offsets = _strings_sections(top_prefixes)
+    top_ids = array("I")
+    for prefix in top_prefixes:
+        ids = [remap[sid] for sid in frozen["top"][prefix]]
+        top_ids.extend(ids + [_NO_SUGGESTION] * (SUGGEST_TOP_K - len(ids)))
+    return {
+        "suggest_key_blob": key_blob,
+        "suggest_key_offsets": key_offsets,
+        "suggest_key_ids": array("I", (remap[sid] for sid in frozen["key_ids"])),
+        "suggest_text_blob": text_blob,
+        "suggest_text_offsets": text_offsets,
+        "suggest_weights": weights,
+        "suggest_top_blob": top_blob,
+        "suggest_top_offsets": top_offsets,
+        "suggest_top_ids": top_ids,
+    }
+
+
+def write_snapshot(frozen: dict, path: str, meta: dict, suggest: dict | None = None) -> dict:
+    """
+    بيكتب SearchIndex.freeze() (و Autocomplete.freeze()) في ملف مؤقت وبعدين os.replace:
+    اللي بيقرا يا يشوف القديم كامل يا الجديد كامل. الـ docs الممسوحة بتتشال والـ doc ids بتترقم من جديد
+    """
+    started = time.perf_counter()
+    keep = np.flatnonzero(frozen["alive"])
+    remap = np.full(len(frozen["alive"]), -1, dtype=np.int64)
+    remap[keep] = np.arange(len(keep))
+
+    terms = []
+    term_df = array("I")
+    postings_offsets = array("Q", [0])
+    postings = bytearray()
+    for term in sorted(frozen["postings"]):
+        docs, tfs = frozen["postings"][term]
+        last = df = 0
+        for new_doc, tf in zip(remap[np.frombuffer(docs, dtype=np.uint32)].tolist(), tfs):
+            if new_doc < 0:
+                continue
+            _put_varint(postings, new_doc - last)
+            _put_varint(postings, tf)
+            last = new_doc
+            df += 1
+        if df:
+            terms.append(term)
+            term_df.append(df)
+            postings_offsets.append(len(postings))
+    term_blob, term_offsets = _strings_sections(terms)
+
+    grams: dict[str, array] = {}
+    for term_id, term in enumerate(terms):
+        for gram in ngrams(term):
+            grams.setdefault(gram, array("I")).append(term_id)
+    gram_list = sorted(grams)
+    gram_blob, gram_offsets = _strings_sections(gram_list)
+    gram_term_offsets = array("I", [0])
+    gram_terms = array("I")
+    for gram in gram_list:
+        gram_terms.extend(grams[gram])
+        gram_term_offsets.append(len(gram_terms))
+
+    stored = bytearray()
+    stored_offsets = array("Q", [0])
+    for doc in keep.tolist():
+        stored += json.dumps(frozen["stored"][doc], ensure_ascii=False, separators=(",", ":")).encode()
+        stored_offsets.append(len(stored))
+
+    meta = {**meta, "created_at": time.time(), "documents": len(keep), "terms": len(terms)}
+    sections = {
+        "meta": json.dumps(meta).encode(),
+        "term_blob": term_blob,
+        "term_offsets": term_offsets,
+        "term_df": term_df,
+        "postings_offsets": postings_offsets,
+        "postings": postings,
+        "doc_len": frozen["doc_len"][keep],
+        "price": frozen["price"][keep],
+        "rating": frozen["rating"][keep],
+        "category_code": frozen["category_code"][keep],
+        "categories": json.dumps(frozen["categories"], ensure_ascii=False).encode(),
+        "brand_code": frozen["brand_code"][keep],
+        "brands": json.dumps(frozen["brands"], ensure_ascii=False).encode(),
+        "price_bucket": frozen["price_bucket"][keep],
+        "stored_offsets": stored_offsets,
+        "stored": stored,
+        "gram_blob": gram_blob,
+        "gram_offsets": gram_offsets,
+        "gram_term_offsets": gram_term_offsets,
+        "gram_terms": gram_terms,
+        **_suggest_sections(suggest),
+    }
+
+    position = _HEADER.size + _SECTION.size * len(SECTIONS)
+    table = []
+    for name in SECTIONS:
+        position = (position + 7) & ~7
+        length = len(memoryview(sections[name]).cast("B"))
+        table.append((position, length))
+        position += length
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, _BYTE_ORDERS[sys.byteorder],
+                             len(keep), len(terms), len(gram_list), frozen["total_len"]))
+        for entry in table:
+            f.write(_SECTION.pack(*entry))
+        for name, (offset, _) in zip(SECTIONS, table):
+            f.write(b"\x00" * (offset - f.tell()))
+            f.write(memoryview(sections[name]).cast("B"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+    logger.info("wrote snapshot %s: %d docs, %d terms, %.1f MB in %.2fs",
+                path, len(keep), len(terms), position / 1e6, time.perf_counter() - started)
+    return meta
+
+
+# ===== قراءة
+class Snapshot(Searcher):
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if stat.st_size < _HEADER.size:
+                raise SnapshotError(f"{path}: truncated")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        buf = memoryview(self._mmap)
+        magic, version, byte_order, docs, terms, grams, total_len = _HEADER.unpack_from(buf)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path}: not a catalog snapshot")
+        if version != VERSION:
+            raise SnapshotError(f"{path}: unsupported version {version}")
+        if byte_order != _BYTE_ORDERS[sys.byteorder]:
+            raise SnapshotError(f"{path}: written on a machine with different byte order")
+
+        sections = {}
+        for i, name in enumerate(SECTIONS):
+            offset, length = _SECTION.unpack_from(buf, _HEADER.size + i * _SECTION.size)
+            if offset + length > len(buf):
+                raise SnapshotError(f"{path}: section {name} out of bounds")
+            sections[name] = buf[offset:offset + length]
+
+        self._doc_count = docs
+        self._total_len = total_len
+        self.meta = json.loads(bytes(sections["meta"]))
+        self.categories = json.loads(bytes(sections["categories"]))
+        self.category_codes = {}
+        for code, category in enumerate(self.categories):
+            self.category_codes.setdefault(normalize(category), code)
+        self.brands = json.loads(bytes(sections["brands"]))
+        self.brand_codes = {}
+        for code, brand in enumerate(self.brands):
+            self.brand_codes.setdefault(normalize(brand), code)
+        self.bitsets = Bitsets()
+
+        self._terms = _Strings(sections["term_blob"], sections["term_offsets"].cast("I"))
+        self._term_df = sections["term_df"].cast("I")
+        self._postings_offsets = sections["postings_offsets"].cast("Q")
+        self._postings = sections["postings"]
+        self._stored_offsets = sections["stored_offsets"].cast("Q")
+        self._stored = sections["stored"]
+        self._grams = _Strings(sections["gram_blob"], sections["gram_offsets"].cast("I"))
+        self._gram_term_offsets = sections["gram_term_offsets"].cast("I")
+        self._gram_terms = sections["gram_terms"].cast("I")
+
+        # doc-values: ndarrays على الـ mmap مباشرة، مفيش نسخ
+        self.doc_len = np.frombuffer(sections["doc_len"], dtype=np.uint32)
+        self.price = np.frombuffer(sections["price"], dtype=np.float64)
+        self.price_bucket = np.frombuffer(sections["price_bucket"], dtype=np.uint8)
+        self.rating = np.frombuffer(sections["rating"], dtype=np.float32)
+        self.category_code = np.frombuffer(sections["category_code"], dtype=np.uint16)
+        self.brand_code = np.frombuffer(sections["brand_code"], dtype=np.uint16)
+
+        self._decode = lru_cache(maxsize=CATALOG_POSTINGS_CACHE)(self._decode_term)
+
+        self.suggester = SnapshotSuggester(
+            keys=_Texts(sections["suggest_key_blob"], sections["suggest_key_offsets"].cast("I")),
+            key_ids=sections["suggest_key_ids"].cast("I"),
+            texts=_Texts(sections["suggest_text_blob"], sections["suggest_text_offsets"].cast("I")),
+            weights=sections["suggest_weights"].cast("d"),
+            top_prefixes=_Texts(sections["suggest_top_blob"], sections["suggest_top_offsets"].cast("I")),
+            top_ids=sections["suggest_top_ids"].cast("I"),
+        )
+
+    @property
+    def doc_count(self) -> int:
+        return self._doc_count
+
+    @property
+    def live_count(self) -> int:
+        return self._doc_count
+
+    @property
+    def total_len(self) -> int:
+        return self._total_len
+
+    def terms(self):
+        for i in range(len(self._terms)):
+            yield self._terms[i].decode()
+
+    def _term_id(self, term: str) -> int:
+        return self._terms.find(term.encode())
+
+    def _decode_term(self, term_id: int) -> tuple[array, array]:
+        return _decode_postings(self._postings, self._postings_offsets[term_id], self._postings_offsets[term_id + 1])
+
+    def decode_postings(self, term: str) -> tuple[array, array]:
+        return self._decode_term(self._term_id(term))
+
+    def stored_fields(self, doc: int) -> dict:
+        return json.loads(bytes(self._stored[self._stored_offsets[doc]:self._stored_offsets[doc + 1]]))
+
+    # ===== Searcher
+    def has_term(self, term: str) -> bool:
+        return self._term_id(term) >= 0
+
+    def term_postings(self, term: str) -> tuple[array, array]:
+        return self._decode(self._term_id(term))
+
+    def prefix_terms(self, prefix: str, limit: int = MAX_PREFIX_EXPANSIONS) -> list[str]:
+        key = prefix.encode()
+        i = bisect_left(self._terms, key)
+        out = []
+        while i < len(self._terms) and len(out) < limit:
+            term = self._terms[i]
+            if not term.startswith(key):
+                break
+            out.append(term.decode())
+            i += 1
+        return out
+
+    def ngram_terms(self, gram: str):
+        i = self._grams.find(gram.encode())
+        if i < 0:
+            return ()
+        ids = self._gram_terms[self._gram_term_offsets[i]:self._gram_term_offsets[i + 1]]
+        return [self._terms[term_id].decode() for term_id in ids]
+
+    def columns(self) -> Columns:
+        return Columns(doc_len=self.doc_len, price=self.price, price_bucket=self.price_bucket, rating=self.rating,
+                       category=self.category_code, brand=self.brand_code, alive=None)
+
+    def hit(self, doc: int) -> dict:
+        return {
+            **self.stored_fields(doc),
+            "category": self.categories[self.category_code[doc]],
+            "price": float(self.price[doc]),
+            "rating": round(float(self.rating[doc]), 2),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "documents": self._doc_count,
+            "terms": len(self._terms),
+            "bytes": len(self._mmap),
+            "created_at": self.meta.get("created_at"),
+            "postings_cache": self._decode.cache_info()._asdict(),
+            "suggestions": len(self.suggester.texts),
+            "filter_cache": self.bitsets.stats(),
+        }
+
+
+class SnapshotSuggester(Suggester):
+    def __init__(self, keys, key_ids, texts, weights, top_prefixes, top_ids):
+        super().__init__()
+        self.keys = keys
+        self.key_ids = key_ids
+        self.texts = texts
+        self.weights = weights
+        self._top_prefixes = top_prefixes
+        self._top_ids = top_ids
+        self._children_cache: dict[str, tuple] = {}
+
+    def _children(self, prefix: str, lo: int, hi: int):
+        # كل key هنا بيتفك من utf-8 مع كل مقارنة: أولاد الـ nodes اللي فوق (كل الـ fuzzy queries بتعدي عليها) بتتحفظ
+        if len(prefix) >= SUGGEST_CHILDREN_CACHE_DEPTH:
+            return super()._children(prefix, lo, hi)
+        children = self._children_cache.get(prefix)
+        if children is None:
+            children = self._children_cache[prefix] = tuple(super()._children(prefix, lo, hi))
+        return children
+
+    def _cached_top(self, prefix: str) -> tuple[int, ...] | None:
+        # الـ top-k اللي الـ writer حسبه مكتوب في الملف؛ اللي مش فيه بيتحسب ويتخزن في الـ worker
+        i = self._top_prefixes.find(prefix)
+        if i >= 0:
+            ids = self._top_ids[i * SUGGEST_TOP_K:(i + 1) * SUGGEST_TOP_K]
+            return tuple(sid for sid in ids if sid != _NO_SUGGESTION)
+        return self._top_cache.get(prefix)
+
+
+class SnapshotHolder:
+    """
+    بيمسك آخر snapshot مفتوح ويبدّله لما الملف يتغير (os.replace = inode جديد)
+    الـ queries اللي شغالة بتكمل على القديم؛ الـ mmap القديم بيتقفل لما آخر reference يروح
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.current: Snapshot | None = None
+        self.swaps = 0
+        self._lock_fd: int | None = None
+
+    def maybe_reload(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self.current is not None and self.current.identity == identity:
+            return False
+        try:
+            snapshot = Snapshot(self.path)
+        except (OSError, ValueError, SnapshotError):
+            logger.exception("could not open snapshot %s", self.path)
+            return False
+        self.current = snapshot
+        self.swaps += 1
+        logger.info("opened snapshot %s (%d docs)", self.path, snapshot.doc_count)
+        return True
+
+    def try_acquire_writer(self) -> bool:
+        """
+        worker واحد بس (على نفس الـ host) بيعمل sync من Mongo ويكتب الـ snapshot؛ الباقيين بيقروا
+        الـ lock بيتساب لوحده لو الـ process مات، وساعتها worker تاني ياخده
+        """
+        if self._lock_fd is not None:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def release_writer(self):
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
@@ -0,0 +1,46 @@
+# services/catalog/text.py
+import re
+import unicodedata
+
+# \w بيشمل الحروف العربية كمان (الـ frontend فيه ar و en)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# التشكيل العربي والتطويل بيتشالوا عشان "هاتف" و "هَاتِف" يبقوا نفس الكلمة
+_ARABIC_MARKS_RE = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u0640]")
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "the", "to", "with",
+    "في", "من", "على", "و", "عن", "مع",
+})
+
+NGRAM_SIZE = 3
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _ARABIC_MARKS_RE.sub("", text)
+
+
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return [t for t in _TOKEN_RE.findall(normalize(text)) if t not in STOPWORDS]
+
+
+def words(text: str | None) -> list[str]:
+    """
+    زي tokenize بس من غير حذف stopwords (للـ autocomplete: "for" ممكن تبقى بداية "fortnite")
+    """
+    if not text:
+        return []
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def ngrams(term: str, n: int = NGRAM_SIZE) -> set[str]:
+    """
+    character n-grams للكلمة (بحدود ^ و $) للبحث عن كلمات قريبة لما الكلمة نفسها مش موجودة
+    """
+    padded = f"^{term}$"
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
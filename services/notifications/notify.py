@@ -1 +1,223 @@
-print("Hello from Notification Service (Python)")
+# services/notifications/notify.py
+"""
+Notification worker: بيقرا الـ outbox اللي الـ user service بيكتب فيه ويبعت الإيميلات على دفعات
+
+    python notify.py
+"""
+import asyncio
+import logging
+import os
+import random
+import signal
+import socket
+import uuid
+from datetime import datetime, timedelta
+from functools import lru_cache
+from string import Template
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from transports import PermanentError, build_message, get_transport
+
+load_dotenv()
+
+logger = logging.getLogger("notifications")
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "amazon_clone")
+OUTBOX_COLLECTION = "notifications_outbox"
+DEAD_LETTER_COLLECTION = "notifications_dead_letter"
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", "20"))
+MAX_ATTEMPTS = int(os.getenv("MAX_ATTEMPTS", "6"))
+RETRY_BASE_SECONDS = float(os.getenv("RETRY_BASE_SECONDS", "5"))
+RETRY_MAX_SECONDS = float(os.getenv("RETRY_MAX_SECONDS", "900"))
+# رسالة فضلت "sending" أكتر من كده معناها إن الـ worker وقع: ترجع تتاخد تاني
+CLAIM_LEASE_SECONDS = float(os.getenv("CLAIM_LEASE_SECONDS", "120"))
+# الرسايل اللي اتبعتت أو اتشالت بتتمسح من الـ outbox بعد كده (TTL)، والـ dead letters بتفضل أطول للتحقيق
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+DEAD_LETTER_RETENTION_DAYS = int(os.getenv("DEAD_LETTER_RETENTION_DAYS", "30"))
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ===== templates: كل template بيتقري ويتعمله parse مرة واحدة
+@lru_cache(maxsize=None)
+def load_template(kind: str) -> tuple[Template, Template]:
+    path = os.path.join(TEMPLATES_DIR, f"{kind}.txt")
+    if not os.path.exists(path):
+        raise PermanentError(f"no template for {kind}")
+    with open(path) as f:
+        header, _, body = f.read().partition("\n\n")
+    subject = header.removeprefix("Subject:").strip()
+    return Template(subject), Template(body)
+
+
+def render(kind: str, data: dict) -> tuple[str, str]:
+    subject, body = load_template(kind)
+    try:
+        return subject.substitute(data), body.substitute(data)
+    except KeyError as e:
+        raise PermanentError(f"missing template variable {e}") from e
+
+
+def retry_delay(attempts: int) -> float:
+    # exponential backoff مع jitter عشان الرسايل اللي فشلت مع بعض متترجعش كلها في نفس الثانية
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class OutboxWorker:
+    def __init__(self, db, transport):
+        self.outbox = db[OUTBOX_COLLECTION]
+        self.dead_letter = db[DEAD_LETTER_COLLECTION]
+        self.transport = transport
+        self._semaphore = asyncio.Semaphore(SEND_CONCURRENCY)
+        self._stopping = asyncio.Event()
+        self.sent = 0
+        self.failed = 0
+        self.dead = 0
+
+    async def ensure_indexes(self):
+        await self.outbox.create_indexes([
+            IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+            IndexModel([("status", ASCENDING), ("claimed_at", ASCENDING)]),
+            IndexModel([("claim_id", ASCENDING)], sparse=True),
+            IndexModel([("sent_at", ASCENDING)], expireAfterSeconds=OUTBOX_RETENTION_DAYS * 86400),
+            IndexModel([("dead_at", ASCENDING)], expireAfterSeconds=OUTBOX_RETENTION_DAYS * 86400),
+        ])
+        await self.dead_letter.create_indexes([
+            IndexModel([("dead_at", ASCENDING)], expireAfterSeconds=DEAD_LETTER_RETENTION_DAYS * 86400),
+        ])
+
+    def _claimable(self, now: datetime) -> dict:
+        return {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "claimed_at": {"$lte": now - timedelta(seconds=CLAIM_LEASE_SECONDS)}},
+        ]}
+
+    async def claim_batch(self) -> list[dict]:
+        """
+        بياخد دفعة رسايل ويعلّمها باسم الـ worker ده (أكتر من worker ممكن يشتغلوا مع بعض)
+        """
+        now = datetime.utcnow()
+        candidates = await self.outbox.find(self._claimable(now), {"_id": 1}) \
+            .sort("next_attempt_at", ASCENDING).limit(OUTBOX_BATCH_SIZE).to_list(OUTBOX_BATCH_SIZE)
+        if not candidates:
+            return []
+        ids = [doc["_id"] for doc in candidates]
+        claim_id = uuid.uuid4().hex
+        await self.outbox.update_many(
+            {"_id": {"$in": ids}, **self._claimable(now)},
+            {"$set": {"status": "sending", "claimed_by": WORKER_ID, "claim_id": claim_id, "claimed_at": now}},
+        )
+        return await self.outbox.find({"claim_id": claim_id, "status": "sending"}).to_list(OUTBOX_BATCH_SIZE)
+
+    async def _send(self, doc: dict):
+        """
+        بترجع None لو اتبعتت، أو (error, permanent)
+        """
+        async with self._semaphore:
+            try:
+                subject, body = render(doc["type"], doc.get("data") or {})
+                await self.transport.send(build_message(doc["to"], subject, body))
+            except PermanentError as e:
+                return str(e), True
+            except Exception as e:
+                return f"{type(e).__name__}: {e}", False
+        return None
+
+    async def process_batch(self, docs: list[dict]):
+        results = await asyncio.gather(*(self._send(doc) for doc in docs))
+
+        now = datetime.utcnow()
+        updates = []
+        dead_letters = {}
+        for doc, result in zip(docs, results):
+            # الـ claim_id في الـ filter: لو الـ lease خلص ووorker تاني خد الرسالة، الكتابة دي مبتعملش حاجة
+            # بدل ما ترجّعها pending (فتتبعت تاني) أو تكتب فوق الـ status بتاعه
+            owned = {"_id": doc["_id"], "claim_id": doc["claim_id"]}
+            if result is None:
+                self.sent += 1
+                updates.append(UpdateOne(owned, {"$set": {"status": "sent", "sent_at": now}}))
+                continue
+
+            error, permanent = result
+            attempts = doc.get("attempts", 0) + 1
+            if permanent or attempts >= MAX_ATTEMPTS:
+                self.dead += 1
+                dead_letters[doc["_id"]] = {**doc, "status": "dead", "attempts": attempts, "last_error": error, "dead_at": now}
+                updates.append(UpdateOne(owned, {"$set": {
+                    "status": "dead", "attempts": attempts, "last_error": error, "dead_at": now,
+                }}))
+                logger.error("giving up on %s to %s after %d attempts: %s", doc["type"], doc["to"], attempts, error)
+            else:
+                self.failed += 1
+                updates.append(UpdateOne(owned, {"$set": {
+                    "status": "pending",
+                    "attempts": attempts,
+                    "last_error": error,
+                    "next_attempt_at": now + timedelta(seconds=retry_delay(attempts)),
+                }}))
+
+        if updates:
+            result = await self.outbox.bulk_write(updates, ordered=False)
+            if result.matched_count < len(updates):
+                logger.warning("%d of %d messages were reclaimed by another worker after the lease expired",
+                               len(updates) - result.matched_count, len(updates))
+        if dead_letters:
+            # الـ dead letter بس للرسايل اللي الـ update بتاعها اتطبق (لسه بتاعتنا). الدفعة كلها من claim_batch واحد
+            owned_dead = self.outbox.find(
+                {"_id": {"$in": list(dead_letters)}, "claim_id": docs[0]["claim_id"], "status": "dead"}, {"_id": 1}
+            )
+            letters = [dead_letters[doc["_id"]] async for doc in owned_dead]
+            if letters:
+                await self.dead_letter.insert_many(letters, ordered=False)
+
+    async def run(self):
+        await self.ensure_indexes()
+        logger.info("notification worker %s started", WORKER_ID)
+        while not self._stopping.is_set():
+            try:
+                docs = await self.claim_batch()
+                if docs:
+                    await self.process_batch(docs)
+            except Exception:
+                logger.exception("outbox batch failed")
+                docs = []
+            # دفعة كاملة = غالباً فيه رسايل تانية مستنية، نكمل على طول
+            if len(docs) < OUTBOX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        await self.transport.close()
+
+    def stop(self):
+        self._stopping.set()
+
+
+async def main():
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    client = AsyncIOMotorClient(MONGO_URI)
+    worker = OutboxWorker(client[MONGO_DB], get_transport())
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:
+            pass
+    try:
+        await worker.run()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
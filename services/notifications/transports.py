@@ -0,0 +1,126 @@
+# services/notifications/transports.py
+import asyncio
+import logging
+import os
+from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "0") == "1"
+SMTP_CONNECTIONS = int(os.getenv("SMTP_CONNECTIONS", "4"))
+MAIL_FROM = os.getenv("MAIL_FROM", "no-reply@amazon-clone.local")
+
+
+class PermanentError(Exception):
+    """
+    خطأ مش هيتحل بإعادة المحاولة (عنوان غلط، template ناقص) فالرسالة بتروح dead letter على طول
+    """
+
+
+def build_message(to: str, subject: str, body: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = MAIL_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    return message
+
+
+class ConsoleTransport:
+    """
+    للتطوير: بيطبع الرسالة في الـ log بدل ما يبعتها
+    """
+
+    async def send(self, message: EmailMessage):
+        logger.info("mail to %s: %s\n%s", message["To"], message["Subject"], message.get_content())
+
+    async def close(self):
+        pass
+
+
+class MemoryTransport:
+    """
+    للـ tests والـ load runs: بيحتفظ بالرسايل في list
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message: EmailMessage):
+        self.sent.append(message)
+
+    async def close(self):
+        pass
+
+
+class SMTPTransport:
+    """
+    pool صغير من اتصالات SMTP مفتوحة بيتعاد استخدامها (من غير handshake لكل رسالة)
+    محلياً بيشتغل مع mailhog اللي في docker-compose
+    """
+
+    def __init__(self, size: int = SMTP_CONNECTIONS):
+        self._size = size
+        self._idle = asyncio.LifoQueue()
+        self._created = 0
+
+    async def _connect(self):
+        import aiosmtplib
+
+        client = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT, start_tls=SMTP_STARTTLS, timeout=10)
+        await client.connect()
+        if SMTP_USERNAME:
+            await client.login(SMTP_USERNAME, SMTP_PASSWORD or "")
+        return client
+
+    async def _acquire(self):
+        if self._idle.empty() and self._created < self._size:
+            self._created += 1
+            try:
+                return await self._connect()
+            except Exception:
+                self._created -= 1
+                raise
+        return await self._idle.get()
+
+    async def send(self, message: EmailMessage):
+        import aiosmtplib
+
+        client = await self._acquire()
+        try:
+            if not client.is_connected:
+                await client.connect()
+            await client.send_message(message)
+        except aiosmtplib.SMTPRecipientsRefused as e:
+            self._idle.put_nowait(client)
+            raise PermanentError(str(e)) from e
+        except Exception:
+            # الاتصال ممكن يكون بايظ: نقفله ونعمل واحد جديد المرة الجاية
+            self._created -= 1
+            client.close()
+            raise
+        self._idle.put_nowait(client)
+
+    async def close(self):
+        while not self._idle.empty():
+            client = self._idle.get_nowait()
+            try:
+                await client.quit()
+            except Exception:
+                client.close()
+        self._created = 0
+
+
+TRANSPORTS = {
+    "console": ConsoleTransport,
+    "memory": MemoryTransport,
+    "smtp": SMTPTransport,
+}
+
+
+def get_transport(name: str | None = None):
+    return TRANSPORTS[name or os.getenv("MAIL_TRANSPORT", "console")]()
@@ -0,0 +1,57 @@
+# services/payment/auth.py
+"""
+مين بينادي الـ payment service: مستخدم بـ JWT من الـ auth service، أو خدمة تانية (order) بـ X-Service-Token
+"""
+import os
+import secrets
+from dataclasses import dataclass
+from typing import Optional
+
+import jwt
+from dotenv import load_dotenv
+from fastapi import Cookie, Header, HTTPException
+
+load_dotenv()
+
+JWT_SECRET = os.getenv("JWT_SECRET")
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+SERVICE_API_KEYS = [k.strip() for k in os.getenv("SERVICE_API_KEYS", "").split(",") if k.strip()]
+
+if not JWT_SECRET:
+    raise RuntimeError("JWT_SECRET not set in .env")
+
+# الـ key بيتجهز مرة واحدة بدل ما PyJWT يعملها مع كل decode
+_KEY = jwt.algorithms.get_default_algorithms()[JWT_ALGORITHM].prepare_key(JWT_SECRET)
+
+
+@dataclass(frozen=True)
+class Caller:
+    user_id: str | None
+    role: str
+    service: bool = False
+
+    def can_access(self, payment: dict) -> bool:
+        return self.service or self.role == "admin" or payment.get("user_id") == self.user_id
+
+
+async def get_caller(
+    token: Optional[str] = Cookie(None),
+    authorization: Optional[str] = Header(None),
+    x_service_token: Optional[str] = Header(None),
+) -> Caller:
+    if x_service_token:
+        if not any(secrets.compare_digest(x_service_token, k) for k in SERVICE_API_KEYS):
+            raise HTTPException(status_code=401, detail="auth.invalid_service_token")
+        return Caller(user_id=None, role="service", service=True)
+
+    if authorization and authorization.startswith("Bearer "):
+        token = authorization.split(" ")[1]
+    if not token:
+        raise HTTPException(status_code=401, detail="auth.no_token")
+    try:
+        decoded = jwt.decode(token, _KEY, algorithms=[JWT_ALGORITHM])
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="auth.invalid_token")
+    if not decoded.get("id"):
+        raise HTTPException(status_code=401, detail="auth.invalid_token")
+    return Caller(user_id=str(decoded["id"]), role=decoded.get("role", "user"))
@@ -0,0 +1,226 @@
+# services/payment/bench/webhooks.py
+"""
+Benchmark لاستقبال الـ webhooks وقت الـ burst: events متوقعة، مكررة ومتلخبطة الترتيب، بتتبعت بالتوازي،
+وبعدها بيتأكد إن كل payment وصل لآخر حالة عند الـ provider
+
+    python bench/webhooks.py --payments 5000 --concurrency 200
+    python bench/webhooks.py --compare bench/results/webhooks.json
+
+افتراضياً كله in-process (mongomock + ASGITransport). MONGO_URI=mongodb://... يقيس على Mongo حقيقي،
+و--url يبعت لـ payment service شغال (بنفس STRIPE_WEBHOOK_SECRET ونفس الـ MONGO_URI عشان التحقق)
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGO_URI", "mongomock://bench")
+os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_bench")
+os.environ.setdefault("JWT_SECRET", "bench")
+
+import httpx  # noqa: E402
+from bson import ObjectId  # noqa: E402
+
+import database  # noqa: E402
+import fake_provider  # noqa: E402
+import payments  # noqa: E402
+import webhooks  # noqa: E402
+
+SECRET = os.environ["STRIPE_WEBHOOK_SECRET"].split(",")[0]
+
+
+def build_events(count: int, duplicates: float, seed: int) -> tuple[list[dict], list[dict], dict]:
+    """
+    لكل payment: created -> payment_failed -> requires_action -> succeeded (أو يقف عند payment_failed)،
+    كل event في ثانية مختلفة عند الـ provider، وبعدها كله بيتلخبط
+    """
+    rng = random.Random(seed)
+    now = int(time.time())
+    docs, events, expected = [], [], {}
+    for i in range(count):
+        payment_id = ObjectId()
+        intent = {"id": f"pi_bench_{i}", "object": "payment_intent", "amount": 1000, "currency": "usd",
+                  "client_secret": f"pi_bench_{i}_secret", "metadata": {"payment_id": str(payment_id), "order_id": f"o{i}"}}
+        docs.append({
+            "_id": payment_id, "user_id": f"u{i % 1000}", "idempotency_key": f"bench-{i}", "fingerprint": "",
+            "order_id": f"o{i}", "amount": 1000, "currency": "usd", "status": "requires_payment_method",
+            "provider_id": intent["id"], "lease_until": None,
+            "created_at": datetime.utcnow(), "updated_at": datetime.utcnow(),
+        })
+        flow = [("payment_intent.created", "requires_payment_method"), ("payment_intent.payment_failed", "requires_payment_method"),
+                ("payment_intent.requires_action", "requires_action"), ("payment_intent.succeeded", "succeeded")]
+        if rng.random() < 0.2:
+            flow = flow[:2]
+        for step, (type_, status) in enumerate(flow):
+            events.append({"id": f"evt_bench_{i}_{step}", "object": "event", "type": type_, "created": now - 10 + step,
+                           "data": {"object": {**intent, "status": status}}})
+        expected[payment_id] = flow[-1][1]
+    # redeliveries: الـ provider بيعيد الـ webhook لو الرد اتأخر
+    events += [dict(e) for e in rng.sample(events, int(len(events) * duplicates))]
+    rng.shuffle(events)
+    return docs, events, expected
+
+
+def summarize(values: list[float]) -> dict:
+    ms = [v * 1000 for v in values]
+    if len(ms) < 2:
+        return {"p50": ms[0], "p95": ms[0], "p99": ms[0], "max": ms[0], "mean": ms[0]}
+    q = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "p50": round(q[49], 3),
+        "p95": round(q[94], 3),
+        "p99": round(q[98], 3),
+        "max": round(max(ms), 3),
+        "mean": round(statistics.fmean(ms), 3),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def send_all(client: httpx.AsyncClient, path: str, events: list[dict], concurrency: int) -> tuple[list[float], int]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def send(event: dict):
+        nonlocal failures
+        payload = json.dumps(event).encode()
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, content=payload, headers={
+                "Content-Type": "application/json", "Stripe-Signature": fake_provider.sign(payload, SECRET),
+            })
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                failures += 1
+
+    await asyncio.gather(*(send(event) for event in events))
+    return latencies, failures
+
+
+async def wait_drained(client: httpx.AsyncClient | None, timeout: float = 300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client is None:
+            await webhooks.pipeline.queue.join()
+            return
+        stats = (await client.get("/health")).json()["webhooks"]
+        if stats["queued"] == 0:
+            return
+        await asyncio.sleep(0.05)
+    raise TimeoutError("webhook queue did not drain")
+
+
+async def run(args) -> dict:
+    docs, events, expected = build_events(args.payments, args.duplicates, args.seed)
+    payments_collection = database.get_payments_collection()
+    await payments.ensure_indexes()
+    await webhooks.pipeline.ensure_indexes()
+    for i in range(0, len(docs), 1000):
+        await payments_collection.insert_many(docs[i:i + 1000])
+    print(f"{len(docs)} payments, {len(events)} webhook deliveries ({args.duplicates:.0%} redelivered)")
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30, limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        import payment_service
+
+        webhooks.pipeline.start()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=payment_service.app), base_url="http://payment")
+
+    started = time.perf_counter()
+    latencies, failures = await send_all(client, "/api/payment/webhook", events, args.concurrency)
+    acked = time.perf_counter() - started
+    await wait_drained(client if args.url else None)
+    drained = time.perf_counter() - started
+    stats = webhooks.pipeline.stats() if not args.url else (await client.get("/health")).json()["webhooks"]
+    await client.aclose()
+    if not args.url:
+        await webhooks.pipeline.stop()
+
+    wrong = 0
+    async for doc in payments_collection.find({"_id": {"$in": list(expected)}}, {"status": 1}):
+        wrong += doc["status"] != expected[doc["_id"]]
+    await payments_collection.delete_many({"_id": {"$in": list(expected)}})
+    await webhooks.pipeline.events.delete_many({"_id": {"$regex": "^evt_bench_"}})
+
+    result = {
+        "deliveries": len(events),
+        "failed_deliveries": failures,
+        "ack_elapsed_s": round(acked, 3),
+        "ack_throughput_rps": round(len(events) / acked, 1),
+        "drain_elapsed_s": round(drained, 3),
+        "applied_throughput_eps": round(len(events) / drained, 1),
+        "ack_latency_ms": summarize(latencies),
+        "wrong_final_status": wrong,
+        "pipeline": stats,
+    }
+    lat = result["ack_latency_ms"]
+    print(f"acked {result['ack_throughput_rps']:.0f} req/s  p50 {lat['p50']:.2f}  p99 {lat['p99']:.2f} ms  "
+          f"drained in {drained:.2f}s ({result['applied_throughput_eps']:.0f} events/s)")
+    print(f"wrong final status: {wrong}  duplicates: {stats['duplicates']}  apply batches: {stats['batches']}")
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "target": args.url or os.environ["MONGO_URI"].split("://")[0],
+            "payments": args.payments,
+            "concurrency": args.concurrency,
+        },
+        "results": {"burst": result},
+    }
+
+
+def compare(previous: dict, current: dict):
+    print(f"\ncompared with {previous['meta'].get('git_commit')} ({previous['meta'].get('timestamp')})")
+    before, now = previous["results"]["burst"], current["results"]["burst"]
+    cells = []
+    for key in ("p50", "p95", "p99"):
+        old, new = before["ack_latency_ms"][key], now["ack_latency_ms"][key]
+        cells.append(f"{key} {(new - old) / old * 100 if old else 0:+6.1f}%")
+    for key in ("ack_throughput_rps", "applied_throughput_eps"):
+        old, new = before[key], now[key]
+        cells.append(f"{key} {(new - old) / old * 100 if old else 0:+6.1f}%")
+    print("burst  " + "  ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=5000)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="fraction of deliveries sent twice")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", help="running payment service (default: in-process)")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "webhooks.json"))
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nresults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
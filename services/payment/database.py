@@ -0,0 +1,66 @@
+# services/payment/database.py
+import os
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv()  # تحميل المتغيرات من .env
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "amazon_clone")
+
+# ===== Pool sizing (per worker process)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+
+# ===== client واحد لكل worker، بيتعمل أول ما حد يحتاجه
+_client: AsyncIOMotorClient | None = None
+_collections = {}
+
+
+def get_client() -> AsyncIOMotorClient:
+    global _client
+    if _client is None and MONGO_URI and MONGO_URI.startswith("mongomock://"):
+        # Mongo في الذاكرة للتجارب والـ load runs مع الـ fake provider
+        from mongomock_motor import AsyncMongoMockClient
+
+        _client = AsyncMongoMockClient()
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        )
+    return _client
+
+
+def get_db():
+    return get_client()[MONGO_DB]
+
+
+def get_collection(name: str):
+    collection = _collections.get(name)
+    if collection is None:
+        collection = _collections[name] = get_db()[name]
+    return collection
+
+
+def get_payments_collection():
+    return get_collection("payments")
+
+
+async def connect():
+    """
+    warm-up وقت الـ startup: ping عشان الـ pool يفتح الاتصالات قبل أول request
+    """
+    await get_client().admin.command("ping")
+
+
+def close():
+    global _client
+    if _client is not None:
+        _client.close()
+    _client = None
+    _collections.clear()
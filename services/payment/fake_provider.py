@@ -0,0 +1,217 @@
+# services/payment/fake_provider.py
+"""
+Provider مزيف بنفس شكل Stripe payment intents API: للتجارب والـ load runs من غير Stripe
+
+    uvicorn fake_provider:app --port 5099
+    PAYMENT_PROVIDER_URL=http://localhost:5099      (أو fake:// عشان يشتغل in-process)
+
+Idempotency-Key زي Stripe: نفس الـ key بيرجع نفس الرد بالظبط، ونفس الـ key بـ parameters تانية = 400
+الـ payment methods التجريبية:
+    pm_card_visa                    بينجح
+    pm_card_chargeDeclined          402 card_declined والـ intent بيرجع requires_payment_method
+    pm_card_authenticationRequired  requires_action (3DS)
+FAKE_PROVIDER_LATENCY_MS / FAKE_PROVIDER_ERROR_RATE بيحاكوا provider بطيء أو بيرجع 5xx
+(نص الأخطاء بيحصل بعد ما الطلب اتنفذ فعلاً، زي timeout حقيقي، عشان إعادة المحاولة تتختبر)
+
+كل تغيير في حالة intent بيعمل event زي Stripe، ولو FAKE_PROVIDER_WEBHOOK_URL موجود بيتبعت webhook متوقع
+بـ FAKE_PROVIDER_WEBHOOK_SECRET (نفس STRIPE_WEBHOOK_SECRET عند الـ payment service)
+"""
+import asyncio
+import bisect
+import hashlib
+import hmac
+import json
+import os
+import random
+import secrets
+import time
+from urllib.parse import parse_qsl
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+FAKE_PROVIDER_LATENCY_MS = float(os.getenv("FAKE_PROVIDER_LATENCY_MS", "0"))
+FAKE_PROVIDER_ERROR_RATE = float(os.getenv("FAKE_PROVIDER_ERROR_RATE", "0"))
+FAKE_PROVIDER_WEBHOOK_URL = os.getenv("FAKE_PROVIDER_WEBHOOK_URL")
+FAKE_PROVIDER_WEBHOOK_SECRET = os.getenv("FAKE_PROVIDER_WEBHOOK_SECRET", "whsec_fake")
+
+app = FastAPI(title="Fake Payment Provider")
+
+intents: dict[str, dict] = {}
+# الـ ids مترتبة عشان الـ export (الـ reconciliation بيعمل merge join بالـ id)
+_intent_ids: list[str] = []
+events: list[dict] = []
+# idempotency key -> (parameters, status code, body)
+_responses: dict[str, tuple[tuple, int, dict]] = {}
+stats = {"requests": 0, "replays": 0, "injected_errors": 0, "webhooks_sent": 0, "webhooks_failed": 0}
+_webhook_client: httpx.AsyncClient | None = None
+
+
+def _error(status: int, type_: str, code: str, message: str, **extra) -> tuple[int, dict]:
+    return status, {"error": {"type": type_, "code": code, "message": message, **extra}}
+
+
+def _id(prefix: str) -> str:
+    return f"{prefix}_{secrets.token_hex(12)}"
+
+
+def _emit(type_: str, intent: dict) -> dict:
+    event = {"id": _id("evt"), "object": "event", "type": type_, "created": int(time.time()), "data": {"object": dict(intent)}}
+    events.append(event)
+    return event
+
+
+def sign(payload: bytes, secret: str = FAKE_PROVIDER_WEBHOOK_SECRET, timestamp: int | None = None) -> str:
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    mac = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256)
+    return f"t={timestamp},v1={mac.hexdigest()}"
+
+
+async def _deliver(new_events: list[dict]):
+    global _webhook_client
+    if _webhook_client is None:
+        _webhook_client = httpx.AsyncClient(timeout=10)
+    for event in new_events:
+        payload = json.dumps(event).encode()
+        try:
+            response = await _webhook_client.post(FAKE_PROVIDER_WEBHOOK_URL, content=payload, headers={
+                "Content-Type": "application/json", "Stripe-Signature": sign(payload),
+            })
+            response.raise_for_status()
+            stats["webhooks_sent"] += 1
+        except httpx.HTTPError:
+            stats["webhooks_failed"] += 1
+
+
+@app.middleware("http")
+async def simulate_network(request: Request, call_next):
+    stats["requests"] += 1
+    if FAKE_PROVIDER_LATENCY_MS:
+        await asyncio.sleep(random.expovariate(1000 / FAKE_PROVIDER_LATENCY_MS))
+    if FAKE_PROVIDER_ERROR_RATE and random.random() < FAKE_PROVIDER_ERROR_RATE:
+        stats["injected_errors"] += 1
+        if random.random() < 0.5:
+            await call_next(request)
+        status, body = _error(500, "api_error", "injected_failure", "simulated provider failure")
+        return JSONResponse(body, status_code=status)
+    return await call_next(request)
+
+
+async def _idempotent(request: Request, handler, *args) -> JSONResponse:
+    form = dict(parse_qsl((await request.body()).decode()))
+    key = request.headers.get("idempotency-key")
+    params = (request.url.path, tuple(sorted(form.items())))
+    if key:
+        saved = _responses.get(key)
+        if saved is not None:
+            if saved[0] != params:
+                status, body = _error(400, "idempotency_error", "idempotency_key_in_use",
+                                      "Keys for idempotent requests can only be used with the same parameters.")
+                return JSONResponse(body, status_code=status)
+            stats["replays"] += 1
+            return JSONResponse(saved[2], status_code=saved[1], headers={"Idempotent-Replayed": "true"})
+    # الـ handlers مفيهاش await: مفيش طلبين بنفس الـ key يدخلوا في نفس الوقت
+    emitted = len(events)
+    status, body = handler(form, *args)
+    if key:
+        _responses[key] = (params, status, body)
+    if FAKE_PROVIDER_WEBHOOK_URL and len(events) > emitted:
+        asyncio.create_task(_deliver(events[emitted:]))
+    return JSONResponse(body, status_code=status)
+
+
+def _create(form: dict) -> tuple[int, dict]:
+    try:
+        amount = int(form.get("amount", ""))
+    except ValueError:
+        amount = 0
+    currency = form.get("currency", "").lower()
+    if amount <= 0 or len(currency) != 3:
+        return _error(400, "invalid_request_error", "parameter_invalid_integer", "amount and currency are required")
+    intent_id = _id("pi")
+    intent = intents[intent_id] = {
+        "id": intent_id,
+        "object": "payment_intent",
+        "amount": amount,
+        "currency": currency,
+        "status": "requires_payment_method",
+        "client_secret": f"{intent_id}_secret_{secrets.token_hex(8)}",
+        "metadata": {k[len("metadata["):-1]: v for k, v in form.items() if k.startswith("metadata[")},
+        "payment_method": None,
+        "latest_charge": None,
+        "last_payment_error": None,
+        "created": int(time.time()),
+    }
+    bisect.insort(_intent_ids, intent_id)
+    _emit("payment_intent.created", intent)
+    return 200, dict(intent)
+
+
+def _confirm(form: dict, intent_id: str) -> tuple[int, dict]:
+    intent = intents.get(intent_id)
+    if intent is None:
+        return _error(404, "invalid_request_error", "resource_missing", f"No such payment_intent: '{intent_id}'")
+    if intent["status"] not in ("requires_payment_method", "requires_confirmation"):
+        return _error(400, "invalid_request_error", "payment_intent_unexpected_state",
+                      f"This PaymentIntent's status is {intent['status']}.", payment_intent=dict(intent))
+    payment_method = form.get("payment_method") or intent["payment_method"]
+    if not payment_method:
+        return _error(400, "invalid_request_error", "payment_intent_unexpected_state",
+                      "You cannot confirm this PaymentIntent because it's missing a payment method.")
+
+    intent["payment_method"] = payment_method
+    if payment_method == "pm_card_chargeDeclined":
+        intent["status"] = "requires_payment_method"
+        intent["last_payment_error"] = {"type": "card_error", "code": "card_declined", "message": "Your card was declined."}
+        _emit("payment_intent.payment_failed", intent)
+        return _error(402, "card_error", "card_declined", "Your card was declined.", payment_intent=dict(intent))
+    intent["last_payment_error"] = None
+    if payment_method == "pm_card_authenticationRequired":
+        intent["status"] = "requires_action"
+        _emit("payment_intent.requires_action", intent)
+    else:
+        intent["status"] = "succeeded"
+        intent["latest_charge"] = _id("ch")
+        _emit("payment_intent.succeeded", intent)
+    return 200, dict(intent)
+
+
+@app.post("/v1/payment_intents")
+async def create_payment_intent(request: Request):
+    return await _idempotent(request, _create)
+
+
+@app.post("/v1/payment_intents/{intent_id}/confirm")
+async def confirm_payment_intent(intent_id: str, request: Request):
+    return await _idempotent(request, _confirm, intent_id)
+
+
+@app.get("/v1/payment_intents")
+async def list_payment_intents(limit: int = 10, starting_after: str | None = None):
+    """
+    Export بالصفحات مترتب بالـ id تصاعدي (Stripe list API مترتب بالـ created، فالـ reconciliation ضد Stripe
+    محتاج export بنفس الترتيب ده)
+    """
+    limit = max(1, min(limit, 100))
+    start = bisect.bisect_right(_intent_ids, starting_after) if starting_after else 0
+    page = _intent_ids[start:start + limit]
+    return {
+        "object": "list",
+        "data": [intents[intent_id] for intent_id in page],
+        "has_more": start + limit < len(_intent_ids),
+    }
+
+
+@app.get("/v1/payment_intents/{intent_id}")
+async def retrieve_payment_intent(intent_id: str):
+    intent = intents.get(intent_id)
+    if intent is None:
+        status, body = _error(404, "invalid_request_error", "resource_missing", f"No such payment_intent: '{intent_id}'")
+        return JSONResponse(body, status_code=status)
+    return intent
+
+
+@app.get("/")
+async def root():
+    return {"message": "Fake payment provider is running", "intents": len(intents), "events": len(events), **stats}
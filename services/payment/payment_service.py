@@ -1 +1,109 @@
-print("Hello from Payment Service (Python)")
+# services/payment/payment_service.py
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+import os
+
+import database
+import payments
+import provider
+import webhooks
+from auth import Caller, get_caller
+from schemas import ConfirmSchema, CreateIntentSchema
+
+load_dotenv()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.connect()
+    await payments.ensure_indexes()
+    await webhooks.pipeline.ensure_indexes()
+    provider.get_provider()
+    webhooks.pipeline.start()
+    yield
+    await webhooks.pipeline.stop()
+    await provider.close()
+    database.close()
+
+app = FastAPI(title="Payment Service", lifespan=lifespan)
+
+origins = [
+    os.getenv("FRONTEND_URL", "http://localhost:3000"),
+    os.getenv("ORDER_URL", "http://localhost:5003"),
+]
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Idempotent-Replayed"],
+)
+
+@app.post("/api/payment/create-intent", status_code=201)
+async def create_intent(
+    data: CreateIntentSchema,
+    response: Response,
+    idempotency_key: str = Header(None, max_length=255),
+    caller: Caller = Depends(get_caller),
+):
+    """
+    Idempotency-Key إجباري: نفس الـ key بنفس البيانات بيرجع نفس الـ payment (200 + Idempotent-Replayed)
+    """
+    if not idempotency_key:
+        raise HTTPException(status_code=400, detail="payment.idempotency_key_required")
+    user_id = data.user_id if caller.service else caller.user_id
+    if not user_id:
+        raise HTTPException(status_code=400, detail="payment.user_id_required")
+    try:
+        payment, replayed = await payments.create_intent(user_id, idempotency_key, data.order_id, data.amount, data.currency)
+    except payments.PaymentError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    if replayed:
+        response.status_code = 200
+        response.headers["Idempotent-Replayed"] = "true"
+    return payments.payment_out(payment)
+
+@app.post("/api/payment/confirm")
+async def confirm(data: ConfirmSchema, caller: Caller = Depends(get_caller)):
+    """
+    الكارت لو اترفض بيرجع 200 بـ status=requires_payment_method و last_error، والمستخدم يجرب كارت تاني
+    """
+    try:
+        payment = await payments.get_payment(data.payment_id, caller)
+        payment = await payments.confirm(payment, data.payment_method)
+    except payments.PaymentError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    return payments.payment_out(payment)
+
+@app.get("/api/payment/{payment_id}")
+async def get_payment(payment_id: str, caller: Caller = Depends(get_caller)):
+    try:
+        payment = await payments.get_payment(payment_id, caller)
+    except payments.PaymentError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    return payments.payment_out(payment)
+
+@app.post("/api/payment/webhook")
+async def webhook(request: Request, stripe_signature: str = Header(None)):
+    """
+    الرد بيرجع أول ما الـ event يتحفظ؛ التطبيق على الـ payments بيحصل في الـ consumer (webhooks.py)
+    """
+    payload = await request.body()
+    try:
+        webhooks.verify_signature(payload, stripe_signature)
+        event = webhooks.parse_event(payload)
+    except webhooks.WebhookError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    created = await webhooks.pipeline.ingest(event)
+    return {"received": True, "duplicate": not created}
+
+@app.get("/")
+async def root():
+    return {"message": "Payment service API is running!"}
+
+@app.get("/health")
+async def health():
+    return {"provider": provider.get_provider().stats(), "webhooks": webhooks.pipeline.stats()}
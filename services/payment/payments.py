@@ -0,0 +1,251 @@
+# services/payment/payments.py
+"""
+Payment intents بـ idempotency
+
+كل create-intent لازم يجي بـ Idempotency-Key، والـ key بيتخزن في Mongo تحت unique index (user_id, idempotency_key):
+الـ order service لو عمل retry بنفس الـ key بياخد نفس الـ payment، ومفيش intent تاني بيتعمل عند الـ provider
+
+الحالات:
+    creating -> requires_payment_method / requires_confirmation (الـ intent اتعمل عند الـ provider)
+    requires_* -> confirming -> succeeded / processing / requires_action / requires_payment_method (الكارت اترفض)
+creating و confirming معناهم إن فيه نداء للـ provider شغال (lease_until). لو الـ worker وقع في النص،
+أي retry بعد الـ lease بيكمل بنفس الـ Idempotency-Key عند الـ provider، فمفيش intent ولا charge مرتين
+"""
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+import database
+from auth import Caller
+from provider import ProviderError, get_provider, max_call_seconds
+
+logger = logging.getLogger("payment")
+
+# أقصى مدة لنداء provider واحد قبل ما طلب تاني يعتبره مات ويكمل مكانه: محسوبة من الـ timeouts والـ retries
+# (max_call_seconds) بهامش 50%، و PAYMENT_LEASE_SECONDS يقدر يطولها بس ميقصرهاش عن كده
+PAYMENT_LEASE_SECONDS = max(float(os.getenv("PAYMENT_LEASE_SECONDS") or 0), max_call_seconds() * 1.5)
+
+PAYMENTS_INDEXES = [
+    IndexModel([("user_id", ASCENDING), ("idempotency_key", ASCENDING)], unique=True),
+    # الـ webhooks والـ reconciliation بيدوروا بالـ intent id بتاع الـ provider
+    IndexModel([("provider_id", ASCENDING)], unique=True, partialFilterExpression={"provider_id": {"$type": "string"}}),
+    IndexModel([("order_id", ASCENDING), ("created_at", DESCENDING)]),
+]
+
+CONFIRMABLE = ("requires_payment_method", "requires_confirmation")
+
+# ترتيب الحالات جوه نفس الثانية: الـ provider timestamps بالثانية، فحدثين في نفس الثانية بيتحسموا بالأبعد في الـ flow
+STATUS_RANK = {
+    "requires_payment_method": 0,
+    "requires_confirmation": 1,
+    "requires_action": 2,
+    "processing": 3,
+    "succeeded": 4,
+    "canceled": 4,
+}
+
+
+class PaymentError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+async def ensure_indexes():
+    payments = database.get_payments_collection()
+    for index in PAYMENTS_INDEXES:
+        try:
+            await payments.create_indexes([index])
+        except OperationFailure as e:
+            logger.error("could not create index %s on payments: %s", index.document["name"], e)
+
+
+def payment_out(doc: dict) -> dict:
+    return {
+        "payment_id": str(doc["_id"]),
+        "order_id": doc["order_id"],
+        "amount": doc["amount"],
+        "currency": doc["currency"],
+        "status": doc["status"],
+        "client_secret": doc.get("client_secret"),
+        "provider_id": doc.get("provider_id"),
+        "last_error": doc.get("last_error"),
+        "created_at": doc["created_at"].isoformat(),
+        "updated_at": doc["updated_at"].isoformat(),
+    }
+
+
+def _fingerprint(user_id: str, order_id: str, amount: int, currency: str) -> str:
+    return hashlib.sha256(f"{user_id}\x00{order_id}\x00{amount}\x00{currency}".encode()).hexdigest()
+
+
+def _lease_free(now: datetime) -> dict:
+    return {"$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]}
+
+
+def watermark(status: str, created: int | None = None, event_id: str | None = None) -> dict:
+    """
+    آخر حالة اتسجلت من الـ provider وإمتى: الـ webhooks الأقدم من كده بتتجاهل (webhooks.py)
+    """
+    return {"id": event_id, "created": int(time.time()) if created is None else created, "rank": STATUS_RANK.get(status, 0)}
+
+
+def intent_fields(intent: dict, created: int | None = None, event_id: str | None = None) -> dict:
+    fields = {
+        "provider_id": intent["id"],
+        "status": intent["status"],
+        "charge_id": intent.get("latest_charge"),
+        "last_error": intent.get("last_payment_error"),
+        "provider_event": watermark(intent["status"], created, event_id),
+    }
+    if intent.get("client_secret"):
+        fields["client_secret"] = intent["client_secret"]
+    return fields
+
+
+async def _finish(payment: dict, expected: str, fields: dict) -> dict:
+    """
+    بيسجل نتيجة نداء الـ provider، بس لو الحالة لسه زي ما سبناها (webhook ممكن يكون سبقنا)
+    """
+    payments = database.get_payments_collection()
+    updated = await payments.find_one_and_update(
+        {"_id": payment["_id"], "status": expected},
+        {"$set": {**fields, "lease_until": None, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    return updated or await payments.find_one({"_id": payment["_id"]})
+
+
+async def _release(payment: dict):
+    # خطأ مؤقت عند الـ provider: الحالة بتفضل زي ما هي والـ retry يقدر يكمل علطول من غير ما يستنى الـ lease
+    await database.get_payments_collection().update_one({"_id": payment["_id"]}, {"$set": {"lease_until": None}})
+
+
+async def create_intent(user_id: str, idempotency_key: str, order_id: str, amount: int, currency: str) -> tuple[dict, bool]:
+    """
+    بترجع (payment, replayed): replayed = الـ key ده اتعمل بيه payment قبل كده
+    """
+    payments = database.get_payments_collection()
+    now = datetime.utcnow()
+    fingerprint = _fingerprint(user_id, order_id, amount, currency)
+    payment = {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "idempotency_key": idempotency_key,
+        "fingerprint": fingerprint,
+        "order_id": order_id,
+        "amount": amount,
+        "currency": currency,
+        "status": "creating",
+        "lease_until": now + timedelta(seconds=PAYMENT_LEASE_SECONDS),
+        "created_at": now,
+        "updated_at": now,
+    }
+    try:
+        await payments.insert_one(payment)
+    except DuplicateKeyError:
+        existing = await payments.find_one({"user_id": user_id, "idempotency_key": idempotency_key})
+        if existing is None:
+            raise PaymentError(409, "payment.in_progress")
+        if existing["fingerprint"] != fingerprint:
+            raise PaymentError(422, "payment.idempotency_key_reused")
+        if existing["status"] != "creating":
+            return existing, True
+        # الطلب الأول لسه بيكلم الـ provider، أو وقع قبل ما يخلص: نكمل مكانه لو الـ lease خلص
+        payment = await payments.find_one_and_update(
+            {"_id": existing["_id"], "status": "creating", **_lease_free(now)},
+            {"$set": {"lease_until": now + timedelta(seconds=PAYMENT_LEASE_SECONDS), "updated_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if payment is None:
+            raise PaymentError(409, "payment.in_progress")
+
+    try:
+        intent = await get_provider().create_intent(
+            payment["amount"],
+            payment["currency"],
+            idempotency_key=f"create-{payment['_id']}",
+            metadata={"payment_id": str(payment["_id"]), "order_id": payment["order_id"]},
+        )
+    except ProviderError as e:
+        if e.retryable:
+            await _release(payment)
+            raise PaymentError(503, "payment.provider_unavailable")
+        logger.warning("provider rejected payment %s: %s", payment["_id"], e)
+        return await _finish(payment, "creating", {"status": "failed", "last_error": {"code": e.code, "message": e.message}}), False
+    return await _finish(payment, "creating", intent_fields(intent)), False
+
+
+async def get_payment(payment_id: str, caller: Caller) -> dict:
+    try:
+        oid = ObjectId(payment_id)
+    except (InvalidId, TypeError):
+        raise PaymentError(404, "payment.not_found")
+    payment = await database.get_payments_collection().find_one({"_id": oid})
+    # payment بتاع حد تاني = مش موجود (منقولش إنه موجود)
+    if payment is None or not caller.can_access(payment):
+        raise PaymentError(404, "payment.not_found")
+    return payment
+
+
+async def confirm(payment: dict, payment_method: str | None) -> dict:
+    """
+    confirm مرتين = نفس النتيجة: لو الـ payment خلص بيرجع زي ما هو من غير نداء للـ provider
+    """
+    payments = database.get_payments_collection()
+    now = datetime.utcnow()
+    lease = now + timedelta(seconds=PAYMENT_LEASE_SECONDS)
+    status = payment["status"]
+
+    if status == "creating":
+        raise PaymentError(409, "payment.not_ready")
+    if status in CONFIRMABLE:
+        # كل محاولة confirm جديدة (مثلاً بعد كارت اترفض) ليها Idempotency-Key جديد عند الـ provider
+        claimed = await payments.find_one_and_update(
+            {"_id": payment["_id"], "status": status},
+            {
+                "$set": {"status": "confirming", "payment_method": payment_method, "lease_until": lease, "updated_at": now},
+                "$inc": {"confirm_attempts": 1},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+    elif status == "confirming":
+        # محاولة وقعت في النص: نكمّلها بنفس الـ key ونفس الـ payment method
+        claimed = await payments.find_one_and_update(
+            {"_id": payment["_id"], "status": "confirming", **_lease_free(now)},
+            {"$set": {"lease_until": lease, "updated_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+    else:
+        return payment
+    if claimed is None:
+        raise PaymentError(409, "payment.in_progress")
+
+    try:
+        intent = await get_provider().confirm_intent(
+            claimed["provider_id"],
+            claimed.get("payment_method"),
+            idempotency_key=f"confirm-{claimed['_id']}-{claimed['confirm_attempts']}",
+        )
+    except ProviderError as e:
+        if e.retryable:
+            await _release(claimed)
+            raise PaymentError(503, "payment.provider_unavailable")
+        if e.code == "payment_intent_unexpected_state":
+            # الحالة عندنا قديمة (مثلاً اتعمل confirm من الـ frontend مباشرة): نصدق الـ provider
+            intent = await get_provider().retrieve_intent(claimed["provider_id"])
+            return await _finish(claimed, "confirming", intent_fields(intent))
+        return await _finish(claimed, "confirming", {
+            "status": "requires_payment_method",
+            "last_error": {"code": e.code, "message": e.message},
+            "provider_event": watermark("requires_payment_method"),
+        })
+    return await _finish(claimed, "confirming", intent_fields(intent))
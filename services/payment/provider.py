@@ -0,0 +1,203 @@
+# services/payment/provider.py
+"""
+Client الـ payment provider (Stripe REST API)
+
+httpx.AsyncClient واحد لكل worker بـ keep-alive و timeouts (مش connection جديد مع كل دفع)،
+وكل النداءات تحت semaphore محدود: الـ burst بيستنى دوره لحد PROVIDER_QUEUE_TIMEOUT وبعدها 503 بدل ما يتراكم
+
+    PAYMENT_PROVIDER_URL=https://api.stripe.com     (الافتراضي)
+    PAYMENT_PROVIDER_URL=http://localhost:5099      uvicorn fake_provider:app --port 5099 (load runs)
+    PAYMENT_PROVIDER_URL=fake://                    الـ fake provider in-process من غير network
+
+كل نداء بيغير حاجة عند الـ provider بيتبعت بـ Idempotency-Key، فإعادة المحاولة بعد timeout أو 5xx آمنة
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("payment")
+
+PAYMENT_PROVIDER_URL = os.getenv("PAYMENT_PROVIDER_URL", "https://api.stripe.com")
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
+
+# ===== connection pool (per worker process)
+PROVIDER_MAX_CONNECTIONS = int(os.getenv("PROVIDER_MAX_CONNECTIONS", "100"))
+PROVIDER_MAX_KEEPALIVE = int(os.getenv("PROVIDER_MAX_KEEPALIVE", "20"))
+PROVIDER_KEEPALIVE_EXPIRY = float(os.getenv("PROVIDER_KEEPALIVE_EXPIRY", "30"))
+PROVIDER_CONNECT_TIMEOUT = float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "2"))
+PROVIDER_READ_TIMEOUT = float(os.getenv("PROVIDER_READ_TIMEOUT", "10"))
+
+# ===== concurrency: أقصى نداءات في نفس الوقت، والباقي بيستنى لحد PROVIDER_QUEUE_TIMEOUT
+PROVIDER_CONCURRENCY = int(os.getenv("PROVIDER_CONCURRENCY", "50"))
+PROVIDER_QUEUE_TIMEOUT = float(os.getenv("PROVIDER_QUEUE_TIMEOUT", "2"))
+PROVIDER_RETRIES = int(os.getenv("PROVIDER_RETRIES", "2"))
+PROVIDER_RETRY_BACKOFF = float(os.getenv("PROVIDER_RETRY_BACKOFF", "0.2"))
+
+
+def max_call_seconds() -> float:
+    """
+    أطول وقت ممكن لنداء واحد من _request: انتظار الـ semaphore + كل المحاولات (pool + connect + read لكل واحدة)
+    + أقصى backoff بين المحاولات. الـ lease بتاع الـ payment لازم يبقى أطول من كده
+    """
+    attempt = PROVIDER_QUEUE_TIMEOUT + PROVIDER_CONNECT_TIMEOUT + PROVIDER_READ_TIMEOUT
+    backoff = sum(PROVIDER_RETRY_BACKOFF * 2 ** n * 1.5 for n in range(PROVIDER_RETRIES))
+    return PROVIDER_QUEUE_TIMEOUT + (PROVIDER_RETRIES + 1) * attempt + backoff
+
+
+class ProviderError(Exception):
+    def __init__(self, status: int, code: str, message: str = "", retryable: bool = False):
+        super().__init__(f"{status} {code}: {message}")
+        self.status = status
+        self.code = code
+        self.message = message
+        self.retryable = retryable
+
+
+class Provider:
+    def __init__(self, base_url: str = PAYMENT_PROVIDER_URL, api_key: str = STRIPE_SECRET_KEY):
+        transport = None
+        if base_url.startswith("fake://"):
+            import fake_provider
+
+            transport = httpx.ASGITransport(app=fake_provider.app)
+            base_url = "http://fake-provider"
+        self.base_url = base_url
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            transport=transport,
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=httpx.Limits(
+                max_connections=PROVIDER_MAX_CONNECTIONS,
+                max_keepalive_connections=PROVIDER_MAX_KEEPALIVE,
+                keepalive_expiry=PROVIDER_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(PROVIDER_READ_TIMEOUT, connect=PROVIDER_CONNECT_TIMEOUT, pool=PROVIDER_QUEUE_TIMEOUT),
+        )
+        self._semaphore = asyncio.Semaphore(PROVIDER_CONCURRENCY)
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0
+        self.rejected = 0
+        self.responses = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _request(self, method: str, path: str, data: dict | None = None, idempotency_key: str | None = None,
+                       params: dict | None = None) -> dict:
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), PROVIDER_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ProviderError(503, "provider_busy", "too many concurrent provider calls", retryable=True)
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        try:
+            for attempt in range(PROVIDER_RETRIES + 1):
+                self.calls += 1
+                started = time.perf_counter()
+                try:
+                    response = await self._client.request(method, path, data=data, params=params, headers=headers)
+                except httpx.TimeoutException:
+                    error = ProviderError(504, "provider_timeout", f"{method} {path} timed out", retryable=True)
+                except httpx.TransportError as e:
+                    error = ProviderError(502, "provider_unreachable", str(e), retryable=True)
+                else:
+                    elapsed = time.perf_counter() - started
+                    self.responses += 1
+                    self._latency_total += elapsed
+                    self._latency_max = max(self._latency_max, elapsed)
+                    try:
+                        body = response.json() if response.content else {}
+                    except ValueError:
+                        # proxy قدام الـ provider ممكن يرجع HTML مع 502
+                        body = {}
+                    if response.status_code < 400:
+                        return body
+                    err = body.get("error") or {}
+                    code = err.get("code") or err.get("type") or "provider_error"
+                    error = ProviderError(
+                        response.status_code,
+                        code,
+                        err.get("message", ""),
+                        # 409 / idempotency_key_in_use: نداء تاني بنفس الـ key لسه شغال عند الـ provider، مش رفض
+                        retryable=(response.status_code in (409, 429) or response.status_code >= 500
+                                   or code == "idempotency_key_in_use"),
+                    )
+
+                self.errors += 1
+                # POST من غير Idempotency-Key ممكن يكون اتنفذ فعلاً: مش بنعيده
+                if not error.retryable or attempt == PROVIDER_RETRIES or (method != "GET" and not idempotency_key):
+                    raise error
+                self.retries += 1
+                logger.warning("provider %s %s failed (%s), retrying", method, path, error)
+                await asyncio.sleep(PROVIDER_RETRY_BACKOFF * 2 ** attempt * (0.5 + random.random()))
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    # ===== payment intents
+    async def create_intent(self, amount: int, currency: str, idempotency_key: str, metadata: dict[str, str]) -> dict:
+        data = {"amount": amount, "currency": currency, "payment_method_types[]": "card"}
+        data.update({f"metadata[{k}]": v for k, v in metadata.items()})
+        return await self._request("POST", "/v1/payment_intents", data, idempotency_key)
+
+    async def confirm_intent(self, intent_id: str, payment_method: str | None, idempotency_key: str) -> dict:
+        data = {"payment_method": payment_method} if payment_method else {}
+        return await self._request("POST", f"/v1/payment_intents/{intent_id}/confirm", data, idempotency_key)
+
+    async def retrieve_intent(self, intent_id: str) -> dict:
+        return await self._request("GET", f"/v1/payment_intents/{intent_id}")
+
+    async def list_intents(self, starting_after: str | None = None, limit: int = 100) -> dict:
+        params = {"limit": limit}
+        if starting_after:
+            params["starting_after"] = starting_after
+        return await self._request("GET", "/v1/payment_intents", params=params)
+
+    def stats(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "concurrency": PROVIDER_CONCURRENCY,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "retries": self.retries,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "latency_avg_ms": round(self._latency_total / self.responses * 1000, 3) if self.responses else None,
+            "latency_max_ms": round(self._latency_max * 1000, 3),
+        }
+
+
+# ===== client واحد لكل worker
+_provider: Provider | None = None
+
+
+def get_provider() -> Provider:
+    global _provider
+    if _provider is None:
+        _provider = Provider()
+    return _provider
+
+
+async def close():
+    global _provider
+    if _provider is not None:
+        await _provider.close()
+    _provider = None
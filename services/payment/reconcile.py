@@ -0,0 +1,339 @@
+# services/payment/reconcile.py
+"""
+Reconciliation بين الـ provider والـ payments والـ orders عندنا (بالليل من cron)
+
+    python reconcile.py                 يكمل آخر run موقف، أو يبدأ run جديد
+    python reconcile.py --new           run جديد من الأول حتى لو فيه run موقف
+
+الجهتين بيتقروا streaming ومترتبين بالـ provider id: الـ payments بـ find().sort().batch_size() والـ provider
+بالـ export بالصفحات (الصفحة الجاية بتتجاب وإحنا بنعالج الحالية)، وبعدها merge join، فالذاكرة ثابتة مهما كان الحجم
+الفروقات بتتكتب في payment_discrepancies بـ bulk upserts كل --checkpoint-every صف، وبعدها الـ checkpoint
+(آخر provider id خلص) بيتسجل في reconciliation_runs. لو الـ job وقع، الـ run الجاي بيكمل بعد آخر checkpoint،
+والصفوف اللي اتعادت بتعمل upsert لنفس الـ discrepancy فمفيش تكرار
+
+الـ merge join صح بس لو الـ provider بيعمل export بترتيب الـ id. Stripe بيرتب بوقت الإنشاء، فالـ script بيرفض يشتغل
+إلا مع الـ fake provider أو RECONCILE_PROVIDER_ID_ORDER=1، ولو أي جهة طلعت مش مترتبة وسط الـ run بيقف من غير ما يحل حاجة
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+import database
+import provider
+
+load_dotenv()
+
+logger = logging.getLogger("reconcile")
+
+DISCREPANCIES_COLLECTION = "payment_discrepancies"
+RUNS_COLLECTION = "reconciliation_runs"
+ORDERS_COLLECTION = "orders"
+
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "1000"))
+RECONCILE_PAGE_SIZE = int(os.getenv("RECONCILE_PAGE_SIZE", "100"))
+RECONCILE_CHECKPOINT_EVERY = int(os.getenv("RECONCILE_CHECKPOINT_EVERY", "5000"))
+RECONCILE_PROGRESS_SECONDS = float(os.getenv("RECONCILE_PROGRESS_SECONDS", "10"))
+# الـ provider بيعمل list للـ intents بترتيب الـ id (الـ fake provider كده دايماً)
+RECONCILE_PROVIDER_ID_ORDER = os.getenv("RECONCILE_PROVIDER_ID_ORDER", "") == "1" or provider.PAYMENT_PROVIDER_URL.startswith("fake://")
+
+# payment لسه بيكلم الـ provider (creating/confirming): الفرق طبيعي، مش discrepancy
+IN_FLIGHT_STATUSES = ("creating", "confirming")
+PAYMENT_FIELDS = {"provider_id": 1, "order_id": 1, "amount": 1, "currency": 1, "status": 1, "charge_id": 1, "lease_until": 1}
+
+
+async def stream_payments(after: str | None, batch_size: int):
+    # $type بيخلي الـ query تطابق الـ partial index بتاع provider_id
+    query = {"provider_id": {"$type": "string", **({"$gt": after} if after else {})}}
+    cursor = database.get_payments_collection().find(query, PAYMENT_FIELDS).sort("provider_id", ASCENDING).batch_size(batch_size)
+    async for doc in cursor:
+        yield doc
+
+
+async def stream_provider(after: str | None, page_size: int):
+    client = provider.get_provider()
+    page = await client.list_intents(after, page_size)
+    while True:
+        data = page.get("data") or []
+        upcoming = None
+        if page.get("has_more") and data:
+            upcoming = asyncio.create_task(client.list_intents(data[-1]["id"], page_size))
+        try:
+            for intent in data:
+                yield intent
+        except BaseException:
+            if upcoming is not None:
+                upcoming.cancel()
+            raise
+        if upcoming is None:
+            return
+        page = await upcoming
+
+
+class OrderError(Exception):
+    """
+    واحدة من الجهتين مش مترتبة بالـ id: نتيجة الـ merge join غلط (missing_* وهمية)
+    """
+
+
+async def ascending(stream, key, side: str):
+    previous = None
+    async for item in stream:
+        if previous is not None and item[key] <= previous:
+            raise OrderError(f"{side} stream is not sorted by id: {item[key]!r} after {previous!r}")
+        previous = item[key]
+        yield item
+
+
+async def merge_join(ours, theirs):
+    """
+    الجهتين مترتبين بنفس المفتاح: بيطلع (payment, intent) وواحد منهم None لو مالوش مقابل
+    """
+    payment = await anext(ours, None)
+    intent = await anext(theirs, None)
+    while payment is not None or intent is not None:
+        if intent is None or (payment is not None and payment["provider_id"] < intent["id"]):
+            yield payment, None
+            payment = await anext(ours, None)
+        elif payment is None or intent["id"] < payment["provider_id"]:
+            yield None, intent
+            intent = await anext(theirs, None)
+        else:
+            yield payment, intent
+            payment = await anext(ours, None)
+            intent = await anext(theirs, None)
+
+
+def compare(payment: dict | None, intent: dict | None, now: datetime) -> list[tuple[str, dict, dict]]:
+    """
+    بترجع [(kind, ours, theirs)]
+    """
+    if intent is None:
+        return [("missing_at_provider", _ours(payment), {})]
+    theirs = {"status": intent.get("status"), "amount": intent.get("amount"), "currency": intent.get("currency"),
+              "charge_id": intent.get("latest_charge")}
+    if payment is None:
+        return [("missing_locally", {}, theirs)]
+    ours = _ours(payment)
+    found = []
+    if payment["amount"] != intent.get("amount") or payment["currency"] != intent.get("currency"):
+        found.append(("amount_mismatch", ours, theirs))
+    in_flight = payment["status"] in IN_FLIGHT_STATUSES and payment.get("lease_until") is not None and payment["lease_until"] >= now
+    if payment["status"] != intent.get("status") and not in_flight:
+        found.append(("status_mismatch", ours, theirs))
+    return found
+
+
+def _ours(payment: dict) -> dict:
+    return {"status": payment["status"], "amount": payment["amount"], "currency": payment["currency"],
+            "charge_id": payment.get("charge_id")}
+
+
+def _metadata_payment_id(intent: dict) -> ObjectId | None:
+    # intent من غير payment عندنا: غالباً create وقع قبل ما يسجل الـ provider id، والـ metadata فيها الـ payment
+    payment_id = (intent.get("metadata") or {}).get("payment_id")
+    try:
+        return ObjectId(payment_id) if payment_id else None
+    except (InvalidId, TypeError):
+        return None
+
+
+class Reconciler:
+    def __init__(self, run: dict, batch_size: int, page_size: int, checkpoint_every: int):
+        self.run = run
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.checkpoint_every = checkpoint_every
+        self.runs = database.get_collection(RUNS_COLLECTION)
+        self.discrepancies = database.get_collection(DISCREPANCIES_COLLECTION)
+        self.orders = database.get_collection(ORDERS_COLLECTION)
+        self.rows = 0
+        self.found = 0
+        self._checkpointed = (0, 0)
+        self._pending: list[tuple[str, dict | None, dict | None, dict, dict]] = []
+        # الـ payments اللي نجحت في الـ chunk ده: الـ orders بتاعتها بتتشاف بـ $in واحد وقت الـ flush
+        self._paid: list[tuple[dict, dict]] = []
+
+    async def _check_orders(self):
+        ids = {}
+        for payment, _ in self._paid:
+            try:
+                ids[payment["order_id"]] = ObjectId(payment["order_id"])
+            except (InvalidId, TypeError):
+                continue
+        orders = {}
+        if ids:
+            async for order in self.orders.find({"_id": {"$in": list(ids.values())}}, {"paymentStatus": 1, "totalAmount": 1}):
+                orders[str(order["_id"])] = order
+        for payment, intent in self._paid:
+            order = orders.get(payment["order_id"])
+            ours = {"order_id": payment["order_id"], "order_payment_status": order.get("paymentStatus") if order else None,
+                    "order_total": order.get("totalAmount") if order else None}
+            theirs = {"status": intent["status"], "amount": intent["amount"], "currency": intent["currency"]}
+            if order is None:
+                self._pending.append(("order_missing", payment, intent, ours, theirs))
+                continue
+            if order.get("paymentStatus") != "paid":
+                self._pending.append(("order_not_paid", payment, intent, ours, theirs))
+            # totalAmount في الـ order service بالدولار، والـ payments بأصغر وحدة
+            if round((order.get("totalAmount") or 0) * 100) != payment["amount"]:
+                self._pending.append(("order_amount_mismatch", payment, intent, ours, theirs))
+        self._paid = []
+
+    async def flush(self, last_key: str | None):
+        await self._check_orders()
+        now = datetime.utcnow()
+        if self._pending:
+            updates = []
+            for kind, payment, intent, ours, theirs in self._pending:
+                key = (intent or {}).get("id") or payment["provider_id"]
+                updates.append(UpdateOne(
+                    {"_id": f"{kind}:{key}"},
+                    {
+                        "$set": {
+                            "kind": kind,
+                            "provider_id": key,
+                            "payment_id": payment["_id"] if payment else _metadata_payment_id(intent),
+                            "order_id": payment["order_id"] if payment else (intent.get("metadata") or {}).get("order_id"),
+                            "ours": ours,
+                            "theirs": theirs,
+                            "run_id": self.run["_id"],
+                            "last_seen_at": now,
+                            "resolved": False,
+                        },
+                        "$setOnInsert": {"first_seen_at": now},
+                    },
+                    upsert=True,
+                ))
+            await self.discrepancies.bulk_write(updates, ordered=False)
+            self.found += len(updates)
+            self._pending = []
+        # الـ checkpoint بعد الـ bulk_write: لو وقعنا بينهم الصفوف دي بتتعاد وتعمل upsert لنفس الـ docs
+        await self.runs.update_one({"_id": self.run["_id"]}, {
+            "$set": {"last_key": last_key, "updated_at": now},
+            "$inc": {"rows": self.rows - self._checkpointed[0], "discrepancies": self.found - self._checkpointed[1]},
+        })
+        self._checkpointed = (self.rows, self.found)
+
+    async def execute(self) -> dict:
+        after = self.run.get("last_key")
+        if after:
+            logger.info("resuming run %s after %s", self.run["_id"], after)
+        now = datetime.utcnow()
+        started = time.perf_counter()
+
+        pairs = merge_join(
+            ascending(stream_payments(after, self.batch_size), "provider_id", "payments"),
+            ascending(stream_provider(after, self.page_size), "id", "provider"),
+        )
+        try:
+            await self._join(pairs, now, started)
+        except OrderError as e:
+            # الـ discrepancies اللي اتكتبت قبل كده ممكن تكون وهمية، وأهم حاجة منعملش resolve للقديمة على أساسها
+            logger.error("run %s aborted: %s", self.run["_id"], e)
+            await self.runs.update_one({"_id": self.run["_id"]}, {"$set": {
+                "status": "failed", "error": str(e), "updated_at": datetime.utcnow(),
+            }})
+            raise
+        elapsed = time.perf_counter() - started
+
+        # اللي ماتشافش في الـ run ده (واتقفل من غير ما يتعاد) اتحل
+        resolved = await self.discrepancies.update_many(
+            {"resolved": False, "run_id": {"$ne": self.run["_id"]}},
+            {"$set": {"resolved": True, "resolved_at": datetime.utcnow()}},
+        )
+        summary = {
+            "run_id": self.run["_id"],
+            "rows": self.rows,
+            "discrepancies": self.found,
+            "resolved": resolved.modified_count,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(self.rows / elapsed, 1) if elapsed else None,
+        }
+        await self.runs.update_one({"_id": self.run["_id"]}, {"$set": {
+            "status": "completed", "completed_at": datetime.utcnow(), "last_elapsed_s": summary["elapsed_s"],
+        }})
+        return summary
+
+    async def _join(self, pairs, now: datetime, started: float):
+        last_key = self.run.get("last_key")
+        last_report = started
+        since_checkpoint = 0
+        async for payment, intent in pairs:
+            self.rows += 1
+            since_checkpoint += 1
+            last_key = intent["id"] if intent is not None else payment["provider_id"]
+            for kind, ours, theirs in compare(payment, intent, now):
+                self._pending.append((kind, payment, intent, ours, theirs))
+            if payment is not None and intent is not None and intent.get("status") == "succeeded":
+                self._paid.append((payment, intent))
+
+            if since_checkpoint >= self.checkpoint_every:
+                await self.flush(last_key)
+                since_checkpoint = 0
+                if time.perf_counter() - last_report >= RECONCILE_PROGRESS_SECONDS:
+                    last_report = time.perf_counter()
+                    logger.info("%d rows, %.0f rows/s, %d discrepancies, at %s",
+                                self.rows, self.rows / (last_report - started), self.found, last_key)
+        await self.flush(last_key)
+
+
+async def open_run(new: bool) -> dict:
+    runs = database.get_collection(RUNS_COLLECTION)
+    now = datetime.utcnow()
+    if new:
+        await runs.update_many({"status": "running"}, {"$set": {"status": "abandoned", "updated_at": now}})
+    else:
+        run = await runs.find_one({"status": "running"}, sort=[("started_at", DESCENDING)])
+        if run is not None:
+            return run
+    run = {"_id": f"{now:%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}", "status": "running", "last_key": None,
+           "rows": 0, "discrepancies": 0, "started_at": now, "updated_at": now}
+    await runs.insert_one(run)
+    return run
+
+
+async def ensure_indexes():
+    await database.get_collection(RUNS_COLLECTION).create_index([("status", ASCENDING), ("started_at", DESCENDING)])
+    await database.get_collection(DISCREPANCIES_COLLECTION).create_index([("resolved", ASCENDING), ("kind", ASCENDING)])
+    # discrepancies اتحلت من أكتر من 90 يوم مالهاش لازمة
+    await database.get_collection(DISCREPANCIES_COLLECTION).create_index(
+        [("resolved_at", ASCENDING)], expireAfterSeconds=int(timedelta(days=90).total_seconds()))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--new", action="store_true", help="start a new run instead of resuming an unfinished one")
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE, help="Mongo cursor batch size")
+    parser.add_argument("--page-size", type=int, default=RECONCILE_PAGE_SIZE, help="provider export page size")
+    parser.add_argument("--checkpoint-every", type=int, default=RECONCILE_CHECKPOINT_EVERY)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    if not RECONCILE_PROVIDER_ID_ORDER:
+        sys.exit(f"{provider.PAYMENT_PROVIDER_URL} does not list intents by id; merge join needs RECONCILE_PROVIDER_ID_ORDER=1")
+    try:
+        await ensure_indexes()
+        run = await open_run(args.new)
+        try:
+            summary = await Reconciler(run, args.batch_size, args.page_size, args.checkpoint_every).execute()
+        except OrderError as e:
+            sys.exit(f"reconciliation aborted: {e}")
+        print(json.dumps(summary))
+    finally:
+        await provider.close()
+        database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,13 @@
+from typing import Optional
+from pydantic import BaseModel, Field, conint, constr
+
+class CreateIntentSchema(BaseModel):
+    order_id: constr(min_length=1, max_length=64)
+    amount: conint(gt=0)  # بأصغر وحدة في العملة (cents)
+    currency: str = Field("usd", pattern=r"^[a-z]{3}$")
+    # الـ order service بيبعت الـ user بتاع الأوردر؛ المستخدم العادي ده بيتجاهل ويتاخد من الـ JWT
+    user_id: Optional[str] = None
+
+class ConfirmSchema(BaseModel):
+    payment_id: str
+    payment_method: Optional[str] = None
@@ -0,0 +1,327 @@
+# services/payment/webhooks.py
+"""
+Webhooks الـ provider: استقبال سريع وتطبيق على دفعات
+
+الاستقبال: التوقيع بيتراجع بـ HMAC key متجهز مرة واحدة، والـ event بيتكتب في webhook_events (الـ _id هو الـ event id،
+فالـ event المكرر بيقع على الـ unique _id) وبعدها الرد 200 علطول. الـ inserts من الطلبات اللي جاية مع بعض
+بتتجمع في insert_many واحد (group commit) بدل round-trip لكل webhook وقت الـ burst
+التطبيق: الـ event بيدخل asyncio.Queue، والـ consumer بياخد دفعة (WEBHOOK_BATCH_SIZE أو WEBHOOK_BATCH_WAIT_MS)،
+بيرتبها لكل payment بالـ created بتاع الـ provider، وبيطبق آخر حالة لكل payment بـ bulk_write واحد
+الترتيب: كل payment شايل provider_event (created, rank) لآخر حالة اتطبقت، والـ update مشروط إن الـ event أحدث،
+فـ event قديم وصل متأخر (أو اتطبق من worker تاني) مبيرجعش الحالة لورا
+الـ queue في الذاكرة بس، فلو الـ worker وقع أو الـ queue اتملت، الـ events فاضلة pending في Mongo والـ sweep بيرجعها
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
+
+import database
+from payments import STATUS_RANK, intent_fields
+
+logger = logging.getLogger("payment")
+
+WEBHOOK_EVENTS_COLLECTION = "webhook_events"
+
+# أكتر من secret مفصولين بـ comma وقت تغيير الـ secret عند الـ provider
+STRIPE_WEBHOOK_SECRETS = [s.strip() for s in os.getenv("STRIPE_WEBHOOK_SECRET", "").split(",") if s.strip()]
+WEBHOOK_TOLERANCE_SECONDS = int(os.getenv("WEBHOOK_TOLERANCE_SECONDS", "300"))
+WEBHOOK_INSERT_BATCH = int(os.getenv("WEBHOOK_INSERT_BATCH", "500"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "10000"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "500"))
+WEBHOOK_BATCH_WAIT_MS = float(os.getenv("WEBHOOK_BATCH_WAIT_MS", "20"))
+# event فضل pending أكتر من كده = الـ worker اللي استلمه وقع أو الـ queue كانت مليانة
+WEBHOOK_RECOVER_AFTER = float(os.getenv("WEBHOOK_RECOVER_AFTER", "30"))
+WEBHOOK_RECOVER_INTERVAL = float(os.getenv("WEBHOOK_RECOVER_INTERVAL", "10"))
+# الـ event ids بتفضل محفوظة المدة دي عشان الـ dedup (الـ provider بيعيد المحاولة لحد 3 أيام)
+WEBHOOK_RETENTION_DAYS = int(os.getenv("WEBHOOK_RETENTION_DAYS", "7"))
+
+# HMAC-SHA256 بيعمل hash للـ key (ipad/opad) مع كل hmac.new: بنعمله مرة واحدة ونعمل copy() لكل طلب
+_MACS = [hmac.new(secret.encode(), digestmod=hashlib.sha256) for secret in STRIPE_WEBHOOK_SECRETS]
+
+# أكتر حالة متأخرة ممكن تتكتب من webhook: بعد succeeded/canceled مفيش رجوع
+FINAL_STATUSES = ("succeeded", "canceled")
+
+
+class WebhookError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def verify_signature(payload: bytes, header: str | None, now: float | None = None):
+    """
+    Stripe-Signature: t=<timestamp>,v1=<hex>[,v1=<hex>]  ← HMAC-SHA256 على "<timestamp>.<payload>"
+    """
+    if not _MACS:
+        raise WebhookError(503, "webhook.not_configured")
+    if not header:
+        raise WebhookError(400, "webhook.no_signature")
+    timestamp = None
+    signatures = []
+    for item in header.split(","):
+        key, _, value = item.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    if not timestamp or not timestamp.isdigit() or not signatures:
+        raise WebhookError(400, "webhook.invalid_signature")
+    # الـ timestamp جوه الـ HMAC، فالـ tolerance بيمنع replay لطلب قديم متسجل
+    if abs((now or time.time()) - int(timestamp)) > WEBHOOK_TOLERANCE_SECONDS:
+        raise WebhookError(400, "webhook.timestamp_out_of_tolerance")
+    signed = timestamp.encode() + b"." + payload
+    for base in _MACS:
+        mac = base.copy()
+        mac.update(signed)
+        expected = mac.hexdigest()
+        if any(hmac.compare_digest(expected, signature) for signature in signatures):
+            return
+    raise WebhookError(400, "webhook.invalid_signature")
+
+
+def parse_event(payload: bytes) -> dict:
+    try:
+        event = json.loads(payload)
+        obj = event["data"]["object"]
+        doc = {
+            "_id": str(event["id"]),
+            "type": str(event["type"]),
+            "created": int(event["created"]),
+            "object": obj,
+        }
+    except (ValueError, KeyError, TypeError):
+        raise WebhookError(400, "webhook.invalid_payload")
+    if not isinstance(obj, dict):
+        raise WebhookError(400, "webhook.invalid_payload")
+    # الـ payment_id بيتبعت في الـ metadata وقت create_intent، فالـ event بيلاقي الـ payment حتى لو وصل قبل ما الـ create يخلص
+    metadata = obj.get("metadata") or {}
+    doc["order_id"] = metadata.get("order_id")
+    doc["payment_id"] = None
+    if doc["type"].startswith("payment_intent.") and metadata.get("payment_id"):
+        try:
+            doc["payment_id"] = ObjectId(metadata["payment_id"])
+        except (InvalidId, TypeError):
+            pass
+    return doc
+
+
+class WebhookPipeline:
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._flusher: asyncio.Task | None = None
+        self._tasks: list[asyncio.Task] = []
+        self.received = 0
+        self.duplicates = 0
+        self.insert_batches = 0
+        self.overflowed = 0
+        self.recovered = 0
+        self.batches = 0
+        self.applied = 0
+        self.superseded = 0
+        self.ignored = 0
+        self.failed_batches = 0
+
+    @property
+    def events(self):
+        return database.get_collection(WEBHOOK_EVENTS_COLLECTION)
+
+    async def ensure_indexes(self):
+        await self.events.create_indexes([
+            IndexModel([("status", ASCENDING), ("received_at", ASCENDING)]),
+            IndexModel([("received_at", ASCENDING)], expireAfterSeconds=WEBHOOK_RETENTION_DAYS * 86400),
+        ])
+
+    # ===== الاستقبال
+    async def ingest(self, doc: dict) -> bool:
+        """
+        بيكتب الـ event في Mongo ويحطه في الـ queue. بترجع False لو الـ event ده وصل قبل كده
+        """
+        self.received += 1
+        doc["status"] = "pending"
+        doc["received_at"] = datetime.utcnow()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((doc, future))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_inserts())
+        if not await future:
+            self.duplicates += 1
+            return False
+        try:
+            self.queue.put_nowait(doc)
+        except asyncio.QueueFull:
+            # محفوظ في Mongo: الـ sweep هيطبقه بعد WEBHOOK_RECOVER_AFTER
+            self.overflowed += 1
+        return True
+
+    async def _flush_inserts(self):
+        # الطلبات اللي بتوصل وإحنا مستنيين insert_many بتتجمع للـ insert_many اللي بعده: مفيش انتظار إضافي
+        try:
+            while self._pending:
+                batch, self._pending = self._pending[:WEBHOOK_INSERT_BATCH], self._pending[WEBHOOK_INSERT_BATCH:]
+                duplicate = set()
+                error = None
+                try:
+                    await self.events.insert_many([doc for doc, _ in batch], ordered=False)
+                except BulkWriteError as e:
+                    for write_error in e.details.get("writeErrors", []):
+                        if write_error.get("code") == 11000:
+                            duplicate.add(write_error["index"])
+                        else:
+                            error = e
+                except Exception as e:
+                    error = e
+                self.insert_batches += 1
+                for i, (_, future) in enumerate(batch):
+                    if future.done():
+                        continue
+                    if i in duplicate:
+                        future.set_result(False)
+                    elif error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(True)
+        finally:
+            self._flusher = None
+
+    # ===== التطبيق
+    async def _next_batch(self) -> list[dict]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + WEBHOOK_BATCH_WAIT_MS / 1000
+        while len(batch) < WEBHOOK_BATCH_SIZE:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def apply(self, batch: list[dict]):
+        """
+        آخر event لكل payment (بترتيب الـ provider) هو اللي بيتكتب: events نفس الـ order بتتطبق بالترتيب
+        حتى لو وصلت مقلوبة أو في دفعات مختلفة
+        """
+        latest: dict[ObjectId, dict] = {}
+        ignored = []
+        for doc in sorted(batch, key=lambda d: (d["created"], STATUS_RANK.get(d["object"].get("status"), 0))):
+            if doc["payment_id"] is None or not doc["object"].get("id") or not doc["object"].get("status"):
+                ignored.append(doc["_id"])
+                continue
+            latest[doc["payment_id"]] = doc
+
+        now = datetime.utcnow()
+        updates = []
+        for payment_id, doc in latest.items():
+            fields = intent_fields(doc["object"], created=doc["created"], event_id=doc["_id"])
+            mark = fields["provider_event"]
+            updates.append(UpdateOne(
+                {
+                    "_id": payment_id,
+                    "status": {"$nin": FINAL_STATUSES},
+                    "$or": [
+                        {"provider_event": None},
+                        {"provider_event.created": {"$lt": mark["created"]}},
+                        {"provider_event.created": mark["created"], "provider_event.rank": {"$lt": mark["rank"]}},
+                    ],
+                },
+                {"$set": {**fields, "updated_at": now}},
+            ))
+        if updates:
+            result = await database.get_payments_collection().bulk_write(updates, ordered=False)
+            self.applied += result.modified_count
+            self.superseded += len(batch) - len(ignored) - result.modified_count
+        self.ignored += len(ignored)
+
+        ids = [doc["_id"] for doc in batch]
+        await self.events.update_many({"_id": {"$in": ids}}, {"$set": {"status": "processed", "processed_at": now}})
+        self.batches += 1
+
+    async def consume(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.apply(batch)
+            except Exception:
+                # الـ events فاضلة pending والـ sweep هيرجعها
+                self.failed_batches += 1
+                logger.exception("webhook batch of %d events failed", len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def recover(self) -> int:
+        """
+        الـ events اللي فضلت pending (worker وقع قبل ما يطبقها، أو الـ queue كانت مليانة) بترجع الـ queue.
+        لو worker تاني طبقها في نفس الوقت مفيش مشكلة: الـ update مشروط بالترتيب
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=WEBHOOK_RECOVER_AFTER)
+        room = self.queue.maxsize - self.queue.qsize()
+        if room <= 0:
+            return 0
+        docs = await self.events.find({"status": "pending", "received_at": {"$lt": cutoff}}) \
+            .sort("received_at", ASCENDING).limit(room).to_list(room)
+        for doc in docs:
+            self.queue.put_nowait(doc)
+        self.recovered += len(docs)
+        return len(docs)
+
+    async def run_recovery(self):
+        while True:
+            try:
+                if await self.recover():
+                    logger.warning("re-queued %d pending webhook events", self.recovered)
+            except Exception:
+                logger.exception("webhook recovery sweep failed")
+            await asyncio.sleep(WEBHOOK_RECOVER_INTERVAL)
+
+    # ===== lifecycle
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+        self._tasks = [asyncio.create_task(self.consume()), asyncio.create_task(self.run_recovery())]
+
+    async def stop(self, timeout: float = 5):
+        # اللي في الـ queue بيتطبق قبل الـ shutdown لو لحق، والباقي فاضل pending في Mongo
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("stopping with %d webhook events still queued", self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "insert_batches": self.insert_batches,
+            "overflowed": self.overflowed,
+            "recovered": self.recovered,
+            "batches": self.batches,
+            "applied": self.applied,
+            "superseded": self.superseded,
+            "ignored": self.ignored,
+            "failed_batches": self.failed_batches,
+        }
+
+
+pipeline = WebhookPipeline()
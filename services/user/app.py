@@ -1,41 +1,57 @@
 # services/user/app.py
-from fastapi import FastAPI, Header
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
-import os
-import jwt
-from datetime import datetime, timedelta
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
+import asyncio
 
-load_dotenv()
+import database
+import indexes
+import metrics
+import purge
+import redis_client
+from profiler import PROFILER_ENABLED, profiler
+from settings import settings
+from utils import audit, tombstones, user_cache
+from utils.audit import audit_log
+from utils.revocation import revocations
+from utils import hash as hash_utils
+from utils import jwt as jwt_utils
+from utils.jwt import decode_token
 
-JWT_SECRET = os.getenv("JWT_SECRET")
-if not JWT_SECRET:
-    raise RuntimeError("JWT_SECRET not set in .env")
+# توكن لـ /debug/* (لو مش موجود الـ endpoints دي بترجع 404)
+DEBUG_TOKEN = settings.debug_token
 
-JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # client واحد مشترك لكل الـ routers في الـ worker ده
+    await database.connect()
+    # مستقلين عن بعض: بالتوازي عشان الـ replica الجديدة تبقى ready بعد round trip واحد مش أربعة
+    await asyncio.gather(indexes.ensure_indexes(), purge.ensure_indexes(), audit.ensure_collection(), tombstones.load())
+    background = [
+        asyncio.create_task(user_cache.listen_for_invalidations()),
+        asyncio.create_task(tombstones.listen()),
+        asyncio.create_task(revocations.listen()),
+        asyncio.create_task(indexes.run_reset_token_cleanup()),
+        asyncio.create_task(metrics.monitor_event_loop_lag()),
+    ]
+    audit_log.start()
+    if PROFILER_ENABLED:
+        profiler.start()
+    yield
+    profiler.stop()
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    # الـ requests خلصت: آخر audit events تتكتب قبل ما Mongo يتقفل
+    await audit_log.stop()
+    hash_utils.shutdown()
+    await redis_client.close()
+    database.close()
 
-def create_token(data: dict, expires_hours: int = 2) -> str:
-    payload = data.copy()
-    payload["exp"] = datetime.utcnow() + timedelta(hours=expires_hours)
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+app = FastAPI(title="User Service", lifespan=lifespan)
 
-def decode_token(token: str) -> dict | None:
-    try:
-        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
-
-# ===== FastAPI app
-from routes import profile, password, delete_account
-
-app = FastAPI(title="User Service")
-
-origins = [
-    os.getenv("FRONTEND_URL", "http://localhost:3000"),
-    os.getenv("AUTH_URL", "http://localhost:4000")
-]
+origins = [settings.frontend_url, settings.auth_url]
 
 app.add_middleware(
     CORSMiddleware,
@@ -44,15 +60,58 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware, on_finished=profiler.on_request_finished)
+
+metrics.register_collector("mongo_pool", database.pool_stats.snapshot)
+metrics.register_collector("user_cache", user_cache.stats)
+metrics.register_collector("jwt_cache", jwt_utils.stats)
+metrics.register_collector("password_hashing", hash_utils.stats)
+metrics.register_collector("profiler", profiler.stats)
+metrics.register_collector("tombstones", tombstones.stats)
+metrics.register_collector("token_revocation", revocations.stats)
+metrics.register_collector("audit_log", audit_log.stats)
+
+
+def include_routers(app: FastAPI):
+    """
+    الـ routers بيتعملهم import هنا بعد ما الـ app والـ middleware جاهزين، مش في نص الموديول
+    """
+    from routes import admin, batch, delete_account, password, profile, tokens
+    from utils import auth as auth_utils
 
-app.include_router(profile.router, prefix="/user")
-app.include_router(password.router, prefix="/user")
-app.include_router(delete_account.router, prefix="/user")
+    for module in (profile, password, delete_account, batch, tokens, admin):
+        app.include_router(module.router, prefix="/user")
+    metrics.register_collector("batch_singleflight", batch.batch_lookups.stats)
+    metrics.register_collector("user_lookup_singleflight", auth_utils.user_lookups.stats)
+
+
+include_routers(app)
 
 @app.get("/")
 async def root():
     return {"message": "User service API is running!"}
 
+@app.get("/pool-stats")
+async def pool_stats():
+    return {"mongo": database.pool_stats.snapshot(), "user_cache": user_cache.stats(), "jwt_cache": jwt_utils.stats(), "password_hashing": hash_utils.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/debug/profiler")
+async def toggle_profiler(enabled: bool, x_debug_token: str = Header(None)):
+    """
+    تشغيل/إيقاف الـ sampling profiler وقت التشغيل
+    """
+    if not DEBUG_TOKEN or x_debug_token != DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if enabled:
+        profiler.start()
+    else:
+        profiler.stop()
+    return profiler.stats()
+
 @app.get("/test-token")
 async def test_token(authorization: str = Header(None)):
     if not authorization:
@@ -0,0 +1,32 @@
+# services/user/bench/gunicorn_bench.conf.py
+"""
+gunicorn.conf.py بتاع الإنتاج + seeding للـ benchmark (bench/serve.py): كل worker عنده Mongo في الذاكرة (mongomock)
+لوحده، فنفس المستخدمين (BENCH_USERS، ids ثابتة) بيتعملوا في كل worker بعد الـ boot وقبل أول request
+"""
+import asyncio
+import os
+import runpy
+
+_SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+globals().update({
+    name: value
+    for name, value in runpy.run_path(os.path.join(_SERVICE_DIR, "gunicorn.conf.py")).items()
+    if not name.startswith("_")
+})
+
+
+def post_worker_init(worker):
+    import database
+    from bson import ObjectId
+
+    count = int(os.environ.get("BENCH_USERS", "1000"))
+    docs = [
+        {"_id": ObjectId(f"{i + 1:024x}"), "name": f"Bench {i}", "email": f"bench{i}@bench.local", "role": "user"}
+        for i in range(count)
+    ]
+
+    async def seed():
+        await database.get_users_collection().insert_many(docs)
+
+    asyncio.run(seed())
@@ -0,0 +1,238 @@
+# services/user/bench/run.py
+"""
+Benchmark للـ user service بالكامل offline: app:app بيشتغل in-process على Mongo في الذاكرة (mongomock)
+
+    pip install -r requirements.txt -r bench/requirements.txt
+    python bench/run.py --concurrency 50 --requests 2000 --out bench/results/baseline.json
+    python bench/run.py --compare bench/results/baseline.json
+
+بيطلع p50/p95/p99 و throughput و event-loop lag لكل endpoint، والنتيجة JSON عشان الفرق بين run والتاني يبان في diff
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("MONGO_URI", "mongomock://bench")
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from bson import ObjectId  # noqa: E402
+
+import app as user_app  # noqa: E402
+import database  # noqa: E402
+from utils.hash import BCRYPT_ROUNDS, hash_password  # noqa: E402
+from utils.jwt import encode_token  # noqa: E402
+
+# profile-conditional بعد profile: بيبعت If-None-Match بالـ ETag اللي رجع في الـ run اللي قبله
+ENDPOINTS = ["profile", "profile-conditional", "update-profile", "change-password", "forgot-password"]
+
+# PASSWORD_REGEX في routes/password.py بيطابق "\d" كحرفين، فالباسورد لازم يحتويهم عشان يعدي
+BENCH_PASSWORD = "Bench-pass\\d1"
+
+
+def with_client_ips(app):
+    """
+    كل request بـ IP مختلف، زي ما الحمل الحقيقي بيجي من عملاء كتير (والـ rate limit بالـ IP)
+    """
+    counter = itertools.count()
+
+    async def wrapped(scope, receive, send):
+        if scope["type"] == "http":
+            n = next(counter)
+            scope = dict(scope, client=(f"10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}", 40000))
+        await app(scope, receive, send)
+
+    return wrapped
+
+
+def issue_token(user_id: str, email: str, issued_at: int) -> str:
+    return encode_token({"id": user_id, "email": email, "role": "user", "iat": issued_at, "exp": issued_at + 3600})
+
+
+async def seed_users(count: int) -> list[dict]:
+    # hash واحد لكل المستخدمين: الـ seeding مش جزء من القياس
+    password_hash = hash_password(BENCH_PASSWORD)
+    now = int(time.time())
+    users = []
+    docs = []
+    for i in range(count):
+        oid = ObjectId()
+        email = f"bench{i}@bench.local"
+        docs.append({"_id": oid, "name": f"Bench {i}", "email": email, "password": password_hash, "role": "user"})
+        users.append({"id": str(oid), "email": email, "token": issue_token(str(oid), email, now)})
+    await database.get_users_collection().insert_many(docs)
+    return users
+
+
+def build_request(endpoint: str, n: int, users: list[dict]) -> tuple:
+    user = users[n % len(users)]
+    headers = {"Authorization": f"Bearer {user['token']}"}
+    if endpoint == "profile":
+        return "GET", "/user/profile", {"headers": headers}
+    if endpoint == "profile-conditional":
+        return "GET", "/user/profile", {"headers": {**headers, "If-None-Match": user.get("etag", "")}}
+    if endpoint == "update-profile":
+        return "PUT", "/user/update-profile", {"headers": headers, "json": {"name": f"Bench {n}", "email": None}}
+    if endpoint == "change-password":
+        body = {"old_password": BENCH_PASSWORD, "new_password": BENCH_PASSWORD, "confirm_password": BENCH_PASSWORD}
+        return "POST", "/user/change-password", {"headers": headers, "json": body}
+    if endpoint == "forgot-password":
+        return "POST", "/user/forgot-password", {"params": {"email": user["email"]}}
+    raise ValueError(endpoint)
+
+
+async def monitor_loop_lag(samples: list, interval: float = 0.01):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - started - interval))
+
+
+def summarize(values: list[float]) -> dict:
+    if not values:
+        return {}
+    ms = [v * 1000 for v in values]
+    if len(ms) < 2:
+        return {"p50": ms[0], "p95": ms[0], "p99": ms[0], "max": ms[0], "mean": ms[0]}
+    q = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "p50": round(q[49], 3),
+        "p95": round(q[94], 3),
+        "p99": round(q[98], 3),
+        "max": round(max(ms), 3),
+        "mean": round(statistics.fmean(ms), 3),
+    }
+
+
+async def run_endpoint(client: httpx.AsyncClient, endpoint: str, users: list[dict], total: int, concurrency: int) -> dict:
+    counter = itertools.count()
+    latencies = []
+    statuses = {}
+
+    async def worker():
+        while True:
+            n = next(counter)
+            if n >= total:
+                return
+            method, url, kwargs = build_request(endpoint, n, users)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if endpoint == "profile" and "etag" in response.headers:
+                users[n % len(users)]["etag"] = response.headers["etag"]
+            if endpoint == "change-password" and response.status_code == 200:
+                # تغيير الباسورد بيلغي التوكنات القديمة (utils/revocation)، فالمستخدم بيعمل login تاني
+                user = users[n % len(users)]
+                user["token"] = issue_token(user["id"], user["email"], int(time.time()))
+
+    lag = []
+    lag_task = asyncio.create_task(monitor_loop_lag(lag))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    lag_task.cancel()
+
+    return {
+        "requests": total,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "latency_ms": summarize(latencies),
+        "loop_lag_ms": summarize(lag),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    app = user_app.app
+    results = {}
+    async with app.router.lifespan_context(app):
+        users = await seed_users(args.users)
+        transport = httpx.ASGITransport(app=with_client_ips(app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for endpoint in args.endpoints:
+                # warm-up: caches والـ pools والـ imports الكسولة خارج القياس
+                await run_endpoint(client, endpoint, users, min(args.warmup, args.requests), args.concurrency)
+                results[endpoint] = await run_endpoint(client, endpoint, users, args.requests, args.concurrency)
+                print(format_row(endpoint, results[endpoint]))
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "users": args.users,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+        },
+        "results": results,
+    }
+
+
+def format_row(endpoint: str, r: dict) -> str:
+    lat = r["latency_ms"]
+    return (
+        f"{endpoint:<18} {r['throughput_rps']:>9.1f} req/s  "
+        f"p50 {lat['p50']:>8.2f}  p95 {lat['p95']:>8.2f}  p99 {lat['p99']:>8.2f} ms  "
+        f"loop lag max {r['loop_lag_ms'].get('max', 0):>7.2f} ms  {r['statuses']}"
+    )
+
+
+def compare(previous: dict, current: dict):
+    print(f"\ncompared with {previous['meta'].get('git_commit')} ({previous['meta'].get('timestamp')})")
+    for endpoint, now in current["results"].items():
+        before = previous["results"].get(endpoint)
+        if not before:
+            continue
+        cells = []
+        for key in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"][key], now["latency_ms"][key]
+            cells.append(f"{key} {(new - old) / old * 100 if old else 0:+6.1f}%")
+        old, new = before["throughput_rps"], now["throughput_rps"]
+        cells.append(f"throughput {(new - old) / old * 100 if old else 0:+6.1f}%")
+        print(f"{endpoint:<18} " + "  ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--users", type=int, default=1000, help="seeded users (change-password is limited to 5/user/5min)")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "latest.json"))
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nresults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
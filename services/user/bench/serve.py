@@ -0,0 +1,306 @@
+# services/user/bench/serve.py
+"""
+Benchmark للـ serving mode (gunicorn.conf.py): throughput على GET /user/profile مع عدد workers مختلف
+
+    pip install -r requirements.txt -r bench/requirements.txt
+    python bench/serve.py --workers 1,2,4 --duration 10
+    python bench/serve.py --workers 4 --rolling          # rolling_restart.py في نص القياس: لازم 0 errors
+    python bench/serve.py --compare bench/results/serve.json
+
+لكل عدد workers بيشغّل gunicorn حقيقي (uvloop + httptools) على mongomock، والحمل من --clients processes
+بـ HTTP/1.1 keep-alive client خفيف (asyncio streams) عشان الـ load generator ميبقاش هو الـ bottleneck.
+الـ load generator بياخد cores هو كمان: على مكنة فيها cores قليلة الـ scaling اللي بيظهر أقل من الحقيقي
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_CONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn_bench.conf.py")
+sys.path.insert(0, SERVICE_DIR)
+os.environ.setdefault("MONGO_URI", "mongomock://bench")
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+from bson import ObjectId  # noqa: E402
+
+from rolling_restart import rolling_restart  # noqa: E402
+from utils.jwt import encode_token  # noqa: E402
+
+try:
+    import uvloop
+
+    run_loop = uvloop.run
+except ImportError:
+    run_loop = asyncio.run
+
+
+def build_requests(users: int) -> list[bytes]:
+    # نفس الـ ids اللي bench/gunicorn_bench.conf.py بيعملها في كل worker
+    now = int(time.time())
+    requests = []
+    for i in range(users):
+        token = encode_token({"id": str(ObjectId(f"{i + 1:024x}")), "role": "user", "iat": now, "exp": now + 3600})
+        requests.append(f"GET /user/profile HTTP/1.1\r\nHost: bench\r\nAuthorization: Bearer {token}\r\n\r\n".encode())
+    return requests
+
+
+async def read_response(reader: asyncio.StreamReader) -> tuple[int, bool]:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    length, close = 0, False
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection" and value.strip().lower() == "close":
+            close = True
+    await reader.readexactly(length)
+    return status, close
+
+
+async def generate_load(port: int, requests: list[bytes], connections: int, offset: int, duration: float) -> dict:
+    deadline = time.perf_counter() + duration
+    latencies = []
+    statuses = Counter()
+    errors = 0
+    reconnects = 0
+
+    async def connection(index: int):
+        nonlocal errors, reconnects
+        reader = writer = None
+        n = offset + index
+        while time.perf_counter() < deadline:
+            request = requests[n % len(requests)]
+            n += connections
+            started = time.perf_counter()
+            status = None
+            for attempt in (0, 1):
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                    writer.write(request)
+                    status, close = await read_response(reader)
+                    if close:
+                        writer.close()
+                        writer = None
+                    break
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    # worker بيعمل drain قفل الـ keep-alive connection: زي أي HTTP client، GET بيتعاد مرة على connection جديدة
+                    if writer is not None:
+                        writer.close()
+                    writer = None
+                    if attempt:
+                        errors += 1
+                    else:
+                        reconnects += 1
+            if status is not None:
+                latencies.append(time.perf_counter() - started)
+                statuses[status] += 1
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(connection(i) for i in range(connections)))
+    return {"latencies": latencies, "statuses": dict(statuses), "errors": errors, "reconnects": reconnects}
+
+
+def client_process(job: tuple) -> dict:
+    port, requests, connections, offset, duration = job
+    return run_loop(generate_load(port, requests, connections, offset, duration))
+
+
+def summarize(values: list[float]) -> dict:
+    ms = [v * 1000 for v in values]
+    if len(ms) < 2:
+        return {"p50": ms[0], "p95": ms[0], "p99": ms[0], "max": ms[0], "mean": ms[0]} if ms else {}
+    q = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "p50": round(q[49], 3),
+        "p95": round(q[94], 3),
+        "p99": round(q[98], 3),
+        "max": round(max(ms), 3),
+        "mean": round(statistics.fmean(ms), 3),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def count_in_log(path: str, text: str) -> int:
+    with open(path) as f:
+        return f.read().count(text)
+
+
+def start_server(workers: int, port: int, users: int, log_path: str) -> subprocess.Popen:
+    env = {**os.environ, "BENCH_USERS": str(users), "LOG_LEVEL": "info"}
+    log = open(log_path, "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", BENCH_CONF, "app:app", "--workers", str(workers), "--bind", f"127.0.0.1:{port}",
+         "--pid", os.path.join(os.path.dirname(log_path), "gunicorn.pid")],
+        cwd=SERVICE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + 60
+    # كل الـ workers خلصوا الـ lifespan (مش بس أول واحد) قبل ما القياس يبدأ
+    while count_in_log(log_path, "Application startup complete") < workers:
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            raise RuntimeError(f"gunicorn did not start, see {log_path}")
+        time.sleep(0.1)
+    with socket.create_connection(("127.0.0.1", port), timeout=5):
+        pass
+    return server
+
+
+def stop_server(server: subprocess.Popen) -> float:
+    started = time.perf_counter()
+    server.send_signal(signal.SIGTERM)
+    server.wait(timeout=60)
+    return time.perf_counter() - started
+
+
+def load_jobs(args, requests: list[bytes], duration: float) -> list[tuple]:
+    per_client = max(1, args.connections // args.clients)
+    return [(args.port, requests, per_client, i * per_client, duration) for i in range(args.clients)]
+
+
+def measure(pool, args, workers: int, requests: list[bytes], rolling: bool) -> dict:
+    log_path = os.path.join(args.log_dir, f"gunicorn-{workers}.log")
+    server = start_server(workers, args.port, args.users, log_path)
+    try:
+        pool.map(client_process, load_jobs(args, requests, args.warmup))
+        started = time.perf_counter()
+        pending = pool.map_async(client_process, load_jobs(args, requests, args.duration))
+        if rolling:
+            # الـ rolling restart والحمل شغال: workers جديدة بتطلع والقديمة بتعمل drain
+            time.sleep(args.duration / 3)
+            restart_at = time.perf_counter() - started
+            restart = {}
+            restarter = threading.Thread(target=lambda: restart.update(ok=rolling_restart(server.pid, 60, 60)))
+            restarter.start()
+        results = pending.get()
+        elapsed = time.perf_counter() - started
+        if rolling:
+            restarter.join()
+        booted = count_in_log(log_path, "Booting worker")
+    finally:
+        drain = stop_server(server)
+
+    latencies = [v for r in results for v in r["latencies"]]
+    statuses = Counter()
+    for r in results:
+        statuses.update({str(k): v for k, v in r["statuses"].items()})
+    result = {
+        "workers": workers,
+        "requests": len(latencies),
+        "statuses": dict(sorted(statuses.items())),
+        "errors": sum(r["errors"] for r in results),
+        "reconnects": sum(r["reconnects"] for r in results),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": summarize(latencies),
+        "shutdown_s": round(drain, 3),
+    }
+    if rolling:
+        result["rolling_restart"] = {"started_at_s": round(restart_at, 3), "completed": restart.get("ok", False), "workers_booted": booted}
+    return result
+
+
+def run(args) -> dict:
+    os.makedirs(args.log_dir, exist_ok=True)
+    requests = build_requests(args.users)
+    counts = [int(w) for w in args.workers.split(",")]
+    results = {}
+    with multiprocessing.Pool(args.clients) as pool:
+        for workers in counts:
+            rolling = args.rolling and workers == counts[-1]
+            result = results[f"workers_{workers}"] = measure(pool, args, workers, requests, rolling)
+            # speedup مقارنة بأول عدد workers، و efficiency = speedup / نسبة الـ workers
+            first = results[f"workers_{counts[0]}"]
+            speedup = result["throughput_rps"] / first["throughput_rps"] if first["throughput_rps"] else 0
+            result["speedup"] = round(speedup, 2)
+            result["efficiency"] = round(speedup / (workers / counts[0]), 2)
+            lat = result["latency_ms"]
+            line = (f"{workers:3d} workers  {result['throughput_rps']:9.1f} req/s  x{speedup:.2f}  "
+                    f"p50 {lat['p50']:7.2f}  p99 {lat['p99']:7.2f} ms  errors {result['errors']}  {result['statuses']}")
+            if rolling:
+                line += f"  (restart at {result['rolling_restart']['started_at_s']}s, {result['reconnects']} reconnects)"
+            print(line)
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "clients": args.clients,
+            "connections": args.connections,
+            "duration_s": args.duration,
+        },
+        "results": results,
+    }
+
+
+def compare(previous: dict, current: dict):
+    print(f"\ncompared with {previous['meta'].get('git_commit')} ({previous['meta'].get('timestamp')})")
+    for name, now in current["results"].items():
+        before = previous["results"].get(name)
+        if not before:
+            continue
+        cells = []
+        for key in ("p50", "p99"):
+            old, new = before["latency_ms"][key], now["latency_ms"][key]
+            cells.append(f"{key} {(new - old) / old * 100 if old else 0:+6.1f}%")
+        old, new = before["throughput_rps"], now["throughput_rps"]
+        cells.append(f"throughput {(new - old) / old * 100 if old else 0:+6.1f}%")
+        print(f"{name:12s} " + "  ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1, help="load generator processes")
+    parser.add_argument("--connections", type=int, default=64, help="keep-alive connections in total")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--rolling", action="store_true", help="rolling restart (rolling_restart.py) during the last run")
+    parser.add_argument("--log-dir", default="/tmp/user-service-bench")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "serve.json"))
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nresults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    if args.rolling and any(r["errors"] or not r.get("rolling_restart", {"completed": True})["completed"]
+                            for r in report["results"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# services/user/bench/startup.py
+"""
+Benchmark لوقت الـ startup: قد إيه replica جديدة بتاخد من أول ما الـ process تبدأ لحد ما تبقى ready
+
+    python bench/startup.py
+    python bench/startup.py --runs 10 --compare bench/results/startup.json
+
+كل run في process جديدة (cold start زي --reload أو worker جديد):
+  - `python -X importtime -c "import app"` بيتحلل لتقرير: وقت الـ import، وقت موديولات الخدمة نفسها، وأتقل الـ packages
+  - وقت الـ ready: من spawn الـ process لحد ما الـ lifespan يخلص (Mongo في الذاكرة، mongomock)
+وبعدها بيتقارن بـ bench/startup_budget.json: أي رقم عدّى الـ budget، أو موديول المفروض يبقى lazy اتعمله import وقت
+الـ startup، الـ script بيخرج بـ exit 1 (ينفع يتحط في CI)
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_budget.json")
+
+ENV = {
+    **os.environ,
+    "MONGO_URI": os.environ.get("MONGO_URI", "mongomock://startup"),
+    "JWT_SECRET": os.environ.get("JWT_SECRET", "bench-secret"),
+}
+
+# lifespan كامل وبعدين خروج: الـ parent بيقيس لحد سطر "ready"
+READY_SCRIPT = """
+import asyncio, sys
+import app
+
+async def main():
+    async with app.app.router.lifespan_context(app.app):
+        sys.stdout.write("ready\\n")
+        sys.stdout.flush()
+
+asyncio.run(main())
+"""
+
+
+def own_modules() -> set[str]:
+    names = set()
+    for entry in os.listdir(SERVICE_DIR):
+        path = os.path.join(SERVICE_DIR, entry)
+        if entry.endswith(".py"):
+            names.add(entry[:-3])
+        elif os.path.isdir(path) and entry not in ("bench", "__pycache__") and any(f.endswith(".py") for f in os.listdir(path)):
+            names.add(entry)
+    return names
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, float, float]]:
+    """
+    "import time: self [us] | cumulative | imported package" -> [(name, level, self_ms, cumulative_ms)]
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        raw = parts[2].rstrip()
+        name = raw.strip()
+        level = (len(raw) - len(raw.lstrip()) - 1) // 2
+        rows.append((name, level, int(parts[0]) / 1000, int(parts[1]) / 1000))
+    return rows
+
+
+def profile_imports() -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=SERVICE_DIR, env=ENV, capture_output=True, text=True, check=True,
+    )
+    rows = parse_importtime(completed.stderr)
+    own = own_modules()
+    app_ms = next(cumulative for name, level, _, cumulative in rows if name == "app" and level == 0)
+    packages = defaultdict(float)
+    modules = {}
+    own_ms = 0.0
+    for name, _, self_ms, cumulative in rows:
+        top = name.split(".")[0]
+        packages[top] += self_ms
+        modules[name] = (self_ms, cumulative)
+        if top in own:
+            own_ms += self_ms
+    return {"import_ms": app_ms, "own_import_ms": own_ms, "packages": dict(packages), "modules": modules}
+
+
+def time_ready() -> float:
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", READY_SCRIPT], cwd=SERVICE_DIR, env=ENV, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    elapsed = time.perf_counter() - started
+    proc.wait()
+    if line.strip() != "ready" or proc.returncode != 0:
+        raise RuntimeError(f"startup failed (exit {proc.returncode})")
+    return elapsed * 1000
+
+
+def time_interpreter() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], env=ENV, check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    profiles = [profile_imports() for _ in range(args.runs)]
+    ready = [time_ready() for _ in range(args.runs)]
+    interpreter = [time_interpreter() for _ in range(args.runs)]
+
+    def median(values):
+        return round(statistics.median(values), 1)
+
+    packages = defaultdict(list)
+    for profile in profiles:
+        for name, ms in profile["packages"].items():
+            packages[name].append(ms)
+    modules = defaultdict(list)
+    for profile in profiles:
+        for name, (self_ms, _) in profile["modules"].items():
+            modules[name].append(self_ms)
+    # موديول اتعمله import في run واحد بس (نادر) بيتحسب بالـ median بتاع اللي ظهر فيه
+    top_packages = sorted(((name, median(ms)) for name, ms in packages.items()), key=lambda item: -item[1])[:args.top]
+    top_modules = sorted(((name, median(ms)) for name, ms in modules.items()), key=lambda item: -item[1])[:args.top]
+    imported = set().union(*(profile["modules"] for profile in profiles))
+
+    result = {
+        "interpreter_ms": median(interpreter),
+        "import_ms": median([p["import_ms"] for p in profiles]),
+        "own_import_ms": median([p["own_import_ms"] for p in profiles]),
+        "ready_ms": median(ready),
+        "ready_ms_max": round(max(ready), 1),
+        "modules_imported": len(imported),
+        "top_packages_self_ms": dict(top_packages),
+        "top_modules_self_ms": dict(top_modules),
+    }
+    print(f"interpreter {result['interpreter_ms']:.0f} ms   import app {result['import_ms']:.0f} ms "
+          f"(service modules {result['own_import_ms']:.1f} ms)   ready {result['ready_ms']:.0f} ms (max {result['ready_ms_max']:.0f})")
+    print(f"{len(imported)} modules imported; heaviest packages (self time):")
+    for name, ms in top_packages:
+        print(f"  {name:28s} {ms:8.1f} ms")
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "runs": args.runs,
+        },
+        "results": {"startup": result},
+        "imported": sorted(imported),
+    }
+
+
+def check_budget(report: dict, budget: dict) -> list[str]:
+    result = report["results"]["startup"]
+    violations = []
+    for key in ("import_ms", "own_import_ms", "ready_ms"):
+        if key in budget and result[key] > budget[key]:
+            violations.append(f"{key} {result[key]:.1f} > budget {budget[key]}")
+    imported = set(report["imported"])
+    for name in budget.get("deferred_modules", []):
+        if name in imported:
+            violations.append(f"{name} is imported at startup (should be lazy)")
+    return violations
+
+
+def compare(previous: dict, current: dict):
+    print(f"\ncompared with {previous['meta'].get('git_commit')} ({previous['meta'].get('timestamp')})")
+    before, now = previous["results"]["startup"], current["results"]["startup"]
+    cells = []
+    for key in ("import_ms", "own_import_ms", "ready_ms"):
+        old, new = before[key], now[key]
+        cells.append(f"{key} {(new - old) / old * 100 if old else 0:+6.1f}%")
+    print("startup  " + "  ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--budget", default=BUDGET_PATH, help="budget JSON (empty string to skip the check)")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "startup.json"))
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nresults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+    if args.budget:
+        with open(args.budget) as f:
+            violations = check_budget(report, json.load(f))
+        if violations:
+            print("\nstartup budget exceeded:")
+            for violation in violations:
+                print(f"  {violation}")
+            sys.exit(1)
+        print("\nstartup budget ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,151 @@
-from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
-import os
+from pymongo import monitoring
+import threading
+import time
 
-load_dotenv()  # تحميل المتغيرات من .env
+from metrics import MONGO_CHECKOUT_WAIT
+from settings import settings
 
-MONGO_URI = os.getenv("MONGO_URI")
-client = AsyncIOMotorClient(MONGO_URI)
-db = client.get_database("amazon_clone")
-users_collection = db.get_collection("users")
+MONGO_URI = settings.mongo_uri
+MONGO_DB = settings.mongo_db
 
+# ===== Pool sizing (per worker process)
+MONGO_MAX_POOL_SIZE = settings.mongo_max_pool_size
+MONGO_MIN_POOL_SIZE = settings.mongo_min_pool_size
+MONGO_MAX_IDLE_TIME_MS = settings.mongo_max_idle_time_ms
 
 
-"""
+class PoolStats(monitoring.ConnectionPoolListener):
+    """
+    عدادات الـ connection pool (بتتحدث من threads بتاعة pymongo)
+    """
 
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+    def __init__(self):
+        self._lock = threading.Lock()
+        # pymongo بيعمل الـ checkout كله في نفس الـ thread، فالبداية بتتسجل هنا
+        self._checkout_started = threading.local()
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
 
-MONGO_URI = os.getenv("MONGO_URI")  # هتحط URI بتاع MongoDB Atlas هنا
-client = AsyncIOMotorClient(MONGO_URI)
-db = client.get_database("amazon_clone")  # اسم قاعدة البيانات
-users_collection = db.get_collection("users")
+    def _inc(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
 
+    def pool_created(self, event):
+        pass
 
-"""
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._inc(pool_clears=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._inc(created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._inc(closed=1)
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.value = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._inc(checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._inc(checked_out=1, checkouts=1)
+        started = getattr(self._checkout_started, "value", None)
+        if started is not None:
+            self._checkout_started.value = None
+            # الـ histogram مش thread-safe والـ events جاية من threads بتاعة Motor
+            with self._lock:
+                MONGO_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+    def connection_checked_in(self, event):
+        self._inc(checked_out=-1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "max_pool_size": MONGO_MAX_POOL_SIZE,
+                "min_pool_size": MONGO_MIN_POOL_SIZE,
+                "max_idle_time_ms": MONGO_MAX_IDLE_TIME_MS,
+                "open_connections": self.created - self.closed,
+                "in_use": self.checked_out,
+                "created": self.created,
+                "closed": self.closed,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+            }
+
+
+pool_stats = PoolStats()
+
+# ===== client واحد لكل worker، بيتعمل أول ما حد يحتاجه
+_client = None
+_collections = {}
+
+
+def get_client():
+    global _client
+    if _client is None and MONGO_URI and MONGO_URI.startswith("mongomock://"):
+        # Mongo في الذاكرة للـ benchmarks (bench/requirements.txt)
+        from mongomock_motor import AsyncMongoMockClient
+
+        _client = AsyncMongoMockClient()
+    if _client is None:
+        # motor بيتعمله import هنا مش فوق: scripts زي bench/startup.py وأي worker مش محتاج Mongo مبيدفعوش تمنه
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        _client = AsyncIOMotorClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            event_listeners=[pool_stats],
+        )
+    return _client
+
+
+def get_db():
+    return get_client()[MONGO_DB]
+
+
+def get_collection(name: str):
+    """
+    collection registry: كل الـ routers بتاخد الـ collections من هنا
+    """
+    collection = _collections.get(name)
+    if collection is None:
+        collection = _collections[name] = get_db()[name]
+    return collection
+
+
+def get_users_collection():
+    return get_collection("users")
+
+
+async def connect():
+    """
+    warm-up وقت الـ startup: ping عشان الـ pool يفتح الاتصالات قبل أول request
+    """
+    await get_client().admin.command("ping")
+
+
+def close():
+    global _client
+    if _client is not None:
+        _client.close()
+    _client = None
+    _collections.clear()
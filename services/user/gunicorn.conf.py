@@ -0,0 +1,63 @@
+# services/user/gunicorn.conf.py
+"""
+Production serving للـ user service: N worker processes مستقلين تماماً (shared-nothing) ورا socket واحد
+
+    gunicorn app:app                 # gunicorn بيقرا الملف ده لوحده من الـ working directory
+    kill -TERM <master>              # graceful drain: مفيش connections جديدة، والـ requests اللي شغالة بتخلص
+    python rolling_restart.py        # rolling restart: workers جديدة بالكود والـ .env الجديد (TTIN)، والقديمة بتعمل
+                                     # drain (TTOU) بعد ما كل الجديدة تبقى جاهزة
+    kill -HUP <master>               # نفس الكلام + إعادة تحميل الملف ده، بس gunicorn بيقفل القديمة قبل ما الجديدة تجهز
+
+كل worker بيعمل import للـ app لوحده بعد الـ fork (مفيش preload_app) وبيعمل الـ Mongo/Redis clients والـ caches
+في الـ lifespan بتاعه، فمفيش socket أو thread بيتورث من الـ master. ده كمان اللي بيخلي HUP يحمّل كود جديد من غير downtime.
+الـ pools والـ caches لكل worker: MONGO_MAX_POOL_SIZE و PASSWORD_HASH_WORKERS و USER_CACHE_SIZE بيتضربوا في عدد الـ workers
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+
+from settings import Settings
+from workers import ready_path
+
+# parse جديد مع كل تحميل للملف ده (أول مرة ومع كل HUP) عشان الـ .env الجديد ياخد مفعوله
+_settings = Settings()
+
+bind = f"{_settings.host}:{_settings.port}"
+workers = _settings.web_concurrency or multiprocessing.cpu_count()
+worker_class = "workers.UserServiceWorker"
+preload_app = False
+
+graceful_timeout = _settings.graceful_timeout
+timeout = _settings.worker_timeout
+keepalive = _settings.keepalive
+max_requests = _settings.max_requests
+max_requests_jitter = _settings.max_requests_jitter
+forwarded_allow_ips = _settings.forwarded_allow_ips
+# rolling_restart.py بيقرا الـ master pid من هنا
+pidfile = _settings.pidfile
+
+loglevel = _settings.log_level.lower()
+errorlog = "-"
+accesslog = None
+
+
+def on_starting(server):
+    server.log.info(
+        "user service: %d workers on %s (per worker: mongo pool %d, bcrypt threads %d, user cache %d)",
+        workers, bind, _settings.mongo_max_pool_size, _settings.password_hash_workers, _settings.user_cache_size,
+    )
+
+
+def post_fork(server, worker):
+    # الـ master عمل import لـ settings عشان الملف ده: الـ worker يعمل parse من الأول بدل ما يورث نسخة
+    # ممكن تكون قديمة (قبل آخر HUP)
+    sys.modules.pop("settings", None)
+
+
+def worker_exit(server, worker):
+    server.log.info("worker %s exited", worker.pid)
+
+
+def on_exit(server):
+    shutil.rmtree(os.path.dirname(ready_path(server.pid, 0)), ignore_errors=True)
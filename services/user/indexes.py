@@ -0,0 +1,155 @@
+# services/user/indexes.py
+"""
+إدارة الـ indexes بتاعة الـ users collection
+
+    python indexes.py           # إنشاء الـ indexes
+    python indexes.py --check   # + explain() لكل query في الـ routes والـ workers، exit 1 لو فيه COLLSCAN
+
+الـ check نفسه بيشتغل في tests/test_query_plans.py على Mongo حقيقي (MONGO_URI)
+"""
+import asyncio
+import logging
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+import database
+import purge
+from settings import settings
+from utils import audit, tombstones
+
+logger = logging.getLogger(__name__)
+
+RESET_TOKEN_CLEANUP_INTERVAL = settings.reset_token_cleanup_interval
+
+# الـ reset token بيتشال بـ $unset بعد الاستخدام، فالـ partial index فيه بس المستخدمين اللي عندهم طلب مفتوح
+_PENDING_RESET = {"reset_password_token": {"$exists": True}}
+
+USERS_INDEXES = [
+    # نفس الاسم والمواصفات اللي mongoose بيعملها في auth service
+    IndexModel([("email", ASCENDING)], unique=True),
+    IndexModel(
+        [("reset_password_token", ASCENDING), ("reset_password_expires", ASCENDING)],
+        partialFilterExpression=_PENDING_RESET,
+    ),
+    IndexModel([("reset_password_expires", ASCENDING)], partialFilterExpression=_PENDING_RESET),
+    # /admin/users بـ role: equality + ترتيب الـ _id من نفس الـ index (من غير sort في الذاكرة)
+    IndexModel([("role", ASCENDING), ("_id", ASCENDING)]),
+]
+
+
+def expired_reset_tokens_query(now: datetime) -> dict:
+    return {**_PENDING_RESET, "reset_password_expires": {"$lte": now}}
+
+
+def route_queries() -> dict:
+    """
+    الـ queries اللي الـ routes والـ workers بتعملها فعلاً (بقيم تجريبية) عشان نعمل لها explain:
+    {route: (collection, query, sort)}
+    """
+    now = datetime.utcnow()
+    user_id = ObjectId()
+    queries = {
+        "get_current_user": ("users", {"_id": user_id}, None),
+        "forgot_password": ("users", {"email": "index-check@example.com"}, None),
+        "reset_password": ("users", {"reset_password_token": "0" * 64, "reset_password_expires": {"$gt": now}}, None),
+        "cleanup_expired_reset_tokens": ("users", expired_reset_tokens_query(now), None),
+        "admin_list_users": ("users", {"role": "admin", "_id": {"$gt": ObjectId()}}, [("_id", ASCENDING)]),
+        "admin_audit_by_user": (audit.AUDIT_COLLECTION, {"user_id": user_id}, [("at", DESCENDING), ("_id", DESCENDING)]),
+        "admin_audit_by_event": (audit.AUDIT_COLLECTION, {"event": "password.changed"}, [("at", DESCENDING), ("_id", DESCENDING)]),
+        "purge_claim_batch": (purge.JOBS_COLLECTION, purge.claimable_query(now), [("created_at", ASCENDING)]),
+        "purge_claimed_jobs": (purge.JOBS_COLLECTION, {"claim_id": "0" * 32, "status": "running"}, None),
+        "tombstones_pull": (tombstones.TOMBSTONES_COLLECTION, {"deleted_at": {"$gte": now}}, None),
+    }
+    for name, field in purge.PURGE_TARGETS:
+        queries[f"purge_{name}"] = (name, {field: {"$in": [user_id, str(user_id)]}}, None)
+    return queries
+
+
+async def ensure_indexes():
+    users = database.get_users_collection()
+    for index in USERS_INDEXES:
+        try:
+            await users.create_indexes([index])
+        except OperationFailure as e:
+            # مثلاً emails متكررة موجودة قبل كده: الخدمة تشتغل عادي والمشكلة تبان في الـ log
+            logger.error("could not create index %s on users: %s", index.document["name"], e)
+
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+
+async def ensure_all_indexes():
+    """
+    كل الـ indexes اللي الـ queries في route_queries() محتاجاها (users + audit + purge jobs والـ targets + tombstones)
+    """
+    await ensure_indexes()
+    await audit.ensure_collection()
+    await purge.PurgeWorker().ensure_indexes()
+
+
+async def check_query_plans() -> dict:
+    """
+    بترجع {route: [stages]} للـ queries اللي الـ winning plan بتاعها فيه COLLSCAN
+    """
+    failures = {}
+    for route, (collection, query, sort) in route_queries().items():
+        cursor = database.get_collection(collection).find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = list(_stages(explain["queryPlanner"]["winningPlan"]))
+        if "COLLSCAN" in stages:
+            failures[route] = stages
+    return failures
+
+
+async def cleanup_expired_reset_tokens() -> int:
+    """
+    بديل الـ TTL index: الـ TTL كان هيمسح الـ user نفسه، هنا بنشيل الـ token بس
+    """
+    query = expired_reset_tokens_query(datetime.utcnow())
+    result = await database.get_users_collection().update_many(
+        query, {"$unset": {"reset_password_token": "", "reset_password_expires": ""}}
+    )
+    return result.modified_count
+
+
+async def run_reset_token_cleanup():
+    while True:
+        await asyncio.sleep(RESET_TOKEN_CLEANUP_INTERVAL)
+        try:
+            removed = await cleanup_expired_reset_tokens()
+            if removed:
+                logger.info("removed %d expired reset tokens", removed)
+        except Exception as e:
+            logger.warning("reset token cleanup failed: %s", e)
+
+
+async def main(check: bool) -> int:
+    if check:
+        await ensure_all_indexes()
+    else:
+        await ensure_indexes()
+    failures = await check_query_plans() if check else {}
+    database.close()
+    for route, stages in failures.items():
+        print(f"COLLSCAN in {route}: {' -> '.join(stages)}")
+    if check and not failures:
+        print(f"all {len(route_queries())} route queries use an index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main("--check" in sys.argv[1:])))
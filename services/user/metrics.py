@@ -0,0 +1,166 @@
+# services/user/metrics.py
+"""
+metrics بصيغة Prometheus من غير dependencies: counters و histograms بسيطة، كل observe = bisect + زيادة رقم
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_registry = []
+_collectors = []
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, count in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {count}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            # [count لكل bucket (+Inf في الآخر), sum]
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        bucket_labels = self.labels + ("le",)
+        for values, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, values + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+def register_collector(prefix: str, fn):
+    """
+    fn بترجع dict أرقام (زي stats() بتاعة الـ caches والـ pools) وبتتعرض كـ gauges وقت الـ scrape
+    """
+    _collectors.append((prefix, fn))
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for prefix, fn in _collectors:
+        for key, value in fn().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ===== metrics الخدمة
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and status", ("method", "route", "status")
+)
+STAGE_DURATION = Histogram(
+    "user_stage_duration_seconds", "Time spent in internal request stages", ("stage",)
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay between scheduled and actual event loop wake-ups",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+CONDITIONAL_RESPONSES = Counter(
+    "http_conditional_responses_total", "GET responses by ETag result (not_modified = 304 cache hit)", ("route", "result")
+)
+MONGO_CHECKOUT_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time waiting for a Motor pool connection",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+
+
+def stage(name: str):
+    """
+    with metrics.stage("jwt_decode"): ...
+    """
+    return STAGE_DURATION.time(name)
+
+
+async def monitor_event_loop_lag(interval: float = 0.25):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware خفيفة (من غير BaseHTTPMiddleware) بتسجل زمن كل request بالـ route template
+    """
+
+    def __init__(self, app, on_finished=None):
+        self.app = app
+        self.on_finished = on_finished
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            ended = time.perf_counter()
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUEST_DURATION.observe(ended - started, scope["method"], path, str(status))
+            if self.on_finished is not None:
+                self.on_finished(path, started, ended)
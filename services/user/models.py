@@ -10,3 +10,47 @@ class User(BaseModel):
     role: str = "user"
     last_password_change: Optional[datetime] = None
     password_change_count: Optional[int] = 0
+
+
+# ===== الحقول اللي الـ profile محتاجها بس (من غير password أو reset tokens)
+PROFILE_PROJECTION = {
+    "name": 1,
+    "email": 1,
+    "role": 1,
+    "last_password_change": 1,
+    "password_change_count": 1,
+    # بيزيد مع كل كتابة من الـ routes هنا (الـ auth service مبيزودوش)
+    "version": 1,
+}
+
+
+class ProfileOut(BaseModel):
+    id: str
+    name: str
+    email: str
+    role: str = "user"
+    last_password_change: Optional[datetime] = None
+    password_change_count: int = 0
+
+
+class ProfileResponse(BaseModel):
+    user: ProfileOut
+
+
+class UpdateProfileResponse(BaseModel):
+    message: str
+    user: ProfileOut
+
+
+def profile_from_doc(doc: dict) -> dict:
+    """
+    تحويل مباشر من Mongo document لـ dict جاهز لـ orjson (من غير validation تاني)
+    """
+    return {
+        "id": str(doc["_id"]),
+        "name": doc.get("name"),
+        "email": doc.get("email"),
+        "role": doc.get("role") or "user",
+        "last_password_change": doc.get("last_password_change"),
+        "password_change_count": doc.get("password_change_count") or 0,
+    }
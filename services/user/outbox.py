@@ -0,0 +1,23 @@
+# services/user/outbox.py
+from datetime import datetime
+
+from database import get_collection
+
+# بيتقري من services/notifications (notify.py)
+OUTBOX_COLLECTION = "notifications_outbox"
+
+
+async def enqueue(kind: str, to: str, data: dict):
+    """
+    تسجيل إيميل في الـ outbox والرجوع فوراً: الإرسال نفسه بيحصل في الـ notifications worker
+    """
+    now = datetime.utcnow()
+    await get_collection(OUTBOX_COLLECTION).insert_one({
+        "type": kind,
+        "to": to,
+        "data": data,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    })
@@ -0,0 +1,106 @@
+# services/user/profiler.py
+"""
+sampling profiler للـ event loop: thread بياخد stack الـ loop كل شوية،
+ولما request تعدي SLOW_REQUEST_MS الـ samples بتاعة فترتها بتتكتب بصيغة folded (flamegraph.pl / speedscope)
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILER_ENABLED = settings.profiler_enabled
+PROFILER_INTERVAL_MS = settings.profiler_interval_ms
+SLOW_REQUEST_MS = settings.slow_request_ms
+PROFILE_DIR = settings.profile_dir
+# أقصى عدد samples في الذاكرة (بالـ interval الافتراضي ≈ 50 ثانية)
+PROFILER_BUFFER = settings.profiler_buffer
+
+
+def _fold(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._samples = deque(maxlen=PROFILER_BUFFER)
+        self._thread = None
+        self._stop = threading.Event()
+        self._target_thread_id = None
+        # الـ dumps بيكتبها الـ sampler thread: on_request_finished بيتنادى من الـ event loop ومينفعش يعمل file I/O
+        self._pending = deque()
+        self.dumps = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        لازم تتنادى من thread الـ event loop (هو اللي بيتعمله sampling)
+        """
+        if self.running:
+            return
+        self._target_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._thread = None
+        self._samples.clear()
+        self._pending.clear()
+
+    def _run(self):
+        interval = PROFILER_INTERVAL_MS / 1000
+        while not self._stop.wait(interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is not None:
+                self._samples.append((time.perf_counter(), _fold(frame)))
+            self._write_pending()
+        self._write_pending()
+
+    def _write_pending(self):
+        while self._pending:
+            route, started, ended, stacks = self._pending.popleft()
+            try:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                name = route.strip("/").replace("/", "_") or "root"
+                path = os.path.join(
+                    PROFILE_DIR, f"{int(time.time() * 1000)}-{name}-{int((ended - started) * 1000)}ms.folded",
+                )
+                with open(path, "w") as f:
+                    for stack, count in stacks.most_common():
+                        f.write(f"{stack} {count}\n")
+            except OSError:
+                logger.exception("failed to write profile for %s", route)
+                continue
+            self.dumps += 1
+            logger.info("slow request %s (%.0f ms): profile written to %s", route, (ended - started) * 1000, path)
+
+    def on_request_finished(self, route: str, started: float, ended: float):
+        if not self.running or (ended - started) * 1000 < SLOW_REQUEST_MS:
+            return
+        # الـ samples دي للـ loop كله في الفترة دي (ممكن فيها requests تانية شغالة في نفس الوقت)
+        stacks = Counter(stack for t, stack in list(self._samples) if started <= t <= ended)
+        if stacks:
+            self._pending.append((route, started, ended, stacks))
+
+    def stats(self) -> dict:
+        return {"running": int(self.running), "samples": len(self._samples), "dumps": self.dumps}
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,209 @@
+# services/user/purge.py
+"""
+GDPR purge: حذف الحساب وكل بياناته في الخدمات التانية (carts, orders, payments, sessions)
+
+    python purge.py
+
+الـ endpoint بيكتب tombstone (الحساب بيقف فوراً) و job في account_purge_jobs ويرجع علطول.
+الـ worker بياخد الـ jobs على دفعات، ولكل collection بيعمل delete_many واحد لكل الـ users اللي في الدفعة
+(على chunks بالـ _id عشان مفيش delete واحد ضخم يمسك الـ primary)، والـ collections بتتمسح بالتوازي لحد PURGE_CONCURRENCY.
+بعد كل collection الـ progress بيتسجل لكل job بـ bulk_write: لو الـ worker وقع، الـ job بيرجع بعد PURGE_CLAIM_LEASE
+ويكمل من أول collection لسه ما خلصتش
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import OperationFailure
+
+import database
+from settings import settings, split_list
+from utils import tombstones
+from utils.revocation import revocations
+
+logger = logging.getLogger("purge")
+
+JOBS_COLLECTION = "account_purge_jobs"
+
+# collection:field لكل حتة فيها بيانات المستخدم (الـ field ممكن يكون ObjectId أو string حسب الخدمة)
+PURGE_TARGETS = [tuple(item.split(":", 1)) for item in split_list(settings.purge_targets)]
+PURGE_BATCH_SIZE = settings.purge_batch_size
+PURGE_CONCURRENCY = settings.purge_concurrency
+PURGE_DELETE_CHUNK = settings.purge_delete_chunk
+PURGE_POLL_INTERVAL = settings.purge_poll_interval
+# job فضل running أكتر من كده معناه إن الـ worker وقع: يرجع يتاخد تاني
+PURGE_CLAIM_LEASE = settings.purge_claim_lease
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+JOBS_INDEXES = [
+    IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+    IndexModel([("claim_id", ASCENDING)], sparse=True),
+]
+
+
+def _jobs():
+    return database.get_collection(JOBS_COLLECTION)
+
+
+async def ensure_indexes():
+    await _jobs().create_indexes(JOBS_INDEXES)
+    await database.get_collection(tombstones.TOMBSTONES_COLLECTION).create_indexes(tombstones.TOMBSTONE_INDEXES)
+
+
+async def enqueue(user_ids: list[ObjectId], requested_by: str) -> int:
+    """
+    الحساب بيتقفل فوراً (tombstone) والـ purge نفسه بيحصل في الـ worker. الـ _id بتاع الـ job هو الـ user id،
+    فطلب الحذف المتكرر لنفس المستخدم مبيعملش job تاني
+    """
+    if not user_ids:
+        return 0
+    await tombstones.mark_deleted(user_ids, requested_by)
+    # الـ tombstone بيقفل الـ user service بس؛ الـ watermark بيوصل لأي حد بيتحقق من التوكنات بـ utils/revocation
+    await revocations.revoke_users(user_ids)
+    now = datetime.utcnow()
+    result = await _jobs().bulk_write([
+        UpdateOne({"_id": oid}, {"$setOnInsert": {
+            "status": "pending", "requested_by": requested_by, "progress": {}, "created_at": now,
+        }}, upsert=True)
+        for oid in user_ids
+    ], ordered=False)
+    return result.upserted_count
+
+
+async def job_status(user_id: ObjectId) -> dict | None:
+    return await _jobs().find_one({"_id": user_id}, {"claim_id": 0, "claimed_by": 0})
+
+
+def claimable_query(now: datetime) -> dict:
+    return {"$or": [
+        {"status": "pending"},
+        {"status": "running", "claimed_at": {"$lte": now - timedelta(seconds=PURGE_CLAIM_LEASE)}},
+    ]}
+
+
+class PurgeWorker:
+    def __init__(self):
+        self._semaphore = asyncio.Semaphore(PURGE_CONCURRENCY)
+        self._stopping = asyncio.Event()
+        self.jobs_done = 0
+        self.deleted = {name: 0 for name, _ in PURGE_TARGETS}
+        self.deleted["users"] = 0
+
+    async def ensure_indexes(self):
+        await ensure_indexes()
+        # من غير index على الـ field، كل chunk في الـ purge هيبقى COLLSCAN على الـ collection كلها
+        for name, field in PURGE_TARGETS:
+            try:
+                await database.get_collection(name).create_index([(field, ASCENDING)])
+            except OperationFailure as e:
+                logger.error("could not create index on %s.%s: %s", name, field, e)
+
+    async def claim_batch(self) -> list[dict]:
+        now = datetime.utcnow()
+        candidates = await _jobs().find(claimable_query(now), {"_id": 1}) \
+            .sort("created_at", ASCENDING).limit(PURGE_BATCH_SIZE).to_list(PURGE_BATCH_SIZE)
+        if not candidates:
+            return []
+        claim_id = uuid.uuid4().hex
+        await _jobs().update_many(
+            {"_id": {"$in": [doc["_id"] for doc in candidates]}, **claimable_query(now)},
+            {"$set": {"status": "running", "claimed_by": WORKER_ID, "claim_id": claim_id, "claimed_at": now}},
+        )
+        return await _jobs().find({"claim_id": claim_id, "status": "running"}).to_list(PURGE_BATCH_SIZE)
+
+    async def _delete(self, name: str, field: str, user_ids: list[ObjectId]) -> int:
+        """
+        delete_many على chunks: الـ _ids الأول وبعدين الحذف، عشان كل عملية تفضل قصيرة مهما كانت بيانات المستخدم كبيرة
+        """
+        collection = database.get_collection(name)
+        # orders/carts (mongoose) شايلين الـ userId كـ ObjectId، والـ payments كـ string من الـ JWT
+        query = {field: {"$in": user_ids + [str(oid) for oid in user_ids]}}
+        deleted = 0
+        while True:
+            chunk = await collection.find(query, {"_id": 1}).limit(PURGE_DELETE_CHUNK).to_list(PURGE_DELETE_CHUNK)
+            if not chunk:
+                return deleted
+            result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in chunk]}})
+            deleted += result.deleted_count
+
+    async def _purge_target(self, jobs: list[dict], name: str, field: str):
+        todo = [job for job in jobs if name not in job.get("progress", {})]
+        if not todo:
+            return
+        async with self._semaphore:
+            deleted = await self._delete(name, field, [job["_id"] for job in todo])
+        self.deleted[name] += deleted
+        # checkpoint: الـ collection دي خلصت للـ jobs دي
+        now = datetime.utcnow()
+        await _jobs().bulk_write([
+            UpdateOne({"_id": job["_id"], "claim_id": job["claim_id"]}, {"$set": {f"progress.{name}": now, "claimed_at": now}})
+            for job in todo
+        ], ordered=False)
+
+    async def process_batch(self, jobs: list[dict]):
+        started = time.perf_counter()
+        await asyncio.gather(*(self._purge_target(jobs, name, field) for name, field in PURGE_TARGETS))
+
+        # الـ user document آخر حاجة: لو وقعنا قبلها الـ job لسه بيدل على المستخدم اللي محتاج يتكمل
+        user_ids = [job["_id"] for job in jobs]
+        result = await database.get_users_collection().delete_many({"_id": {"$in": user_ids}})
+        self.deleted["users"] += result.deleted_count
+
+        now = datetime.utcnow()
+        await _jobs().bulk_write([
+            UpdateOne({"_id": job["_id"], "claim_id": job["claim_id"]}, {
+                "$set": {"status": "done", "completed_at": now},
+                "$unset": {"claim_id": "", "claimed_by": "", "claimed_at": ""},
+            })
+            for job in jobs
+        ], ordered=False)
+        self.jobs_done += len(jobs)
+        logger.info("purged %d accounts in %.2fs (%s)", len(jobs), time.perf_counter() - started, self.deleted)
+
+    async def run(self):
+        await self.ensure_indexes()
+        logger.info("purge worker %s started: %s", WORKER_ID, ", ".join(f"{n}.{f}" for n, f in PURGE_TARGETS))
+        while not self._stopping.is_set():
+            try:
+                jobs = await self.claim_batch()
+                if jobs:
+                    await self.process_batch(jobs)
+            except Exception:
+                # الـ jobs فاضلة running وهترجع بعد الـ lease، والـ progress محفوظ
+                logger.exception("purge batch failed")
+                jobs = []
+            if len(jobs) < PURGE_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=PURGE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stop(self):
+        self._stopping.set()
+
+
+async def main():
+    logging.basicConfig(level=settings.log_level)
+    worker = PurgeWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:
+            pass
+    try:
+        await worker.run()
+    finally:
+        database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,25 @@
+from settings import settings
+
+# Redis اختياري: لو REDIS_URL مش موجود الخدمة بتشتغل من غيره
+REDIS_URL = settings.redis_url
+
+_redis = None
+
+
+def get_redis():
+    """
+    client واحد لكل worker، أو None لو Redis مش متفعّل
+    """
+    global _redis
+    if _redis is None and REDIS_URL:
+        import redis.asyncio as aioredis
+
+        _redis = aioredis.from_url(REDIS_URL)
+    return _redis
+
+
+async def close():
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+    _redis = None
@@ -0,0 +1,97 @@
+# services/user/rolling_restart.py
+"""
+Rolling restart للـ gunicorn master (gunicorn.conf.py) بالـ signals الموثقة بس، من غير ما نلمس حاجة جوه الـ Arbiter
+
+    python rolling_restart.py                  # الـ master من PIDFILE
+    python rolling_restart.py --pid 1234
+
+TTIN بيزود worker واحد، فبنزود بعدد الـ workers الحالية ونستنى كل الجديدة تعمل الـ ready marker (workers.py)،
+وبعدين TTOU بنفس العدد: gunicorn بيقفل الأقدم الأول (= القديمة) بـ graceful drain. الـ workers الجديدة بتعمل import
+للكود والـ settings بعد الـ fork (مفيش preload_app)، فده كفاية لكود جديد أو .env جديد. تغيير في gunicorn.conf.py
+نفسه (bind، timeouts) محتاج HUP، واللي فيه ثانية تقريباً الـ workers الجديدة لسه مخلصتش الـ lifespan
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+
+from settings import Settings
+from workers import ready_path
+
+# gunicorn بيشيل أي signal فوق 5 مستنية في الـ queue بتاعته
+_MAX_PENDING_SIGNALS = 4
+
+
+def ready_workers(master_pid: int) -> set[int]:
+    try:
+        names = os.listdir(os.path.dirname(ready_path(master_pid, 0)))
+    except FileNotFoundError:
+        return set()
+    return {int(name) for name in names if name.isdigit()}
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def rolling_restart(master_pid: int, boot_timeout: float, drain_timeout: float, log=print) -> bool:
+    """
+    True لو كل الـ workers اتبدلت. لو الجديدة مخلصتش في boot_timeout القديمة بتفضل شغالة والزيادة بتترجع
+    """
+    old = ready_workers(master_pid)
+    if not old:
+        log(f"no ready workers for master {master_pid}")
+        return False
+    count = len(old)
+
+    requested = 0
+    deadline = time.monotonic() + boot_timeout
+    while True:
+        new = {pid for pid in ready_workers(master_pid) - old if _alive(pid)}
+        if len(new) >= count:
+            break
+        if time.monotonic() > deadline:
+            log(f"only {len(new)} of {count} new workers ready after {boot_timeout}s, keeping the old ones")
+            for _ in range(requested):
+                os.kill(master_pid, signal.SIGTTOU)
+                time.sleep(0.1)
+            return False
+        if requested < count and requested - len(new) < _MAX_PENDING_SIGNALS:
+            os.kill(master_pid, signal.SIGTTIN)
+            requested += 1
+        time.sleep(0.05)
+    log(f"{count} new workers ready, retiring {sorted(old)}")
+
+    for _ in range(count):
+        os.kill(master_pid, signal.SIGTTOU)
+        time.sleep(0.1)
+    deadline = time.monotonic() + drain_timeout
+    while any(_alive(pid) for pid in old):
+        if time.monotonic() > deadline:
+            log(f"old workers still running after {drain_timeout}s")
+            return False
+        time.sleep(0.1)
+    return True
+
+
+def main() -> int:
+    settings = Settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pid", type=int, help="gunicorn master pid (default: read from PIDFILE)")
+    args = parser.parse_args()
+
+    master_pid = args.pid
+    if master_pid is None:
+        with open(settings.pidfile) as f:
+            master_pid = int(f.read().strip())
+    ok = rolling_restart(master_pid, settings.worker_timeout, settings.graceful_timeout + 5)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# services/user/routes/admin.py
+import csv
+import io
+import logging
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import CursorNotFound
+
+from database import get_users_collection
+from models import PROFILE_PROJECTION, profile_from_doc
+from settings import settings, split_list
+from utils import tombstones
+from utils.audit import get_audit_collection
+from utils.auth import require_role
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_role(split_list(settings.admin_roles)))])
+
+ADMIN_PAGE_MAX = settings.admin_page_max
+EXPORT_BATCH_SIZE = settings.admin_export_batch_size
+
+_EPOCH = datetime(1970, 1, 1)
+
+EXPORT_COLUMNS = ["id", "name", "email", "role", "last_password_change", "password_change_count"]
+
+
+def _user_filter(
+    role: Optional[str],
+    changed_before: Optional[datetime],
+    changed_after: Optional[datetime],
+    after: Optional[str],
+) -> dict:
+    query = {}
+    if role:
+        query["role"] = role
+    if changed_before or changed_after:
+        query["last_password_change"] = {}
+        if changed_before:
+            query["last_password_change"]["$lt"] = changed_before
+        if changed_after:
+            query["last_password_change"]["$gte"] = changed_after
+    if after:
+        try:
+            query["_id"] = {"$gt": ObjectId(after)}
+        except (InvalidId, TypeError):
+            raise HTTPException(status_code=400, detail="admin.invalid_cursor")
+    return query
+
+
+def _csv_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    value = str(value)
+    # الـ export بيتفتح في Excel: خلية بتبدأ بـ = أو + أو - أو @ تتقري formula
+    if value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+
+def _encode_csv(users: list[dict]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_csv_cell(user[column]) for column in EXPORT_COLUMNS] for user in users)
+    return buffer.getvalue().encode()
+
+
+def _encode_ndjson(users: list[dict]) -> bytes:
+    return b"".join(orjson.dumps(user) + b"\n" for user in users)
+
+
+# ===== GET /admin/users
+@router.get("/users")
+async def list_users(
+    role: Optional[str] = None,
+    changed_before: Optional[datetime] = None,
+    changed_after: Optional[datetime] = None,
+    after: Optional[str] = None,
+    limit: int = Query(100, gt=0),
+):
+    """
+    صفحة من المستخدمين بترتيب الـ _id (keyset pagination): next بيتبعت في after للصفحة اللي بعدها
+    بدل skip/limit اللي بيعدي على كل الصفحات اللي قبلها في كل request
+    """
+    limit = min(limit, ADMIN_PAGE_MAX)
+    query = _user_filter(role, changed_before, changed_after, after)
+    # limit + 1 عشان نعرف فيه صفحة بعد كده ولا لأ من غير count
+    docs = await get_users_collection().find(query, PROFILE_PROJECTION).sort("_id", ASCENDING).limit(limit + 1).to_list(None)
+    # الحسابات اللي اتطلب حذفها بتتشال من الصفحة (ممكن تطلع أقل من limit)، والـ cursor من آخر document اتقرا
+    users = [profile_from_doc(doc) for doc in docs[:limit] if not tombstones.is_deleted(doc["_id"])]
+    next_cursor = str(docs[limit - 1]["_id"]) if len(docs) > limit else None
+    return ORJSONResponse({"users": users, "next": next_cursor})
+
+
+# ===== GET /admin/users/export
+@router.get("/users/export")
+async def export_users(
+    format: Literal["csv", "ndjson"] = "ndjson",
+    role: Optional[str] = None,
+    changed_before: Optional[datetime] = None,
+    changed_after: Optional[datetime] = None,
+    after: Optional[str] = None,
+):
+    """
+    كل المستخدمين اللي بيطابقوا الفلاتر كـ stream: cursor واحد بيتقرا بـ EXPORT_BATCH_SIZE، وكل batch بيتكتب
+    chunk أول ما يوصل، فالذاكرة ثابتة مهما كان عدد المستخدمين. after بيكمل export اتقطع من آخر id وصل
+    """
+    query = _user_filter(role, changed_before, changed_after, after)
+    encode = _encode_csv if format == "csv" else _encode_ndjson
+
+    async def stream():
+        if format == "csv":
+            yield _encode_csv([dict(zip(EXPORT_COLUMNS, EXPORT_COLUMNS))])
+        last_id = None
+        while True:
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            cursor = get_users_collection().find(query, PROFILE_PROJECTION, batch_size=EXPORT_BATCH_SIZE).sort("_id", ASCENDING)
+            batch = []
+            try:
+                async for doc in cursor:
+                    last_id = doc["_id"]
+                    if tombstones.is_deleted(last_id):
+                        continue
+                    batch.append(profile_from_doc(doc))
+                    if len(batch) >= EXPORT_BATCH_SIZE:
+                        yield encode(batch)
+                        batch = []
+            except CursorNotFound:
+                # الـ client كان بيقرا ببطء والـ cursor عمل timeout على السيرفر: نكمل بـ cursor جديد من آخر _id
+                logger.warning("export cursor expired after %s, resuming", last_id)
+                if batch:
+                    yield encode(batch)
+                continue
+            if batch:
+                yield encode(batch)
+            return
+
+    filename = f"users-{datetime.utcnow():%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(
+        stream(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _audit_cursor(event: dict) -> str:
+    # (at, _id): events كتير ممكن يبقى ليها نفس الـ millisecond (نفس الـ batch)
+    return f"{(event['at'] - _EPOCH) // timedelta(milliseconds=1)}-{event['_id']}"
+
+
+def _parse_audit_cursor(value: str) -> tuple[datetime, ObjectId]:
+    try:
+        ms, oid = value.split("-", 1)
+        return _EPOCH + timedelta(milliseconds=int(ms)), ObjectId(oid)
+    except (ValueError, InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="admin.invalid_cursor")
+
+
+# ===== GET /admin/audit
+@router.get("/audit")
+async def list_audit_events(
+    user_id: Optional[str] = None,
+    event: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before: Optional[str] = None,
+    limit: int = Query(100, gt=0),
+):
+    """
+    الـ security events (utils/audit) الأحدث الأول، بـ user_id و/أو event من الـ indexes (user_id, at) و (event, at)
+    next بيتبعت في before للصفحة اللي بعدها
+    """
+    limit = min(limit, ADMIN_PAGE_MAX)
+    query = {}
+    if user_id:
+        try:
+            query["user_id"] = ObjectId(user_id)
+        except (InvalidId, TypeError):
+            raise HTTPException(status_code=400, detail="admin.invalid_user_id")
+    if event:
+        query["event"] = event
+    if since or until:
+        query["at"] = {}
+        if since:
+            query["at"]["$gte"] = since
+        if until:
+            query["at"]["$lt"] = until
+    if before:
+        at, oid = _parse_audit_cursor(before)
+        query["$or"] = [{"at": {"$lt": at}}, {"at": at, "_id": {"$lt": oid}}]
+
+    docs = await get_audit_collection().find(query).sort([("at", DESCENDING), ("_id", DESCENDING)]).limit(limit + 1).to_list(None)
+    events = [
+        {
+            "id": str(doc["_id"]),
+            "at": doc["at"],
+            "event": doc["event"],
+            "user_id": str(doc["user_id"]) if doc.get("user_id") is not None else None,
+            "ip": doc.get("ip"),
+            "user_agent": doc.get("user_agent"),
+            "details": doc.get("details") or {},
+        }
+        for doc in docs[:limit]
+    ]
+    next_cursor = _audit_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return ORJSONResponse({"events": events, "next": next_cursor})
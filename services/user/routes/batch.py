@@ -0,0 +1,90 @@
+# services/user/routes/batch.py
+import secrets
+
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
+
+from database import get_users_collection
+from settings import settings, split_list
+from schemas import BatchUsersSchema
+from utils import tombstones
+from utils.singleflight import SingleFlight
+
+router = APIRouter()
+
+# ===== service-to-service: كل خدمة ليها key في SERVICE_API_KEYS (مفصولين بـ ,)
+SERVICE_API_KEYS = split_list(settings.service_api_keys)
+BATCH_MAX_IDS = settings.batch_max_ids
+BATCH_CURSOR_SIZE = settings.batch_cursor_size
+
+# حقول مسموح للخدمات التانية تطلبها (مفيش password أو reset tokens)
+BATCH_FIELDS = {"name", "email", "role", "last_password_change"}
+
+batch_lookups = SingleFlight()
+
+
+async def require_service(x_service_token: str = Header(None)):
+    if not x_service_token or not any(secrets.compare_digest(x_service_token, k) for k in SERVICE_API_KEYS):
+        raise HTTPException(status_code=401, detail="auth.invalid_service_token")
+
+
+def _parse(data: BatchUsersSchema) -> tuple[list[ObjectId], tuple[str, ...]]:
+    ids = list(dict.fromkeys(data.ids))
+    if len(ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"batch.too_many_ids (max {BATCH_MAX_IDS})")
+    fields = tuple(sorted(set(data.fields)))
+    if not fields or not set(fields) <= BATCH_FIELDS:
+        raise HTTPException(status_code=400, detail="batch.invalid_fields")
+
+    object_ids = []
+    for user_id in ids:
+        # حساب اتطلب حذفه بيرجع في missing حتى لو الـ purge لسه ماوصلش للـ user document
+        if tombstones.is_deleted(user_id):
+            continue
+        try:
+            object_ids.append(ObjectId(user_id))
+        except (InvalidId, TypeError):
+            continue
+    return object_ids, fields
+
+
+def _to_out(doc: dict) -> dict:
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+def _cursor(object_ids: list[ObjectId], fields: tuple[str, ...]):
+    # query واحدة بـ $in بدل request لكل مستخدم
+    return get_users_collection().find(
+        {"_id": {"$in": object_ids}}, {f: 1 for f in fields}, batch_size=BATCH_CURSOR_SIZE
+    )
+
+
+# ===== POST /batch
+@router.post("/batch", dependencies=[Depends(require_service)])
+async def batch_users(data: BatchUsersSchema, accept: str = Header("application/json")):
+    """
+    جلب بيانات مستخدمين كتير في round trip واحد للخدمات التانية (order, cart, auth)
+    Accept: application/x-ndjson بيرجع سطر لكل مستخدم أول ما يوصل من Mongo
+    """
+    object_ids, fields = _parse(data)
+
+    if "application/x-ndjson" in accept:
+        async def stream():
+            async for doc in _cursor(object_ids, fields):
+                yield orjson.dumps(_to_out(doc)) + b"\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    async def fetch():
+        return [_to_out(doc) async for doc in _cursor(object_ids, fields)]
+
+    # نفس الـ ids ونفس الحقول في نفس اللحظة (مثلاً صفحة orders بتتفتح مرتين) = query واحدة
+    key = (tuple(sorted(str(oid) for oid in object_ids)), fields)
+    users = await batch_lookups.do(key, fetch)
+    found = {u["id"] for u in users}
+    missing = [user_id for user_id in dict.fromkeys(data.ids) if user_id not in found]
+    return ORJSONResponse({"users": users, "missing": missing})
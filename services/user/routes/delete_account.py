@@ -1,48 +1,56 @@
 # services/user/routes/delete_account.py
-from fastapi import APIRouter, Depends, HTTPException, Cookie
 from bson import ObjectId
-from utils.jwt import decode_token
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
-from dotenv import load_dotenv
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException, Request
 
-load_dotenv()
+import purge
+from routes.batch import require_service
+from schemas import PurgeUsersSchema
+from settings import settings
+from utils.audit import audit_log
+from utils.auth import get_current_user
 
 router = APIRouter()
 
-# ===== MongoDB client
-MONGO_URI = os.getenv("MONGO_URI")
-client = AsyncIOMotorClient(MONGO_URI)
-db = client["amazon_clone"]
-users_collection = db["users"]
-
-# ===== helper: get_current_user from cookie
-async def get_current_user(token: str = Cookie(None)):
-    if not token:
-        raise HTTPException(status_code=401, detail="auth.no_token")
-    
-    decoded = decode_token(token)
-    if not decoded:
-        raise HTTPException(status_code=401, detail="auth.invalid_token")
-    
-    user_id = decoded.get("id")
-    if not user_id:
-        raise HTTPException(status_code=401, detail="auth.invalid_token")
-    
-    user = await users_collection.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise HTTPException(status_code=404, detail="profile.user_not_found")
-    
-    return user
+PURGE_MAX_IDS = settings.purge_max_ids
 
 # ===== DELETE /delete-account
-@router.delete("/delete-account")
-async def delete_account(current_user: dict = Depends(get_current_user)):
-    result = await users_collection.delete_one({"_id": current_user["_id"]})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="profile.user_not_found")
-    
-    return {"message": "Account deleted successfully"}
+@router.delete("/delete-account", status_code=202)
+async def delete_account(request: Request, current_user: dict = Depends(get_current_user)):
+    """
+    الحساب بيقف فوراً (tombstone)، وحذف الـ carts والـ orders والـ payments بيحصل في purge.py
+    """
+    await purge.enqueue([current_user["_id"]], requested_by="self")
+    await audit_log.record("account.deletion_requested", current_user["_id"], request, requested_by="self")
+    return {"message": "account.deletion_scheduled", "job_id": str(current_user["_id"])}
+
+# ===== POST /purge (service-to-service: طلبات الحذف اللي الـ support بيجمعها)
+@router.post("/purge", status_code=202, dependencies=[Depends(require_service)])
+async def purge_accounts(request: Request, data: PurgeUsersSchema):
+    ids = list(dict.fromkeys(data.ids))
+    if len(ids) > PURGE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"purge.too_many_ids (max {PURGE_MAX_IDS})")
+    object_ids = []
+    for user_id in ids:
+        try:
+            object_ids.append(ObjectId(user_id))
+        except (InvalidId, TypeError):
+            raise HTTPException(status_code=400, detail="purge.invalid_id")
+    queued = await purge.enqueue(object_ids, requested_by=data.requested_by)
+    await audit_log.record_many("account.deletion_requested", object_ids, request, requested_by=data.requested_by)
+    return {"queued": queued, "already_queued": len(object_ids) - queued}
+
+# ===== GET /purge/{user_id}
+@router.get("/purge/{user_id}", dependencies=[Depends(require_service)])
+async def purge_status(user_id: str):
+    try:
+        job = await purge.job_status(ObjectId(user_id))
+    except (InvalidId, TypeError):
+        job = None
+    if job is None:
+        raise HTTPException(status_code=404, detail="purge.job_not_found")
+    job["user_id"] = str(job.pop("_id"))
+    return job
 
 
 
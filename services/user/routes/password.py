@@ -1,75 +1,36 @@
 # services/user/routes/password.py
-from fastapi import APIRouter, Depends, HTTPException, Cookie, Request, Header
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
 from datetime import datetime, timedelta
 import re
 import secrets
-import os
-from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorClient
 
+import outbox
+from database import get_users_collection
 from schemas import ChangePasswordSchema
-from utils.hash import hash_password, verify_password
-from utils.jwt import decode_token, encode_token  # توحيد JWT
-from dotenv import load_dotenv
+from settings import settings
+from utils import user_cache
+from utils.audit import audit_log
+from utils.auth import get_current_user
+from utils.revocation import revocations
+from utils.hash import hash_password_async, verify_password_async
+from utils.rate_limit import rate_limit
 
-load_dotenv()
 router = APIRouter()
 
-# ===== MongoDB client
-MONGO_URI = os.getenv("MONGO_URI")
-client = AsyncIOMotorClient(MONGO_URI)
-db = client["amazon_clone"]
-users_collection = db["users"]
-
 # ===== Password rules
 PASSWORD_REGEX = re.compile(
     r"^(?=.*[a-z])(?=.*[A-Z])(?=.*\\d)(?=.*[!@#$%^&*()_+\-={}[\]|:;\"'<>,.?/]).{8,}$"
 )
 
-# ===== Rate limiter storage (in-memory for demo)
-RATE_LIMIT_STORE = {}
-
-def rate_limit(key: str, limit: int, window_seconds: int):
-    now = datetime.utcnow()
-    if key not in RATE_LIMIT_STORE:
-        RATE_LIMIT_STORE[key] = []
-    RATE_LIMIT_STORE[key] = [t for t in RATE_LIMIT_STORE[key] if (now - t).total_seconds() < window_seconds]
-    if len(RATE_LIMIT_STORE[key]) >= limit:
-        raise HTTPException(status_code=429, detail="Too many requests")
-    RATE_LIMIT_STORE[key].append(now)
-
-# ===== helper: get_current_user from cookie or Authorization header
-async def get_current_user(token: Optional[str] = Cookie(None), authorization: Optional[str] = Header(None)):
-    # نحاول ناخد التوكن من Header أولاً
-    if authorization and authorization.startswith("Bearer "):
-        token = authorization.split(" ")[1]
-
-    if not token:
-        raise HTTPException(status_code=401, detail="auth.no_token")
-
-    decoded = decode_token(token)
-    if not decoded:
-        raise HTTPException(status_code=401, detail="auth.invalid_token")
-
-    user_id = decoded.get("id")
-    if not user_id:
-        raise HTTPException(status_code=401, detail="auth.invalid_token")
-
-    user = await users_collection.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise HTTPException(status_code=404, detail="profile.user_not_found")
-    return user
-
 # ===== POST /forgot-password
-@router.post("/forgot-password")
-async def forgot_password(request: Request, email: str):
-    rate_limit(f"forgot-password:{request.client.host}", limit=5, window_seconds=300)
+@router.post("/forgot-password", dependencies=[Depends(rate_limit("forgot-password", limit=5, window_seconds=300))])
+async def forgot_password(email: str):
     email = (email or "").strip()
     if not email:
         raise HTTPException(status_code=400, detail="forgotPassword.error")
 
-    user = await users_collection.find_one({"email": email})
+    users_collection = get_users_collection()
+    user = await users_collection.find_one({"email": email}, {"_id": 1, "email": 1, "name": 1})
     if not user:
         return {"message": "forgotPassword.check_email"}
 
@@ -80,16 +41,14 @@ async def forgot_password(request: Request, email: str):
         {"$set": {"reset_password_token": reset_token, "reset_password_expires": reset_expiry}}
     )
 
-    frontend = os.getenv("FRONTEND_URL", "http://localhost:3000")
-    reset_link = f"{frontend}/reset-password?token={reset_token}"
-    print(f"[forgot-password] reset link: {reset_link}")
+    reset_link = f"{settings.frontend_url}/reset-password?token={reset_token}"
+    await outbox.enqueue("password_reset", user["email"], {"name": user.get("name") or "", "reset_link": reset_link})
 
     return {"message": "forgotPassword.check_email"}
 
 # ===== POST /reset-password
-@router.post("/reset-password")
+@router.post("/reset-password", dependencies=[Depends(rate_limit("reset-password", limit=5, window_seconds=300))])
 async def reset_password(request: Request, token: str, new_password: str, confirm_password: str):
-    rate_limit(f"reset-password:{request.client.host}", limit=5, window_seconds=300)
     token = (token or "").strip()
     new_password = (new_password or "").strip()
     confirm_password = (confirm_password or "").strip()
@@ -101,30 +60,36 @@ async def reset_password(request: Request, token: str, new_password: str, confir
         raise HTTPException(status_code=400, detail="ResetPassword.error")
 
     now = datetime.utcnow()
+    users_collection = get_users_collection()
     user = await users_collection.find_one({
         "reset_password_token": token,
         "reset_password_expires": {"$gt": now}
-    })
+    }, {"_id": 1})
     if not user:
         raise HTTPException(status_code=400, detail="ResetPassword.invalidLink")
 
-    hashed = hash_password(new_password)
+    hashed = await hash_password_async(new_password)
     await users_collection.update_one(
         {"_id": user["_id"]},
-        {"$set": {
-            "password": hashed,
-            "reset_password_token": None,
-            "reset_password_expires": None,
-            "last_password_change": now,
-            "password_change_count": (user.get("password_change_count") or 0) + 1
-        }}
+        {
+            "$set": {
+                "password": hashed,
+                "last_password_change": now,
+            },
+            # $unset مش None عشان الـ user يخرج من الـ partial index بتاع الـ reset tokens
+            "$unset": {"reset_password_token": "", "reset_password_expires": ""},
+            "$inc": {"version": 1, "password_change_count": 1},
+        }
     )
+    await user_cache.invalidate(user["_id"])
+    # أي توكن اتعمل قبل الـ reset (ممكن يكون مع اللي سرق الحساب) بيتلغي
+    await revocations.revoke_users([user["_id"]])
+    await audit_log.record("password.reset", user["_id"], request)
     return {"message": "ResetPassword.success"}
 
 # ===== POST /change-password
-@router.post("/change-password")
+@router.post("/change-password", dependencies=[Depends(rate_limit("change-password", limit=5, window_seconds=300, key="user"))])
 async def change_password(request: Request, data: ChangePasswordSchema, current_user: dict = Depends(get_current_user)):
-    rate_limit(f"change-password:{current_user['_id']}", limit=5, window_seconds=300)
     old_password = (data.old_password or "").strip()
     new_password = (data.new_password or "").strip()
     confirm_password = (data.confirm_password or "").strip()
@@ -132,21 +97,31 @@ async def change_password(request: Request, data: ChangePasswordSchema, current_
         raise HTTPException(status_code=400, detail="changePassword.error")
     if new_password != confirm_password:
         raise HTTPException(status_code=400, detail="changePassword.passwordsMismatch")
-    if not verify_password(old_password, current_user["password"]):
+    users_collection = get_users_collection()
+    # الـ hash مش موجود في الـ user اللي راجع من الـ cache، بنجيبه هنا بس
+    stored = await users_collection.find_one({"_id": current_user["_id"]}, {"password": 1})
+    if not stored:
+        raise HTTPException(status_code=404, detail="profile.user_not_found")
+    if not await verify_password_async(old_password, stored["password"]):
+        await audit_log.record("password.change_failed", current_user["_id"], request, reason="old_password_incorrect")
         raise HTTPException(status_code=400, detail="changePassword.oldPasswordIncorrect")
     if not PASSWORD_REGEX.match(new_password):
         raise HTTPException(status_code=400, detail="changePassword.error")
 
     now = datetime.utcnow()
-    new_hashed = hash_password(new_password)
+    new_hashed = await hash_password_async(new_password)
     await users_collection.update_one(
         {"_id": current_user["_id"]},
         {"$set": {
             "password": new_hashed,
             "last_password_change": now,
-            "password_change_count": (current_user.get("password_change_count") or 0) + 1
-        }}
+        # $inc مش قيمة محسوبة من current_user: ده ممكن يكون من الـ cache (قديم) وطلبين مع بعض كانوا بيضيعوا زيادة
+        }, "$inc": {"version": 1, "password_change_count": 1}}
     )
+    await user_cache.invalidate(current_user["_id"])
+    # التوكنات القديمة (ومنها التوكن الحالي) بتتلغي: المستخدم بيعمل login تاني بالباسورد الجديد
+    await revocations.revoke_users([current_user["_id"]])
+    await audit_log.record("password.changed", current_user["_id"], request)
     return {"message": "changePassword.success"}
 
 
@@ -1,53 +1,36 @@
 # services/user/routes/profile.py
-from fastapi import APIRouter, Depends, HTTPException, Header
-from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
-
-from utils.jwt import decode_token, encode_token  # استخدام التوكن الموحد
-from models import User
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import ORJSONResponse
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import get_users_collection
+from utils import user_cache
+from utils.auth import get_current_user
+from utils.http_cache import cache_headers, not_modified, user_etag
+from models import PROFILE_PROJECTION, ProfileResponse, UpdateProfileResponse, profile_from_doc
 from schemas import UpdateProfileSchema
 
 router = APIRouter()
 
-# ===== MongoDB Atlas client
-MONGO_URI = os.getenv("MONGO_URI")
-client = AsyncIOMotorClient(MONGO_URI)
-db = client["amazon_clone"]
-users_collection = db["users"]
-
-# ===== دالة لجلب المستخدم الحالي من التوكن
-async def get_current_user(authorization: str = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="auth.no_token")
-
-    token = authorization.split(" ")[1]
-    decoded = decode_token(token)  # استخدام decode الموحد
-    if not decoded:
-        raise HTTPException(status_code=401, detail="auth.invalid_token")
-
-    user_id = decoded.get("id")
-    if not user_id:
-        raise HTTPException(status_code=401, detail="auth.invalid_token")
-
-    user_data = await users_collection.find_one({"_id": ObjectId(user_id)})
-    if not user_data:
-        raise HTTPException(status_code=404, detail="profile.user_not_found")
-
-    return User(**user_data)
-
 # ===== GET /profile
-@router.get("/profile")
-async def get_profile(current_user: User = Depends(get_current_user)):
+@router.get("/profile", response_model=ProfileResponse)
+async def get_profile(current_user: dict = Depends(get_current_user), if_none_match: Optional[str] = Header(None)):
     """
-    جلب بيانات المستخدم الحالي
+    جلب بيانات المستخدم الحالي (If-None-Match بنفس الـ ETag = 304 من غير body)
     """
-    return {"user": current_user}
+    etag = user_etag(current_user)
+    response = not_modified("/user/profile", if_none_match, etag)
+    if response is not None:
+        return response
+    return ORJSONResponse({"user": profile_from_doc(current_user)}, headers=cache_headers(etag))
 
 # ===== PUT /update-profile
-@router.put("/update-profile")
+@router.put("/update-profile", response_model=UpdateProfileResponse)
 async def update_profile(
-    data: UpdateProfileSchema, current_user: User = Depends(get_current_user)
+    data: UpdateProfileSchema, current_user: dict = Depends(get_current_user)
 ):
     """
     تحديث بيانات المستخدم الحالي
@@ -58,15 +41,26 @@ async def update_profile(
     if data.email:
         update_fields["email"] = data.email
 
+    updated_user_data = current_user
     if update_fields:
-        await users_collection.update_one(
-            {"_id": ObjectId(current_user.id)},
-            {"$set": update_fields}
-        )
-
-    updated_user_data = await users_collection.find_one({"_id": ObjectId(current_user.id)})
-    updated_user = User(**updated_user_data)
-    return {"message": "profile.update_success", "user": updated_user}
+        # الكتابة والقراءة في round trip واحد
+        try:
+            updated_user_data = await get_users_collection().find_one_and_update(
+                {"_id": current_user["_id"]},
+                {"$set": update_fields, "$inc": {"version": 1}},
+                projection=PROFILE_PROJECTION,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # الـ unique index على email (indexes.py): مستخدم تاني عنده نفس الإيميل، ومفيش حاجة اتكتبت
+            raise HTTPException(status_code=409, detail="user.email_taken")
+        await user_cache.invalidate(current_user["_id"])
+        if not updated_user_data:
+            raise HTTPException(status_code=404, detail="profile.user_not_found")
+        # محلياً بس: في Redis مفيش generation اتقرت قبل الكتابة تحمي من update تاني سبقنا، والقراءة الجاية تملاه
+        await user_cache.set_user(str(current_user["_id"]), updated_user_data, user_cache.current_epoch())
+
+    return ORJSONResponse({"message": "profile.update_success", "user": profile_from_doc(updated_user_data)})
 
 """
 
@@ -0,0 +1,54 @@
+# services/user/routes/tokens.py
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Cookie, Depends, Header, HTTPException
+
+from routes.batch import require_service
+from schemas import RevokeTokensSchema
+from settings import settings
+from utils.auth import _extract_token, get_current_user
+from utils.jwt import decode_token
+from utils.revocation import revocations
+
+router = APIRouter()
+
+REVOKE_MAX_IDS = settings.revoke_max_ids
+
+# ===== POST /logout (التوكن الحالي بس)
+@router.post("/logout")
+async def logout(
+    current_user: dict = Depends(get_current_user),
+    token: Optional[str] = Cookie(None),
+    authorization: Optional[str] = Header(None),
+):
+    # get_current_user فك التوكن قبل كده، فده من الـ JWT cache
+    decoded = decode_token(_extract_token(token, authorization)) or {}
+    # decode_token بيحط jti من الـ hash بتاع التوكن لو مفيش (utils/jwt.token_id)
+    if not decoded.get("jti") or not decoded.get("exp"):
+        # توكنات من غير exp ملهاش غير logout-all
+        raise HTTPException(status_code=400, detail="auth.token_not_revocable")
+    await revocations.revoke_token(decoded["jti"], decoded["exp"])
+    return {"message": "auth.logged_out"}
+
+# ===== POST /logout-all (كل الأجهزة)
+@router.post("/logout-all")
+async def logout_all(current_user: dict = Depends(get_current_user)):
+    await revocations.revoke_users([current_user["_id"]])
+    return {"message": "auth.logged_out_everywhere"}
+
+# ===== POST /revoke (service-to-service: الـ auth service وقت الـ logout، أو الـ support)
+@router.post("/revoke", dependencies=[Depends(require_service)])
+async def revoke(data: RevokeTokensSchema):
+    user_ids = list(dict.fromkeys(data.user_ids))
+    if len(user_ids) > REVOKE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"revoke.too_many_ids (max {REVOKE_MAX_IDS})")
+    if data.jti and not data.exp:
+        raise HTTPException(status_code=400, detail="revoke.exp_required")
+    if not user_ids and not data.jti:
+        raise HTTPException(status_code=400, detail="revoke.nothing_to_revoke")
+    if user_ids:
+        await revocations.revoke_users(user_ids)
+    if data.jti and data.exp > time.time():
+        await revocations.revoke_token(data.jti, data.exp)
+    return {"revoked_users": len(user_ids), "revoked_token": bool(data.jti)}
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr, constr
 
 class UpdateProfileSchema(BaseModel):
@@ -10,6 +10,19 @@ class ChangePasswordSchema(BaseModel):
     new_password: constr(min_length=8)
     confirm_password: str
 
+class BatchUsersSchema(BaseModel):
+    ids: List[str]
+    fields: List[str] = ["name", "email"]
+
+class PurgeUsersSchema(BaseModel):
+    ids: List[str]
+    requested_by: constr(min_length=1, max_length=100) = "support"
+
+class RevokeTokensSchema(BaseModel):
+    user_ids: List[str] = []
+    jti: Optional[constr(min_length=1, max_length=100)] = None
+    exp: Optional[int] = None
+
 """
 
 from pydantic import BaseModel, EmailStr, constr
@@ -0,0 +1,146 @@
+# services/user/settings.py
+"""
+كل إعدادات الـ user service في مكان واحد: الـ env و.env بيتقروا ويتعمل لهم validation مرة واحدة وقت أول import،
+وأي قيمة غلط (مثلاً BCRYPT_ROUNDS=abc) بتوقف الـ worker وقت الـ startup بدل ما تظهر في أول request.
+أسماء الـ fields هي أسماء الـ env vars (case-insensitive)، والموديولات بتاخد منها الـ constants بتاعتها
+"""
+import os
+import tempfile
+from typing import Literal, Optional
+
+from pydantic import Field, model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"),
+        extra="ignore",
+    )
+
+    # ===== Mongo (لكل worker process)
+    mongo_uri: Optional[str] = None
+    mongo_db: str = "amazon_clone"
+    mongo_max_pool_size: int = Field(50, gt=0)
+    mongo_min_pool_size: int = Field(5, ge=0)
+    mongo_max_idle_time_ms: int = Field(60000, ge=0)
+
+    # ===== Redis اختياري: من غيره كل حاجة بتبقى محلية في الـ worker
+    redis_url: Optional[str] = None
+
+    # ===== JWT
+    jwt_secret: Optional[str] = None
+    jwt_algorithm: str = "HS256"
+    # خوارزميات مقبولة في التحقق (فاضية = jwt_algorithm بس)
+    jwt_algorithms: str = ""
+    # key rotation: "kid1=secret1,kid2=secret2"
+    jwt_keys: str = ""
+    jwt_cache_size: int = Field(10000, gt=0)
+    jwt_cache_max_ttl: float = Field(300, ge=0)
+
+    # ===== HTTP
+    frontend_url: str = "http://localhost:3000"
+    auth_url: str = "http://localhost:4000"
+    debug_token: Optional[str] = None
+    log_level: str = "INFO"
+
+    # ===== Serving (gunicorn.conf.py)
+    host: str = "0.0.0.0"
+    port: int = Field(5000, gt=0, lt=65536)
+    # عدد الـ worker processes (فاضي = عدد الـ cores)
+    web_concurrency: Optional[int] = Field(None, gt=0)
+    # وقت الـ drain بعد SIGTERM/HUP قبل ما الـ worker يتقتل
+    graceful_timeout: int = Field(30, gt=0)
+    worker_timeout: int = Field(60, gt=0)
+    keepalive: int = Field(5, ge=0)
+    # recycle للـ worker بعد عدد requests (0 = أبداً)، والـ jitter عشان الـ workers متعملش restart مع بعض
+    max_requests: int = Field(0, ge=0)
+    max_requests_jitter: int = Field(0, ge=0)
+    forwarded_allow_ips: str = "127.0.0.1"
+    # الـ master pid (rolling_restart.py)
+    pidfile: str = Field(default_factory=lambda: os.path.join(tempfile.gettempdir(), "user-service.pid"))
+
+    # ===== Password hashing
+    bcrypt_rounds: int = Field(12, ge=4, le=31)
+    password_hash_executor: Literal["thread", "process"] = "thread"
+    password_hash_workers: int = Field(default_factory=lambda: os.cpu_count() or 2, gt=0)
+    # فاضي = ضعف عدد الـ workers
+    password_hash_max_concurrency: Optional[int] = Field(None, gt=0)
+
+    # ===== Caches و rate limit
+    user_cache_size: int = Field(10000, gt=0)
+    user_cache_ttl: float = Field(30, ge=0)
+    user_cache_redis_ttl: int = Field(300, gt=0)
+    # "memory" أو "redis" (فاضي = redis لو REDIS_URL موجود)
+    rate_limit_backend: Literal["", "memory", "redis"] = ""
+    rate_limit_evict_interval: float = Field(60, gt=0)
+    reset_token_cleanup_interval: float = Field(600, gt=0)
+
+    # ===== Profiler
+    profiler_enabled: bool = False
+    profiler_interval_ms: float = Field(5, gt=0)
+    slow_request_ms: float = Field(500, ge=0)
+    profile_dir: str = "/tmp/user-service-profiles"
+    profiler_buffer: int = Field(10000, gt=0)
+
+    # ===== Service-to-service
+    # key لكل خدمة، مفصولين بـ ,
+    service_api_keys: str = ""
+    batch_max_ids: int = Field(1000, gt=0)
+    batch_cursor_size: int = Field(500, gt=0)
+
+    # ===== Admin listing و export
+    # الأدوار اللي ليها /admin/users (مفصولين بـ ,)
+    admin_roles: str = "admin,superadmin"
+    admin_page_max: int = Field(500, gt=0)
+    # documents في كل getMore أثناء الـ export (كل batch بيتكتب chunk واحد في الـ response)
+    admin_export_batch_size: int = Field(2000, gt=0, le=100000)
+
+    # ===== حذف الحسابات وإلغاء التوكنات
+    tombstone_ttl_days: int = Field(8, gt=0)
+    tombstone_poll_interval: float = Field(2, gt=0)
+    purge_targets: str = "cartitems:userId,orders:userId,payments:user_id,sessions:userId"
+    purge_batch_size: int = Field(200, gt=0)
+    purge_concurrency: int = Field(2, gt=0)
+    purge_delete_chunk: int = Field(1000, gt=0)
+    purge_poll_interval: float = Field(2, gt=0)
+    purge_claim_lease: float = Field(600, gt=0)
+    purge_max_ids: int = Field(10000, gt=0)
+    revocation_watermark_ttl: int = Field(8 * 86400, gt=0)
+    revocation_bloom_capacity: int = Field(100000, gt=0)
+    revocation_bloom_error_rate: float = Field(0.001, gt=0, lt=1)
+    revocation_rebuild_interval: float = Field(60, gt=0)
+    revoke_max_ids: int = Field(10000, gt=0)
+
+    # ===== Audit log (utils/audit.py)
+    audit_collection_type: Literal["timeseries", "capped"] = "timeseries"
+    # timeseries: الـ events بتتمسح بعد المدة دي. capped: أقدم الـ events بتتشال لما الحجم يكمل
+    audit_retention_days: int = Field(365, gt=0)
+    audit_capped_size_mb: int = Field(1024, gt=0)
+    audit_queue_size: int = Field(10000, gt=0)
+    audit_batch_size: int = Field(500, gt=0)
+    audit_flush_interval: float = Field(1, gt=0)
+    # أقصى انتظار للـ request لو الـ queue مليان قبل ما الـ events تتشال
+    audit_enqueue_timeout: float = Field(0.5, ge=0)
+    # لازم يبقى أقل من الـ 5 ثواني اللي workers.py سايبها للـ lifespan shutdown
+    audit_shutdown_timeout: float = Field(3, gt=0)
+
+    @model_validator(mode="after")
+    def _check(self):
+        if not self.jwt_secret and not self.jwt_keys:
+            raise ValueError("JWT_SECRET or JWT_KEYS must be set")
+        if self.mongo_min_pool_size > self.mongo_max_pool_size:
+            raise ValueError("MONGO_MIN_POOL_SIZE is larger than MONGO_MAX_POOL_SIZE")
+        if self.password_hash_max_concurrency is None:
+            self.password_hash_max_concurrency = self.password_hash_workers * 2
+        return self
+
+
+def split_list(value: str) -> list[str]:
+    """
+    "a, b,,c" -> ["a", "b", "c"] (الـ env vars اللي بتاخد list مفصولة بـ ,)
+    """
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+settings = Settings()
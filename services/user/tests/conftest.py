@@ -0,0 +1,53 @@
+# services/user/tests/conftest.py
+"""
+الـ tests بتشتغل على mongomock والـ Redis مش موجود (الـ cache المحلي بس)، إلا لو MONGO_URI اتحدد (الـ db بتاعها amazon_clone_test)
+python -m pytest -q tests   (من services/user، بعد pip install -r tests/requirements.txt)
+"""
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault("MONGO_URI", "mongomock://tests")
+os.environ.setdefault("MONGO_DB", "amazon_clone_test")
+os.environ.setdefault("JWT_SECRET", "tests")
+os.environ.setdefault("SERVICE_API_KEYS", "tests-service")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    import httpx
+
+    from app import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+@pytest.fixture
+async def user():
+    from bson import ObjectId
+
+    from database import get_users_collection
+
+    oid = ObjectId()
+    doc = {"_id": oid, "name": "Test", "email": f"{oid}@example.com", "role": "user", "version": 0}
+    await get_users_collection().insert_one(doc)
+    yield doc
+    await get_users_collection().delete_one({"_id": oid})
+
+
+@pytest.fixture
+def auth_headers(user):
+    from utils.jwt import encode_token
+
+    now = int(time.time())
+    token = encode_token({"id": str(user["_id"]), "role": user["role"], "iat": now, "exp": now + 300})
+    return {"Authorization": f"Bearer {token}"}
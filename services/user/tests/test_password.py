@@ -0,0 +1,23 @@
+# services/user/tests/test_password.py
+import pytest
+
+from database import get_users_collection
+from utils.hash import hash_password
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_change_password_increments_the_stored_count(client, user, auth_headers):
+    # الـ user اتقرا في الـ cache بـ count قديم، وبعدين الـ auth service كتب عليه
+    await client.get("/user/profile", headers=auth_headers)
+    await get_users_collection().update_one(
+        {"_id": user["_id"]}, {"$set": {"password": hash_password("Old-pass1!"), "password_change_count": 3}}
+    )
+
+    # PASSWORD_REGEX (زي ما هو من الأول) بيطلب \d حرفياً
+    new_password = "New-pass\\d1!"
+    response = await client.post("/user/change-password", headers=auth_headers, json={
+        "old_password": "Old-pass1!", "new_password": new_password, "confirm_password": new_password,
+    })
+    assert response.status_code == 200, response.text
+    assert (await get_users_collection().find_one({"_id": user["_id"]}))["password_change_count"] == 4
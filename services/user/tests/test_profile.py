@@ -0,0 +1,46 @@
+# services/user/tests/test_profile.py
+import pytest
+
+from database import get_users_collection
+from utils import user_cache
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_profile_not_modified(client, user, auth_headers):
+    first = await client.get("/user/profile", headers=auth_headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = await client.get("/user/profile", headers={**auth_headers, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+
+async def test_etag_changes_on_write_without_version(client, user, auth_headers):
+    # زي superAdminRoutes في الـ auth service: تعديل مباشر من غير $inc version ولا invalidation
+    first = await client.get("/user/profile", headers=auth_headers)
+    etag = first.headers["etag"]
+    await get_users_collection().update_one({"_id": user["_id"]}, {"$set": {"role": "admin"}})
+    # الـ cache entry انتهت (USER_CACHE_TTL)
+    await user_cache.invalidate(user["_id"])
+
+    response = await client.get("/user/profile", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["user"]["role"] == "admin"
+    assert response.headers["etag"] != etag
+
+
+async def test_update_profile_duplicate_email(client, user, auth_headers):
+    import indexes
+
+    await indexes.ensure_indexes()
+    taken = {"name": "Other", "email": f"taken-{user['_id']}@example.com", "role": "user"}
+    await get_users_collection().insert_one(taken)
+    try:
+        response = await client.put("/user/update-profile", headers=auth_headers, json={"name": None, "email": taken["email"]})
+    finally:
+        await get_users_collection().delete_one({"_id": taken["_id"]})
+    assert response.status_code == 409
+    assert response.json()["detail"] == "user.email_taken"
+    assert (await get_users_collection().find_one({"_id": user["_id"]}))["email"] == user["email"]
@@ -0,0 +1,25 @@
+# services/user/tests/test_query_plans.py
+"""
+explain() لكل query في indexes.route_queries(): أي COLLSCAN يفشل. محتاج Mongo حقيقي (mongomock مبيعملش query planning)
+
+    MONGO_URI=mongodb://localhost:27017 python -m pytest -q tests/test_query_plans.py
+"""
+import os
+
+import pytest
+
+import indexes
+
+pytestmark = [
+    pytest.mark.anyio,
+    pytest.mark.skipif(
+        os.environ["MONGO_URI"].startswith("mongomock://"),
+        reason="query plans need a real MongoDB (set MONGO_URI)",
+    ),
+]
+
+
+async def test_route_queries_use_an_index():
+    await indexes.ensure_all_indexes()
+    failures = await indexes.check_query_plans()
+    assert not failures, "\n".join(f"COLLSCAN in {route}: {' -> '.join(stages)}" for route, stages in failures.items())
@@ -0,0 +1,33 @@
+# services/user/tests/test_revocation.py
+import time
+
+import pytest
+
+from utils.jwt import create_token, encode_token
+from utils.revocation import revocations
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_logout_token_without_jti(client, user, auth_headers):
+    # زي توكنات الـ auth service: من غير jti
+    other = encode_token({"id": str(user["_id"]), "role": "user", "iat": int(time.time()) - 5, "exp": int(time.time()) + 300})
+
+    response = await client.post("/user/logout", headers=auth_headers)
+    assert response.status_code == 200
+
+    assert (await client.get("/user/profile", headers=auth_headers)).status_code == 401
+    assert (await client.get("/user/profile", headers={"Authorization": f"Bearer {other}"})).status_code == 200
+
+
+async def test_login_in_the_same_second_as_revocation(client, user):
+    before = create_token({"id": str(user["_id"]), "role": "user"})
+    await revocations.revoke_users([user["_id"]])
+    # login بعد الإلغاء على طول، بـ iat بالثانية (jsonwebtoken) وبكسور الثانية (create_token)
+    now = int(time.time())
+    seconds = encode_token({"id": str(user["_id"]), "role": "user", "iat": now, "exp": now + 300})
+    fractional = create_token({"id": str(user["_id"]), "role": "user"})
+
+    assert (await client.get("/user/profile", headers={"Authorization": f"Bearer {before}"})).status_code == 401
+    assert (await client.get("/user/profile", headers={"Authorization": f"Bearer {seconds}"})).status_code == 200
+    assert (await client.get("/user/profile", headers={"Authorization": f"Bearer {fractional}"})).status_code == 200
@@ -0,0 +1,48 @@
+# services/user/tests/test_tombstones.py
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from database import get_users_collection
+from utils import tombstones
+from utils.jwt import encode_token
+
+pytestmark = pytest.mark.anyio
+
+
+def test_expired_tombstones_are_dropped():
+    old, new = str(ObjectId()), str(ObjectId())
+    tombstones._remember([old], datetime.utcnow() - timedelta(days=tombstones.TOMBSTONE_TTL_DAYS + 1))
+    tombstones._remember([new])
+    assert not tombstones.is_deleted(old)
+    assert tombstones.is_deleted(new)
+
+
+async def test_batch_reports_deleted_users_as_missing(client, user):
+    tombstones._remember([user["_id"]])
+    response = await client.post(
+        "/user/batch", headers={"X-Service-Token": "tests-service"}, json={"ids": [str(user["_id"])]},
+    )
+    assert response.json() == {"users": [], "missing": [str(user["_id"])]}
+
+
+async def test_admin_listing_skips_deleted_users(client):
+    # ids فوق أي ObjectId() بيتعمل في الـ tests التانية، عشان after يجيب دول بس
+    ids = [ObjectId(f"ff{i:022x}") for i in range(4)]
+    await get_users_collection().insert_many([
+        {"_id": oid, "name": "n", "email": f"{oid}@example.com", "role": "admin"} for oid in ids
+    ])
+    tombstones._remember([ids[1]])
+    now = int(time.time())
+    headers = {"Authorization": "Bearer " + encode_token({"id": str(ids[0]), "role": "admin", "iat": now, "exp": now + 300})}
+    try:
+        first = (await client.get("/user/admin/users", headers=headers, params={"role": "admin", "limit": 2, "after": str(ids[0])})).json()
+        second = (await client.get("/user/admin/users", headers=headers, params={"role": "admin", "limit": 2, "after": first["next"]})).json()
+    finally:
+        await get_users_collection().delete_many({"_id": {"$in": ids}})
+    assert [u["id"] for u in first["users"]] == [str(ids[2])]
+    assert first["next"] == str(ids[2])
+    assert [u["id"] for u in second["users"]] == [str(ids[3])]
+    assert second["next"] is None
@@ -0,0 +1,38 @@
+# services/user/tests/test_user_cache.py
+import fakeredis
+import pytest
+
+from utils import user_cache
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    redis = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer())
+    monkeypatch.setattr(user_cache, "get_redis", lambda: redis)
+    return redis
+
+
+async def test_stale_read_is_not_written_to_redis(redis):
+    user_id = "5f0000000000000000000001"
+    doc, generation = await user_cache.get_shared(user_id)
+    assert doc is None
+    epoch = user_cache.current_epoch()
+
+    # worker تاني كتب وعمل invalidate وإحنا لسه بنقرا من Mongo
+    await user_cache.invalidate(user_id)
+    await user_cache.set_user(user_id, {"_id": user_id, "name": "stale"}, epoch, generation)
+
+    assert await redis.get(user_cache.REDIS_KEY_PREFIX + user_id) is None
+
+
+async def test_fresh_read_is_shared(redis):
+    user_id = "5f0000000000000000000002"
+    await user_cache.invalidate(user_id)
+    _, generation = await user_cache.get_shared(user_id)
+    await user_cache.set_user(user_id, {"_id": user_id, "name": "fresh"}, user_cache.current_epoch(), generation)
+
+    user_cache._local.pop(user_id)
+    doc, _ = await user_cache.get_shared(user_id)
+    assert doc["name"] == "fresh"
@@ -0,0 +1,195 @@
+# services/user/utils/audit.py
+"""
+Audit log للأحداث الأمنية: تغيير وreset الباسورد، old password غلط، طلبات حذف الحساب
+
+الـ handler بيعمل record() بس: الـ event بيدخل queue في الذاكرة محدودة الحجم، و background task بيكتب
+insert_many لما يتجمع AUDIT_BATCH_SIZE أو يعدي AUDIT_FLUSH_INTERVAL على أول event، فمفيش round trip لـ Mongo
+في الـ request. الـ collection time-series (أو capped): append-only، مفيش update ولا delete للـ events
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Request
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure
+
+import database
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLLECTION = "security_audit"
+AUDIT_COLLECTION_TYPE = settings.audit_collection_type
+AUDIT_RETENTION_DAYS = settings.audit_retention_days
+AUDIT_CAPPED_SIZE_MB = settings.audit_capped_size_mb
+AUDIT_QUEUE_SIZE = settings.audit_queue_size
+AUDIT_BATCH_SIZE = settings.audit_batch_size
+AUDIT_FLUSH_INTERVAL = settings.audit_flush_interval
+AUDIT_ENQUEUE_TIMEOUT = settings.audit_enqueue_timeout
+AUDIT_SHUTDOWN_TIMEOUT = settings.audit_shutdown_timeout
+
+AUDIT_INDEXES = [
+    # events مستخدم معين (الأحدث الأول)، و event معين على كل المستخدمين
+    IndexModel([("user_id", ASCENDING), ("at", DESCENDING)]),
+    IndexModel([("event", ASCENDING), ("at", DESCENDING)]),
+]
+
+
+def _collection_options() -> dict:
+    if AUDIT_COLLECTION_TYPE == "capped":
+        return {"capped": True, "size": AUDIT_CAPPED_SIZE_MB * 1024 * 1024}
+    # user_id هو الـ metaField: events نفس المستخدم بتتجمع في نفس الـ buckets، والـ buckets القديمة بتتمسح بالـ TTL
+    return {
+        "timeseries": {"timeField": "at", "metaField": "user_id", "granularity": "seconds"},
+        "expireAfterSeconds": AUDIT_RETENTION_DAYS * 86400,
+    }
+
+
+async def ensure_collection():
+    db = database.get_db()
+    try:
+        if not await db.list_collection_names(filter={"name": AUDIT_COLLECTION}):
+            try:
+                await db.create_collection(AUDIT_COLLECTION, **_collection_options())
+            except CollectionInvalid:
+                # worker تاني عمله في نفس اللحظة
+                pass
+            except NotImplementedError:
+                # mongomock (bench): collection عادية
+                logger.warning("audit: %s collections not supported here, using a plain collection", AUDIT_COLLECTION_TYPE)
+        await db[AUDIT_COLLECTION].create_indexes(AUDIT_INDEXES)
+    except OperationFailure as e:
+        logger.error("could not set up %s: %s", AUDIT_COLLECTION, e)
+
+
+def get_audit_collection():
+    return database.get_collection(AUDIT_COLLECTION)
+
+
+class AuditLog:
+    def __init__(self, maxsize: int = AUDIT_QUEUE_SIZE):
+        self._queue = asyncio.Queue(maxsize)
+        # بيتعمل set لما الـ queue يوصل لـ batch كامل: الـ flusher ميستناش الـ interval
+        self._batch_ready = asyncio.Event()
+        # الـ batch اللي الـ flusher شايله (لو اتعمل cancel وقت الـ shutdown بيتكتب مع الباقي)
+        self._pending = []
+        self._task = None
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    async def record(self, event: str, user_id=None, request: Optional[Request] = None, **details):
+        await self.record_many(event, [user_id], request, **details)
+
+    async def record_many(self, event: str, user_ids: list, request: Optional[Request] = None, **details):
+        """
+        event لكل مستخدم. لو الـ queue مليان (Mongo واقع أو بطيء) الـ request بيستنى لحد AUDIT_ENQUEUE_TIMEOUT
+        للنداء كله، وبعدها الباقي بيتشال ويتعد في dropped بدل ما الـ requests تقف
+        """
+        now = datetime.utcnow()
+        context = {}
+        if request is not None:
+            context["ip"] = request.client.host if request.client else None
+            context["user_agent"] = request.headers.get("user-agent")
+        deadline = None
+        for index, user_id in enumerate(user_ids):
+            doc = {"at": now, "event": event, "user_id": user_id, **context, "details": details}
+            try:
+                self._queue.put_nowait(doc)
+            except asyncio.QueueFull:
+                deadline = deadline or time.monotonic() + AUDIT_ENQUEUE_TIMEOUT
+                try:
+                    await asyncio.wait_for(self._queue.put(doc), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    self.dropped += len(user_ids) - index
+                    logger.error("audit: queue full, dropped %d %s events", len(user_ids) - index, event)
+                    return
+            self.recorded += 1
+            if self._queue.qsize() >= AUDIT_BATCH_SIZE:
+                self._batch_ready.set()
+
+    async def _write(self, batch: list[dict], retry: bool = True):
+        delay = 0.5
+        while True:
+            try:
+                await get_audit_collection().insert_many(batch, ordered=False)
+                self.written += len(batch)
+                self.flushes += 1
+                return
+            except BulkWriteError as e:
+                # الباقي اتكتب، واللي فشل (validation مثلاً) مش هينجح لو اتعاد
+                failed = len(e.details.get("writeErrors", []))
+                self.written += len(batch) - failed
+                self.failed += failed
+                self.flushes += 1
+                logger.error("audit: %d of %d events rejected: %s", failed, len(batch), e.details.get("writeErrors", [])[:1])
+                return
+            except Exception as e:
+                if not retry:
+                    self.failed += len(batch)
+                    logger.error("audit: lost %d events: %s", len(batch), e)
+                    return
+                # الـ batch بيتعاد كله (at-least-once): ممكن event يتكرر لو الـ insert الأول وصل ومردش،
+                # وفي الوقت ده الـ queue بيتملي والـ backpressure في record_many بيشتغل
+                logger.warning("audit: insert failed (%s), retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    async def run(self):
+        """
+        background task: batch لما يتجمع AUDIT_BATCH_SIZE أو بعد AUDIT_FLUSH_INTERVAL من أول event فيه
+        """
+        while True:
+            self._pending = [await self._queue.get()]
+            if self._queue.qsize() + 1 < AUDIT_BATCH_SIZE:
+                self._batch_ready.clear()
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), AUDIT_FLUSH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            while len(self._pending) < AUDIT_BATCH_SIZE and not self._queue.empty():
+                self._pending.append(self._queue.get_nowait())
+            await self._write(self._pending)
+            self._pending = []
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        وقت الـ shutdown (بعد ما الـ requests خلصت): الـ batch اللي كان شغال + كل اللي في الـ queue، محاولة واحدة
+        في حدود AUDIT_SHUTDOWN_TIMEOUT عشان الـ worker يخلص قبل graceful_timeout
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        batch, self._pending = self._pending, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if not batch:
+            return
+        try:
+            await asyncio.wait_for(self._write(batch, retry=False), AUDIT_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.failed += len(batch)
+            logger.error("audit: flush on shutdown timed out, lost %d events", len(batch))
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
+
+
+audit_log = AuditLog()
@@ -0,0 +1,93 @@
+# services/user/utils/auth.py
+from typing import Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import Cookie, Depends, Header, HTTPException
+
+import metrics
+from database import get_users_collection
+from models import PROFILE_PROJECTION
+from utils import tombstones, user_cache
+from utils.revocation import revocations
+from utils.jwt import decode_token
+from utils.singleflight import SingleFlight
+
+
+def _extract_token(token: Optional[str], authorization: Optional[str]) -> Optional[str]:
+    # نحاول ناخد التوكن من Header أولاً وبعدين من الـ cookie
+    if authorization and authorization.startswith("Bearer "):
+        return authorization.split(" ")[1]
+    return token
+
+
+# الـ frontend بيبعت كذا request بنفس التوكن مع بعض وقت تحميل الصفحة: مع cache miss واحد بس بيروح Redis/Mongo
+user_lookups = SingleFlight()
+
+
+async def load_user(user_id: str) -> dict | None:
+    """
+    جلب المستخدم من الـ cache، ولو مش موجود من Mongo وبعدين تخزينه
+    (حقول الـ profile بس: الـ password hash والـ reset tokens مبتدخلش الـ cache)
+    """
+    user = user_cache.get_local(user_id)
+    if user is not None:
+        return user
+    return await user_lookups.do(user_id, lambda: _fetch_user(user_id))
+
+
+async def _fetch_user(user_id: str) -> dict | None:
+    user, generation = await user_cache.get_shared(user_id)
+    if user is not None:
+        return user
+
+    try:
+        oid = ObjectId(user_id)
+    except InvalidId:
+        return None
+
+    epoch = user_cache.current_epoch()
+    with metrics.stage("mongo_user_lookup"):
+        user = await get_users_collection().find_one({"_id": oid}, PROFILE_PROJECTION)
+    if user is not None:
+        await user_cache.set_user(user_id, user, epoch, generation)
+    return user
+
+
+# ===== dependency موحدة لكل الـ routes المحمية
+async def get_current_user(token: Optional[str] = Cookie(None), authorization: Optional[str] = Header(None)):
+    token = _extract_token(token, authorization)
+    if not token:
+        raise HTTPException(status_code=401, detail="auth.no_token")
+
+    with metrics.stage("jwt_decode"):
+        decoded = decode_token(token)
+    if not decoded:
+        raise HTTPException(status_code=401, detail="auth.invalid_token")
+
+    user_id = decoded.get("id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="auth.invalid_token")
+    # حساب اتطلب حذفه: التوكن والـ cache بتوعه بيترفضوا فوراً حتى لو لسه صالحين
+    if tombstones.is_deleted(user_id):
+        raise HTTPException(status_code=401, detail="auth.account_deleted")
+    # Bloom filter الأول: التوكن اللي مش فيه مبيكلمش Redis
+    if revocations.might_be_revoked(decoded) and await revocations.is_revoked(decoded):
+        raise HTTPException(status_code=401, detail="auth.token_revoked")
+
+    user = await load_user(str(user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail="profile.user_not_found")
+    return user
+
+
+def require_role(roles: list[str]):
+    """
+    نفس requireRole في الـ auth service: get_current_user + الـ role لازم يكون من roles
+    """
+    async def dependency(current_user: dict = Depends(get_current_user)):
+        if current_user.get("role") not in roles:
+            raise HTTPException(status_code=403, detail="auth.forbidden")
+        return current_user
+
+    return dependency
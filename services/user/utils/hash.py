@@ -1,9 +1,116 @@
-from passlib.context import CryptContext
+import asyncio
+import functools
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import metrics
+from settings import settings
+
+# ===== bcrypt cost للـ hashes الجديدة (الـ login في الـ auth service، فمفيش rehash-on-verify هنا)
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+
+# ===== worker pool: "thread" (bcrypt بيسيب الـ GIL) أو "process"
+PASSWORD_HASH_EXECUTOR = settings.password_hash_executor
+PASSWORD_HASH_WORKERS = settings.password_hash_workers
+PASSWORD_HASH_MAX_CONCURRENCY = settings.password_hash_max_concurrency
+
+
+@functools.lru_cache(maxsize=None)
+def _pwd_context():
+    """
+    passlib (و bcrypt) بيتعملهم import مع أول hash مش وقت الـ startup: أغلب الـ requests مبتلمسش الباسورد
+    """
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS,
+    )
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return _pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return _pwd_context().verify(plain_password, hashed_password)
+
+
+# ===== نسخ async: الشغل بيتم في pool بره الـ event loop
+_executor: Executor | None = None
+_semaphore: asyncio.Semaphore | None = None
+
+_metrics = {
+    "queued": 0,
+    "in_flight": 0,
+    "completed": 0,
+    "wait_seconds_total": 0.0,
+    "run_seconds_total": 0.0,
+}
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(PASSWORD_HASH_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def _run(stage: str, fn, *args):
+    loop = asyncio.get_running_loop()
+    queued_at = time.perf_counter()
+    _metrics["queued"] += 1
+    try:
+        await _get_semaphore().acquire()
+    finally:
+        _metrics["queued"] -= 1
+    started = time.perf_counter()
+    _metrics["wait_seconds_total"] += started - queued_at
+    _metrics["in_flight"] += 1
+    try:
+        return await loop.run_in_executor(_get_executor(), fn, *args)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.STAGE_DURATION.observe(elapsed, stage)
+        _metrics["in_flight"] -= 1
+        _metrics["completed"] += 1
+        _metrics["run_seconds_total"] += elapsed
+        _get_semaphore().release()
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run("bcrypt_hash", hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    # الـ verify الوحيد هنا في change-password، والـ hash القديم بيتبدل بعده على طول: rehash بالـ cost الجديد ملوش لازمة
+    return await _run("bcrypt_verify", verify_password, plain_password, hashed_password)
+
+
+def stats() -> dict:
+    return {
+        "executor": PASSWORD_HASH_EXECUTOR,
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_concurrency": PASSWORD_HASH_MAX_CONCURRENCY,
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+        **_metrics,
+    }
+
+
+def shutdown():
+    global _executor, _semaphore
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    _semaphore = None
@@ -0,0 +1,49 @@
+# services/user/utils/http_cache.py
+"""
+Conditional GET للـ read endpoints: الـ ETag hash للحقول اللي بتطلع في الـ body (profile_from_doc)، مش الـ version
+counter بس، عشان الـ auth service (superAdminRoutes) بيكتب في الـ users من غير ما يزود الـ version
+"""
+import hashlib
+
+import orjson
+from fastapi import Response
+
+import metrics
+from models import profile_from_doc
+
+# الـ response بتاع مستخدم واحد: الـ browser يخزنه بس يعمل revalidate كل مرة، وأي cache مشترك ميخزنوش
+CACHE_CONTROL = "private, no-cache"
+VARY = "Authorization, Cookie"
+
+
+def user_etag(user: dict) -> str:
+    digest = hashlib.blake2b(orjson.dumps(profile_from_doc(user)), digest_size=12).hexdigest()
+    return f'"{user["_id"]}-{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    If-None-Match بيتقارن weak (RFC 9110): W/"x" يطابق "x"، و * يطابق أي حاجة
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": VARY}
+
+
+def not_modified(route: str, if_none_match: str | None, etag: str) -> Response | None:
+    """
+    304 من غير body لو الـ client عنده نفس الـ version، وإلا None والـ route يكمل عادي
+    """
+    if etag_matches(if_none_match, etag):
+        metrics.CONDITIONAL_RESPONSES.inc(route, "not_modified")
+        return Response(status_code=304, headers=cache_headers(etag))
+    metrics.CONDITIONAL_RESPONSES.inc(route, "modified" if if_none_match else "unconditional")
+    return None
@@ -1,61 +1,194 @@
 # services/user/utils/jwt.py
+import hashlib
 import jwt
-import os
-from dotenv import load_dotenv
-from datetime import datetime, timezone
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 
-# تحميل المتغيرات من .env
-load_dotenv()
-JWT_SECRET = os.getenv("JWT_SECRET")
-JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+from settings import settings, split_list
+
+logger = logging.getLogger(__name__)
+
+# settings بيرفض الـ startup لو JWT_SECRET و JWT_KEYS الاتنين فاضيين
+JWT_SECRET = settings.jwt_secret
+JWT_ALGORITHM = settings.jwt_algorithm
+# خوارزميات مقبولة في التحقق (أول واحدة هي اللي بنوقّع بيها)
+JWT_ALGORITHMS = split_list(settings.jwt_algorithms or JWT_ALGORITHM)
+# key rotation: "kid1=secret1,kid2=secret2" — أول key هو اللي بنوقّع بيه والباقي للتحقق بس
+# القيمة لو بدأت بـ @ بتتقري من ملف (مفاتيح RSA/EC بصيغة PEM)
+JWT_KEYS = settings.jwt_keys
+
+JWT_CACHE_SIZE = settings.jwt_cache_size
+# أقصى مدة للتوكن في الـ cache حتى لو الـ exp أبعد (عشان إلغاء key ياخد مفعوله)
+JWT_CACHE_MAX_TTL = settings.jwt_cache_max_ttl
+
+
+@dataclass(frozen=True)
+class _Key:
+    kid: str | None
+    algorithm: str
+    key: object
+
+
+def _read_material(value: str) -> str:
+    if value.startswith("@"):
+        with open(value[1:]) as f:
+            return f.read()
+    return value
+
+
+def _load_keys() -> list[_Key]:
+    """
+    تجهيز الـ keys مرة واحدة وقت الـ import بدل ما PyJWT يعملها مع كل decode
+    """
+    entries = []
+    if JWT_KEYS:
+        for item in JWT_KEYS.split(","):
+            kid, _, value = item.strip().partition("=")
+            entries.append((kid.strip(), _read_material(value.strip())))
+    else:
+        entries.append((None, JWT_SECRET))
+
+    algorithms = jwt.algorithms.get_default_algorithms()
+    keys = []
+    for kid, material in entries:
+        for name in JWT_ALGORITHMS:
+            try:
+                prepared = algorithms[name].prepare_key(material)
+            except (KeyError, jwt.InvalidKeyError, ValueError, TypeError):
+                # الـ key ده مش مناسب للخوارزمية دي (مثلاً PEM مع HS256)
+                continue
+            keys.append(_Key(kid, name, prepared))
+    if not keys:
+        raise RuntimeError("No usable JWT key for JWT_ALGORITHMS")
+    return keys
+
+
+_KEYS = _load_keys()
+_SIGNING_KEY = _KEYS[0]
+
+
+class _VerifiedTokenCache:
+    """
+    LRU للتوكنات اللي اتعمل لها verify قبل كده، كل entry بتنتهي مع الـ exp بتاعها
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> dict | None:
+        entry = self._data.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        payload, expires_at = entry
+        if expires_at <= time.time():
+            del self._data[token]
+            self.misses += 1
+            return None
+        self._data.move_to_end(token)
+        self.hits += 1
+        return payload
+
+    def set(self, token: str, payload: dict):
+        expires_at = time.time() + JWT_CACHE_MAX_TTL
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, exp)
+        self._data[token] = (payload, expires_at)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_cache = _VerifiedTokenCache(JWT_CACHE_SIZE)
 
-if not JWT_SECRET:
-    raise RuntimeError("JWT_SECRET not set in .env")
 
 def encode_token(payload: dict) -> str:
     """
     توليد JWT جديد باستخدام secret موحد
     """
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    headers = {"kid": _SIGNING_KEY.kid} if _SIGNING_KEY.kid else None
+    return jwt.encode(payload, _SIGNING_KEY.key, algorithm=_SIGNING_KEY.algorithm, headers=headers)
 
-def decode_token(token: str) -> dict | None:
+
+def create_token(data: dict, expires_hours: int = 2) -> str:
+    payload = data.copy()
+    payload["exp"] = datetime.utcnow() + timedelta(hours=expires_hours)
+    # iat للـ watermark بتاع utils/revocation (بكسور الثانية: login بعد الإلغاء في نفس الثانية ميتلغيش)
+    # و jti عشان التوكن ده بالذات يتلغي لوحده (logout)
+    payload["iat"] = time.time()
+    payload["jti"] = uuid.uuid4().hex
+    return encode_token(payload)
+
+
+def token_id(token: str) -> str:
     """
-    فك التوكن والتحقق منه
+    الـ jti البديل للتوكنات اللي من غيره (الـ auth service): sha256 للتوكن نفسه، وأي service عنده التوكن يقدر يحسبه
     """
-    try:
-        decoded = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        print("✅ Decoded JWT payload:", decoded)
-        return decoded
-    except jwt.ExpiredSignatureError:
-        print("❌ Token expired")
-        return None
-    except jwt.InvalidTokenError as e:
-        print("❌ Invalid token:", str(e))
-        return None
+    return hashlib.sha256(token.encode()).hexdigest()
 
 
-"""
-# services/user/utils/jwt.py
-import jwt
-import os
-from dotenv import load_dotenv
-from datetime import datetime, timezone
-
-load_dotenv()
+def _candidate_keys(token: str) -> list[_Key]:
+    header = jwt.get_unverified_header(token)
+    kid = header.get("kid")
+    alg = header.get("alg")
+    return [k for k in _KEYS if k.algorithm == alg and (kid is None or k.kid == kid)]
 
-JWT_SECRET = os.getenv("JWT_SECRET", "fallback_secret")
 
 def decode_token(token: str) -> dict | None:
+    """
+    فك التوكن والتحقق منه، ولو اتعمل له verify قبل كده بيرجع من الـ cache من غير crypto
+    """
+    payload = _cache.get(token)
+    if payload is not None:
+        return dict(payload)
+
     try:
-        decoded = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        # ✅ نطبع الداتا عشان الديباج
-        print("Decoded JWT payload:", decoded)
-        return decoded
-    except jwt.ExpiredSignatureError:
-        print("❌ Token expired")
-        return None
+        keys = _candidate_keys(token)
     except jwt.InvalidTokenError as e:
-        print("❌ Invalid token:", str(e))
+        logger.debug("jwt rejected", extra={"reason": "malformed", "error": str(e)})
         return None
 
-"""
+    for key in keys:
+        try:
+            payload = jwt.decode(token, key.key, algorithms=[key.algorithm])
+        except jwt.InvalidSignatureError:
+            continue
+        except jwt.ExpiredSignatureError:
+            logger.debug("jwt rejected", extra={"reason": "expired", "kid": key.kid})
+            return None
+        except jwt.InvalidTokenError as e:
+            logger.debug("jwt rejected", extra={"reason": "invalid", "kid": key.kid, "error": str(e)})
+            return None
+
+        if "jti" not in payload:
+            payload["jti"] = token_id(token)
+        _cache.set(token, payload)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("jwt verified", extra={"kid": key.kid, "alg": key.algorithm, "user_id": payload.get("id")})
+        return dict(payload)
+
+    logger.debug("jwt rejected", extra={"reason": "no_matching_key"})
+    return None
+
+
+def stats() -> dict:
+    return {
+        "size": len(_cache),
+        "max_size": _cache.maxsize,
+        "hits": _cache.hits,
+        "misses": _cache.misses,
+        "keys": len(_KEYS),
+    }
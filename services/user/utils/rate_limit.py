@@ -0,0 +1,162 @@
+# services/user/utils/rate_limit.py
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+
+from fastapi import Depends, HTTPException, Request, Response
+
+import metrics
+from redis_client import get_redis
+from settings import settings
+from utils.auth import get_current_user
+
+logger = logging.getLogger(__name__)
+
+# "memory" أو "redis" (الافتراضي redis لو REDIS_URL موجود)
+RATE_LIMIT_BACKEND = settings.rate_limit_backend
+RATE_LIMIT_EVICT_INTERVAL = settings.rate_limit_evict_interval
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+
+
+class MemoryBackend:
+    """
+    sliding window لكل key في ring buffer حجمه ثابت (= الـ limit)،
+    والـ keys اللي بقالها فترة من غير طلبات بتتمسح بشكل دوري
+    """
+
+    def __init__(self, evict_interval: float = RATE_LIMIT_EVICT_INTERVAL):
+        self._buckets = {}
+        self._evict_interval = evict_interval
+        self._next_eviction = time.monotonic() + evict_interval
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        now = time.monotonic()
+        if now >= self._next_eviction:
+            self.evict(now)
+
+        entry = self._buckets.get(key)
+        if entry is None:
+            entry = self._buckets[key] = (deque(maxlen=limit), window)
+        bucket = entry[0]
+
+        if len(bucket) == limit and now - bucket[0] < window:
+            return RateLimitResult(False, limit, 0, window - (now - bucket[0]))
+
+        bucket.append(now)
+        in_window = sum(1 for t in bucket if now - t < window)
+        oldest = next(t for t in bucket if now - t < window)
+        return RateLimitResult(True, limit, limit - in_window, window - (now - oldest))
+
+    def evict(self, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        idle = [k for k, (bucket, window) in self._buckets.items() if not bucket or now - bucket[-1] >= window]
+        for key in idle:
+            del self._buckets[key]
+        self._next_eviction = now + self._evict_interval
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# sliding window log في sorted set، والساعة من Redis نفسه عشان كل الـ replicas تتفق
+_SLIDING_WINDOW_LUA = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local member = ARGV[3]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local count = redis.call('ZCARD', key)
+if count >= limit then
+  local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+  return {0, 0, tonumber(oldest[2]) + window - now}
+end
+
+redis.call('ZADD', key, now, member)
+redis.call('PEXPIRE', key, window)
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return {1, limit - count - 1, tonumber(oldest[2]) + window - now}
+"""
+
+
+class RedisBackend:
+    """
+    الـ limit بيتطبق على كل الـ workers والـ replicas (script واحد atomic لكل طلب)
+    """
+
+    def __init__(self, redis, fallback: MemoryBackend):
+        self._script = redis.register_script(_SLIDING_WINDOW_LUA)
+        self._fallback = fallback
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        try:
+            allowed, remaining, reset_ms = await self._script(
+                keys=[f"ratelimit:{key}"],
+                args=[int(window * 1000), limit, uuid.uuid4().hex],
+            )
+        except Exception as e:
+            # لو Redis وقع منقفلش الخدمة، نرجع للـ limit المحلي
+            logger.warning("rate limit: redis unavailable, using memory backend: %s", e)
+            return await self._fallback.hit(key, limit, window)
+        return RateLimitResult(bool(allowed), limit, int(remaining), int(reset_ms) / 1000)
+
+
+_memory_backend = MemoryBackend()
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        redis = get_redis()
+        use_redis = RATE_LIMIT_BACKEND == "redis" or (RATE_LIMIT_BACKEND == "" and redis is not None)
+        if use_redis and redis is not None:
+            _backend = RedisBackend(redis, _memory_backend)
+        else:
+            _backend = _memory_backend
+    return _backend
+
+
+def _set_headers(headers, result: RateLimitResult, window: float):
+    headers["RateLimit-Limit"] = str(result.limit)
+    headers["RateLimit-Remaining"] = str(result.remaining)
+    headers["RateLimit-Reset"] = str(max(1, round(result.reset_after)))
+    headers["RateLimit-Policy"] = f"{result.limit};w={int(window)}"
+
+
+async def _check(name: str, key: str, limit: int, window_seconds: float, response: Response):
+    with metrics.stage("rate_limit"):
+        result = await get_backend().hit(f"{name}:{key}", limit, window_seconds)
+    if not result.allowed:
+        headers = {"Retry-After": str(max(1, round(result.reset_after)))}
+        _set_headers(headers, result, window_seconds)
+        raise HTTPException(status_code=429, detail="Too many requests", headers=headers)
+    _set_headers(response.headers, result, window_seconds)
+
+
+def rate_limit(name: str, limit: int, window_seconds: float, key: str = "ip"):
+    """
+    dependency للـ route: key="ip" بيحدد حسب عنوان العميل، key="user" حسب المستخدم الحالي
+
+        @router.post("/x", dependencies=[Depends(rate_limit("x", limit=5, window_seconds=300))])
+    """
+    if key == "user":
+        async def by_user(response: Response, current_user: dict = Depends(get_current_user)):
+            await _check(name, str(current_user["_id"]), limit, window_seconds, response)
+        return by_user
+
+    async def by_ip(request: Request, response: Response):
+        host = request.client.host if request.client else "unknown"
+        await _check(name, host, limit, window_seconds, response)
+    return by_ip
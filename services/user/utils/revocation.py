@@ -0,0 +1,249 @@
+# services/user/utils/revocation.py
+"""
+إلغاء التوكنات قبل الـ exp
+
+نوعين إلغاء في Redis:
+    revoke:user:<id>  watermark (time.time() بكسور الثانية): أي توكن للمستخدم ده الـ iat بتاعه < الـ watermark ملغي
+                      (تغيير باسورد، حذف حساب، logout من كل الأجهزة)
+    revoke:jti:<jti>  توكن واحد بعينه، والـ key بيخلص مع الـ exp بتاع التوكن. التوكنات اللي من غير jti (الـ auth service)
+                      الـ jti بتاعها sha256 للتوكن (utils/jwt.token_id)
+
+الـ fast path: كل worker شايل Bloom filter بكل الـ users والـ jtis الملغية. التوكن اللي مش في الـ filter (تقريباً كل التوكنات)
+مبيكلمش Redis خالص؛ اللي في الـ filter بس بيتأكد من Redis (الـ filter ممكن يقول "موجود" غلط بنسبة REVOCATION_BLOOM_ERROR_RATE).
+الإلغاء بيتبعت على pub/sub فكل الـ workers بتضيفه للـ filter بتاعها فوراً، والـ filter بيتبني من الأول من Redis
+كل REVOCATION_REBUILD_INTERVAL (بيشيل اللي خلص وبيعوض أي رسالة pub/sub ضاعت)
+من غير Redis: الإلغاء محلي في الـ worker ده بس (للتطوير)
+"""
+import asyncio
+import logging
+import math
+import time
+
+from redis_client import get_redis
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_CHANNEL = "user:revoke"
+USER_KEY_PREFIX = "revoke:user:"
+JTI_KEY_PREFIX = "revoke:jti:"
+
+# لازم تبقى أطول من أطول توكن (الـ refresh token بتاع الـ auth service 7 أيام)
+REVOCATION_WATERMARK_TTL = settings.revocation_watermark_ttl
+REVOCATION_BLOOM_CAPACITY = settings.revocation_bloom_capacity
+REVOCATION_BLOOM_ERROR_RATE = settings.revocation_bloom_error_rate
+REVOCATION_REBUILD_INTERVAL = settings.revocation_rebuild_interval
+
+
+class BloomFilter:
+    """
+    bit array بـ k hashes (double hashing من نصين الـ hash بتاع 64 bit). الـ filter محلي في الـ process، فـ hash() بتاع Python
+    (siphash، وبيتعمله cache جوه الـ str) كفاية ومش محتاجين hash ثابت بين الـ processes
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        h = hash(key)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        # inline ومن غير generator: التوكن اللي مش ملغي بيخرج غالباً من أول bit أو اتنين
+        bits, size = self._bits, self.size
+        h = hash(key)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class RevocationList:
+    def __init__(self):
+        self._bloom = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+        # رسايل pub/sub اللي وصلت واحنا بنبني filter جديد: بتتضاف له قبل ما يتبدل
+        self._during_rebuild: list[str] | None = None
+        # من غير Redis بس
+        self._local_watermarks: dict[str, float] = {}
+        self._local_jtis: dict[str, float] = {}
+        self.checks = 0
+        self.bloom_hits = 0
+        self.false_positives = 0
+        self.revoked = 0
+        self.rebuilds = 0
+
+    def _remember(self, key: str):
+        self._bloom.add(key)
+        if self._during_rebuild is not None:
+            self._during_rebuild.append(key)
+
+    # ===== الإلغاء
+    async def revoke_users(self, user_ids: list, at: float | None = None):
+        """
+        كل التوكنات اللي اتعملت لحد دلوقتي للمستخدمين دول بتتلغي
+        """
+        watermark = time.time() if at is None else at
+        keys = [f"u:{user_id}" for user_id in user_ids]
+        for key in keys:
+            self._remember(key)
+        redis = get_redis()
+        if redis is None:
+            for user_id in user_ids:
+                self._local_watermarks[str(user_id)] = watermark
+            return
+        pipe = redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.set(USER_KEY_PREFIX + str(user_id), watermark, ex=REVOCATION_WATERMARK_TTL)
+        pipe.publish(REVOCATION_CHANNEL, ",".join(keys))
+        await pipe.execute()
+
+    async def revoke_token(self, jti: str, exp: float):
+        key = f"j:{jti}"
+        self._remember(key)
+        redis = get_redis()
+        if redis is None:
+            self._local_jtis[jti] = exp
+            return
+        ttl = max(1, int(exp - time.time()) + 1)
+        pipe = redis.pipeline(transaction=False)
+        pipe.set(JTI_KEY_PREFIX + jti, 1, ex=ttl)
+        pipe.publish(REVOCATION_CHANNEL, key)
+        await pipe.execute()
+
+    # ===== التحقق
+    def might_be_revoked(self, payload: dict) -> bool:
+        """
+        الـ fast path (من غير I/O): False = التوكن أكيد مش ملغي
+        """
+        self.checks += 1
+        if not self._bloom.count:
+            return False
+        jti = payload.get("jti")
+        if f"u:{payload.get('id')}" in self._bloom or (jti and f"j:{jti}" in self._bloom):
+            self.bloom_hits += 1
+            return True
+        return False
+
+    async def is_revoked(self, payload: dict) -> bool:
+        """
+        التحقق الفعلي من Redis، بيتنده بس لو might_be_revoked رجعت True
+        """
+        user_id = str(payload.get("id"))
+        jti = payload.get("jti")
+        # توكن من غير iat (قديم) بيعتبر اتعمل قبل أي watermark
+        iat = payload.get("iat") or 0
+
+        redis = get_redis()
+        if redis is None:
+            watermark = self._local_watermarks.get(user_id)
+            jti_revoked = bool(jti) and self._local_jtis.get(jti, 0) > time.time()
+        else:
+            try:
+                pipe = redis.pipeline(transaction=False)
+                pipe.get(USER_KEY_PREFIX + user_id)
+                pipe.exists(JTI_KEY_PREFIX + jti) if jti else pipe.echo(0)
+                raw_watermark, jti_exists = await pipe.execute()
+            except Exception as e:
+                # Redis واقع والـ filter بيقول ممكن يكون ملغي: نرفض أحسن من ما نقبل توكن ملغي
+                logger.warning("revocation: redis check failed: %s", e)
+                return True
+            watermark = float(raw_watermark) if raw_watermark is not None else None
+            jti_revoked = bool(jti) and bool(int(jti_exists))
+
+        if watermark is not None and not isinstance(iat, float):
+            # iat بالثانية (jsonwebtoken في الـ auth service): مش هنعرف التوكن اتعمل قبل ولا بعد الإلغاء في نفس الثانية،
+            # فبيتقبل عشان الـ login اللي بعد تغيير الباسورد على طول ميترفضش طول عمر التوكن
+            watermark = math.floor(watermark)
+        revoked = jti_revoked or (watermark is not None and iat < watermark)
+        if revoked:
+            self.revoked += 1
+        else:
+            self.false_positives += 1
+        return revoked
+
+    # ===== المزامنة بين الـ workers
+    async def rebuild(self) -> int:
+        """
+        filter جديد من كل الـ keys اللي لسه في Redis (اللي خلص بيختفي لوحده بالـ TTL)
+        """
+        redis = get_redis()
+        if redis is None:
+            return self._bloom.count
+        self._during_rebuild = []
+        try:
+            keys = []
+            async for raw in redis.scan_iter(match="revoke:*", count=1000):
+                name = raw.decode()
+                if name.startswith(USER_KEY_PREFIX):
+                    keys.append("u:" + name[len(USER_KEY_PREFIX):])
+                elif name.startswith(JTI_KEY_PREFIX):
+                    keys.append("j:" + name[len(JTI_KEY_PREFIX):])
+            # الحجم بيكبر مع عدد الإلغاءات عشان نسبة الـ false positives تفضل ثابتة
+            bloom = BloomFilter(max(REVOCATION_BLOOM_CAPACITY, 2 * len(keys)), REVOCATION_BLOOM_ERROR_RATE)
+            for key in keys + self._during_rebuild:
+                bloom.add(key)
+            self._bloom = bloom
+            self.rebuilds += 1
+            return bloom.count
+        finally:
+            self._during_rebuild = None
+
+    async def listen(self):
+        """
+        background task: الإلغاءات من الـ workers التانية + rebuild دوري
+        """
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            await self.rebuild()
+        except Exception as e:
+            logger.warning("revocation: initial rebuild failed: %s", e)
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(REVOCATION_CHANNEL)
+        next_rebuild = time.monotonic() + REVOCATION_REBUILD_INTERVAL
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=min(1.0, REVOCATION_REBUILD_INTERVAL))
+                if message is not None:
+                    for key in message["data"].decode().split(","):
+                        self._remember(key)
+                if time.monotonic() >= next_rebuild:
+                    next_rebuild = time.monotonic() + REVOCATION_REBUILD_INTERVAL
+                    try:
+                        await self.rebuild()
+                    except Exception as e:
+                        logger.warning("revocation: rebuild failed: %s", e)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await pubsub.unsubscribe(REVOCATION_CHANNEL)
+            await pubsub.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "bloom_entries": self._bloom.count,
+            "bloom_bits": self._bloom.size,
+            "bloom_hashes": self._bloom.hashes,
+            "checks": self.checks,
+            "bloom_hits": self.bloom_hits,
+            "false_positives": self.false_positives,
+            "revoked": self.revoked,
+            "rebuilds": self.rebuilds,
+        }
+
+
+revocations = RevocationList()
@@ -0,0 +1,29 @@
+# services/user/utils/singleflight.py
+import asyncio
+
+
+class SingleFlight:
+    """
+    الـ calls المتزامنة بنفس الـ key بتستنى نفس الـ fetch بدل ما كل واحدة تعمل واحد لوحدها
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        self.calls += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.shared += 1
+            # shield: لو الـ request دي اتلغت الباقيين اللي مستنيين نفس النتيجة ميتأثروش
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(fn())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "shared": self.shared, "inflight": len(self._inflight)}
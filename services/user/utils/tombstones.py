@@ -0,0 +1,134 @@
+# services/user/utils/tombstones.py
+"""
+Tombstones للحسابات اللي اتطلب حذفها
+
+الحذف نفسه بياخد وقت (purge.py بيمسح الـ carts والـ orders والـ payments على دفعات)، بس الحساب لازم يقف فوراً:
+الـ tombstone بيتكتب في Mongo وبيتبعت على Redis pub/sub، وكل worker شايل الـ ids في set في الذاكرة،
+فـ get_current_user بيرفض أي توكن أو cache entry للمستخدم ده من غير ما يستنى الـ JWT يخلص أو الـ cache يـ expire
+من غير Redis: كل worker بيسحب الـ tombstones الجديدة من Mongo كل TOMBSTONE_POLL_INTERVAL
+
+الـ ids في الذاكرة بتتشال بعد TOMBSTONE_TTL_DAYS زي الـ TTL index في Mongo: ساعتها الـ purge خلص والـ user document
+اتمسح، وأي توكن اتعمل قبل الحذف خلص، فالـ set مبيكبرش أكتر من الحسابات اللي اتحذفت في الفترة دي
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from database import get_collection
+from redis_client import get_redis
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+TOMBSTONES_COLLECTION = "account_tombstones"
+TOMBSTONE_CHANNEL = "user:tombstone"
+# أطول من عمر الـ refresh token (7 أيام) عشان أي توكن اتعمل قبل الحذف يكون خلص
+TOMBSTONE_TTL_DAYS = settings.tombstone_ttl_days
+TOMBSTONE_POLL_INTERVAL = settings.tombstone_poll_interval
+
+TOMBSTONE_INDEXES = [
+    IndexModel([("deleted_at", ASCENDING)], expireAfterSeconds=TOMBSTONE_TTL_DAYS * 86400),
+]
+
+# id -> deleted_at، بترتيب الوصول (تقريباً ترتيب deleted_at): الأقدم بيتشال من الأول
+_deleted: OrderedDict[str, datetime] = OrderedDict()
+_last_seen: datetime | None = None
+
+
+def is_deleted(user_id) -> bool:
+    return str(user_id) in _deleted
+
+
+def _expire(now: datetime):
+    cutoff = now - timedelta(days=TOMBSTONE_TTL_DAYS)
+    while _deleted:
+        if next(iter(_deleted.values())) > cutoff:
+            return
+        _deleted.popitem(last=False)
+
+
+def _remember(user_ids, deleted_at: datetime | None = None):
+    now = datetime.utcnow()
+    for user_id in user_ids:
+        # setdefault: الـ pub/sub والـ poll ممكن يجيبوا نفس الـ id، والأقدم هو اللي يحدد امتى يتشال
+        _deleted.setdefault(str(user_id), deleted_at or now)
+    _expire(now)
+
+
+async def mark_deleted(user_ids: list[ObjectId], reason: str):
+    """
+    بيقفل الحسابات فوراً في الـ worker ده، وفي باقي الـ workers بعد الـ publish
+    """
+    now = datetime.utcnow()
+    await get_collection(TOMBSTONES_COLLECTION).bulk_write([
+        UpdateOne({"_id": oid}, {"$setOnInsert": {"deleted_at": now, "reason": reason}}, upsert=True)
+        for oid in user_ids
+    ], ordered=False)
+    # الـ check في get_current_user قبل الـ user cache والـ JWT cache، فمش محتاجين نمسح الـ entries بتاعته
+    _remember(user_ids, now)
+
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.publish(TOMBSTONE_CHANNEL, ",".join(str(oid) for oid in user_ids))
+    except Exception as e:
+        # الـ workers التانية هتعرف من Mongo وقت الـ startup، بس مش فوراً
+        logger.warning("tombstones: redis publish failed: %s", e)
+
+
+async def _pull() -> int:
+    global _last_seen
+    query = {"deleted_at": {"$gte": _last_seen}} if _last_seen else {}
+    count = 0
+    async for doc in get_collection(TOMBSTONES_COLLECTION).find(query, {"deleted_at": 1}).sort("deleted_at", ASCENDING):
+        _remember([doc["_id"]], doc["deleted_at"])
+        _last_seen = max(_last_seen or doc["deleted_at"], doc["deleted_at"])
+        count += 1
+    return count
+
+
+async def load() -> int:
+    """
+    وقت الـ startup: كل الـ tombstones اللي لسه ماعدّاش عليها TTL
+    """
+    return await _pull()
+
+
+async def _poll():
+    while True:
+        await asyncio.sleep(TOMBSTONE_POLL_INTERVAL)
+        try:
+            await _pull()
+        except Exception as e:
+            logger.warning("tombstones: poll failed: %s", e)
+
+
+async def listen():
+    """
+    background task: الـ tombstones من الـ workers التانية (أو poll من Mongo لو مفيش Redis)
+    """
+    redis = get_redis()
+    if redis is None:
+        await _poll()
+        return
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(TOMBSTONE_CHANNEL)
+    try:
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            _remember(message["data"].decode().split(","))
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await pubsub.unsubscribe(TOMBSTONE_CHANNEL)
+        await pubsub.aclose()
+
+
+def stats() -> dict:
+    return {"tombstones": len(_deleted)}
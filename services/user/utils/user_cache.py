@@ -0,0 +1,197 @@
+# services/user/utils/user_cache.py
+"""
+cache للـ user documents على مستويين: محلي في الـ worker (TTLCache) و Redis مشترك بين الـ workers
+
+القراءة من Mongo ممكن تبقى أقدم من كتابة حصلت وهي شغالة، فمتتخزنش لو حصل invalidate في النص:
+    المحلي: _epoch بيزيد مع كل invalidation (من الـ worker ده أو من الـ pub/sub)
+    Redis:  user:gen:<id> بيزيد (INCR) مع كل invalidation، والـ SET بيحصل في Lua script بس لو الـ generation
+            لسه هي اللي اتقرت قبل Mongo (compare-and-set)، فـ worker بطيء مبيكتبش document قديم فوق الـ invalidation
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from bson import json_util
+
+from redis_client import get_redis
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_SIZE = settings.user_cache_size
+USER_CACHE_TTL = settings.user_cache_ttl
+USER_CACHE_REDIS_TTL = settings.user_cache_redis_ttl
+
+REDIS_KEY_PREFIX = "user:doc:"
+GENERATION_KEY_PREFIX = "user:gen:"
+INVALIDATION_CHANNEL = "user:invalidate"
+# الـ generation لازم تعيش أطول من أي قراءة من Mongo: لو خلصت في النص الـ CAS يقارن بـ 0 ويكتب القديم
+GENERATION_TTL = max(86400, USER_CACHE_REDIS_TTL)
+
+# KEYS: doc, generation — ARGV: الـ generation اللي اتقرت، الـ document، الـ TTL
+_SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class TTLCache:
+    """
+    LRU محدود الحجم وكل entry ليها مدة صلاحية
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_local = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# بيزيد مع كل invalidation: أي قراءة من Mongo بدأت قبل الـ invalidation متتخزنش
+_epoch = 0
+
+
+def current_epoch() -> int:
+    return _epoch
+
+
+def get_local(user_id: str) -> dict | None:
+    """
+    الـ cache المحلي بس (من غير await): الـ hit مبيدخلش الـ single-flight في load_user
+    """
+    return _local.get(user_id)
+
+
+async def get_shared(user_id: str) -> tuple[dict | None, int | None]:
+    """
+    الـ cache المشترك في Redis (بعد miss في المحلي)، واللي بيلاقيه بيتخزن محلياً
+    مع الـ miss بترجع الـ generation الحالية في نفس الـ round trip: الـ caller بيبعتها لـ set_user بعد القراءة من Mongo
+    """
+    redis = get_redis()
+    if redis is None:
+        return None, None
+    try:
+        raw, generation = await redis.mget(REDIS_KEY_PREFIX + user_id, GENERATION_KEY_PREFIX + user_id)
+    except Exception as e:
+        logger.warning("user cache: redis get failed: %s", e)
+        return None, None
+    if raw is None:
+        return None, int(generation or 0)
+    doc = json_util.loads(raw)
+    _local.set(user_id, doc)
+    return doc, None
+
+
+async def set_user(user_id: str, doc: dict, epoch: int, generation: int | None = None):
+    """
+    بيخزن الـ document بس لو مفيش invalidation حصلت من ساعة ما القراءة بدأت: محلياً بالـ epoch،
+    وفي Redis بالـ generation اللي get_shared رجعتها (من غير generation الـ document بيتخزن محلياً بس)
+    """
+    if epoch != _epoch:
+        return
+    _local.set(user_id, doc)
+
+    redis = get_redis()
+    if redis is None or generation is None:
+        return
+    try:
+        await redis.eval(
+            _SET_IF_GENERATION, 2, REDIS_KEY_PREFIX + user_id, GENERATION_KEY_PREFIX + user_id,
+            generation, json_util.dumps(doc), USER_CACHE_REDIS_TTL,
+        )
+    except Exception as e:
+        logger.warning("user cache: redis set failed: %s", e)
+
+
+async def invalidate(user_id) -> None:
+    """
+    لازم تتنادى بعد أي كتابة على الـ user (تعديل، باسورد، حذف)
+    """
+    global _epoch
+    user_id = str(user_id)
+    _epoch += 1
+    _local.pop(user_id)
+
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        pipe = redis.pipeline(transaction=False)
+        # الـ generation الأول: أي set_user بدأ قبل الكتابة هيفشل في الـ CAS
+        pipe.incr(GENERATION_KEY_PREFIX + user_id)
+        pipe.expire(GENERATION_KEY_PREFIX + user_id, GENERATION_TTL)
+        pipe.delete(REDIS_KEY_PREFIX + user_id)
+        pipe.publish(INVALIDATION_CHANNEL, user_id)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning("user cache: redis invalidate failed: %s", e)
+
+
+async def listen_for_invalidations():
+    """
+    background task: بيمسح الـ cache المحلي لما worker تاني يعمل invalidate
+    """
+    global _epoch
+    redis = get_redis()
+    if redis is None:
+        return
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(INVALIDATION_CHANNEL)
+    try:
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            _epoch += 1
+            _local.pop(message["data"].decode())
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await pubsub.unsubscribe(INVALIDATION_CHANNEL)
+        await pubsub.aclose()
+
+
+def stats() -> dict:
+    return {
+        "size": len(_local),
+        "max_size": _local.maxsize,
+        "ttl": _local.ttl,
+        "hits": _local.hits,
+        "misses": _local.misses,
+        "redis": get_redis() is not None,
+    }
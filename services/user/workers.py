@@ -0,0 +1,52 @@
+# services/user/workers.py
+"""
+gunicorn worker class للـ user service (gunicorn.conf.py): uvicorn بـ uvloop و httptools صريحين (مش "auto")
+عشان لو حد منهم مش متسطب الـ worker يقع وقت الـ boot بدل ما يرجع لـ asyncio/h11 الأبطأ من غير ما حد ياخد باله
+"""
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn.workers import UvicornWorker
+
+
+def ready_path(master_pid: int, worker_pid: int) -> str:
+    """
+    الـ marker اللي الـ worker بيعمله بعد ما الـ lifespan startup يخلص ويبدأ ياخد connections،
+    والـ rolling restart (rolling_restart.py) بيستناه قبل ما يقفل الـ workers القديمة
+    """
+    return os.path.join(tempfile.gettempdir(), f"user-service-ready-{master_pid}", str(worker_pid))
+
+
+class UserServiceWorker(UvicornWorker):
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools", "lifespan": "on"}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # uvicorn بيقفل الـ connections اللي لسه مفتوحة قبل ما الـ master يقتل الـ worker بعد graceful_timeout،
+        # فالـ lifespan shutdown (قفل Mongo/Redis والـ background tasks) بيلحق يخلص
+        self.config.timeout_graceful_shutdown = max(1, self.cfg.graceful_timeout - 5)
+
+    async def _serve(self) -> None:
+        # نفس UvicornWorker._serve + الـ ready marker
+        self.config.app = self.wsgi
+        server = Server(config=self.config)
+        self._install_sigquit_handler()
+        serving = asyncio.ensure_future(server.serve(sockets=self.sockets))
+        marker = ready_path(self.ppid, self.pid)
+        try:
+            while not server.started and not serving.done():
+                await asyncio.sleep(0.05)
+            if server.started:
+                os.makedirs(os.path.dirname(marker), exist_ok=True)
+                open(marker, "w").close()
+            await serving
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(marker)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)